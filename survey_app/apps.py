@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class SurveyAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'survey_app'
+
+    def ready(self):
+        # Enregistre les signaux d'invalidation du schéma compilé, les réglages de
+        # connexion, l'enregistrement des requêtes SQL et l'invalidation des liens de partage
+        from . import database, instrumentation, schema, share_links  # noqa: F401
@@ -0,0 +1,173 @@
+"""
+Vues asynchrones (ASGI) pour les pics de trafic : répondre à un sondage,
+consulter ses résultats, exporter le PDF.
+
+Lectures par l'ORM asynchrone (``aget``, itération asynchrone), écritures
+transactionnelles et rendu des gabarits dans un thread (``sync_to_async``),
+rendu PDF dans un pool de processus : la boucle d'événements n'est jamais
+bloquée. Servies par ``survey_project.asgi`` (uvicorn, daphne...), elles
+restent utilisables sous WSGI.
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse
+from django.shortcuts import render, redirect, aget_object_or_404
+from django.utils import timezone
+
+from . import export_worker
+from .jobs import request_export, claim_job, job_file
+from .models import Survey, ExportJob
+from .results import asurvey_dashboard
+from .schema import asurvey_schema
+from .share_links import acan_access
+from .respondent_filter import already_answered
+from .submission import (
+    build_response_forms, submit_survey, started_token, submission_key, SurveyLimitReached, AlreadyAnswered,
+)
+from .throttling import refund_submission, throttle_submission
+
+arender = sync_to_async(render)
+_export_pool = None
+
+
+def export_pool():
+    """Pool de processus du rendu PDF, créé au premier export (démarrage « spawn », voir ``export_worker``)"""
+    global _export_pool
+    if _export_pool is None:
+        _export_pool = ProcessPoolExecutor(
+            max_workers=getattr(settings, 'ASYNC_EXPORT_WORKERS', 2),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=export_worker.init_process,
+        )
+    return _export_pool
+
+
+@login_required
+async def take_survey(request, survey_id):
+    survey = await aget_object_or_404(Survey, pk=survey_id)
+    user = await request.auser()
+    if not await acan_access(request, user, survey):
+        messages.error(request, 'Vous n\'avez pas accès à ce sondage.')
+        return redirect('home')
+
+    if request.method != 'POST' and survey.end_date and survey.end_date < timezone.now():
+        messages.error(request, 'Ce sondage est terminé.')
+        return redirect('home')
+
+    if survey.is_full():
+        messages.error(request, 'Ce sondage a atteint sa limite de réponses.')
+        return redirect('home')
+
+    respondent = user if not survey.is_anonymous and user.is_authenticated else None
+    ip_address = request.META.get('REMOTE_ADDR')
+    schema = await asurvey_schema(survey)
+    if request.method != 'POST':
+        if await sync_to_async(already_answered)(survey, respondent.pk if respondent else None, ip_address):
+            messages.error(request, 'Vous avez déjà répondu à ce sondage.')
+            return redirect('home')
+        return await arender(request, 'survey_app/take_survey.html', {
+            'survey': survey,
+            'question_forms': build_response_forms(schema.questions),
+            'started_token': started_token(),
+            'submission_key': submission_key(),
+        })
+
+    throttled_at = time.time()
+    retry_after = await sync_to_async(throttle_submission)(survey, user, ip_address, now=throttled_at)
+    if retry_after:
+        messages.error(request, f'Trop de réponses envoyées. Réessayez dans {retry_after} secondes.')
+        return redirect('home')
+
+    submission = None
+    try:
+        question_forms, submission = await sync_to_async(submit_survey)(
+            survey, schema.questions, request.POST,
+            user=respondent,
+            ip_address=ip_address,
+        )
+    except SurveyLimitReached:
+        messages.error(request, 'Ce sondage a atteint sa limite de réponses.')
+        return redirect('home')
+    except AlreadyAnswered:
+        messages.error(request, 'Vous avez déjà répondu à ce sondage.')
+        return redirect('home')
+    finally:
+        # Seules les soumissions enregistrées comptent dans les limites de débit
+        if submission is None:
+            await sync_to_async(refund_submission)(survey, user, ip_address, now=throttled_at)
+
+    if submission is not None:
+        messages.success(request, 'Merci pour votre réponse!')
+        return redirect('survey_app:survey_results', survey_id=survey.id)
+
+    return await arender(request, 'survey_app/take_survey.html', {
+        'survey': survey,
+        'question_forms': question_forms,
+        'started_token': request.POST.get('started', ''),
+        'submission_key': request.POST.get('submission_key', ''),
+    })
+
+
+async def survey_results(request, survey_id):
+    survey = await aget_object_or_404(Survey, pk=survey_id)
+    user = await request.auser()
+    if user.pk is None or user.pk != survey.creator_id:
+        messages.error(request, 'Vous n\'avez pas accès aux résultats de ce sondage.')
+        return redirect('home')
+
+    schema = await asurvey_schema(survey)
+    return await arender(request, 'survey_app/survey_results.html', {
+        'survey': survey,
+        'dashboard': await asurvey_dashboard(survey, schema.questions),
+    })
+
+
+def open_job_file(job):
+    """Fichier d'un job terminé ouvert en lecture, ou None s'il a disparu du disque"""
+    path = job_file(job)
+    if path is None:
+        return None
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+
+@login_required
+async def export_results(request, survey_id):
+    """
+    Export PDF servi directement : depuis le cache disque s'il existe, sinon
+    rendu dans le pool de processus pendant que la requête attend. Si un
+    worker a déjà pris le job, redirige vers la page d'état.
+    """
+    survey = await aget_object_or_404(Survey, pk=survey_id)
+    user = await request.auser()
+    if user.pk != survey.creator_id:
+        messages.error(request, 'Vous n\'avez pas accès aux résultats de ce sondage.')
+        return redirect('home')
+
+    job = await sync_to_async(request_export)(survey, user)
+    if job.status == ExportJob.STATUS_PENDING and await sync_to_async(claim_job)(job.id):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(export_pool(), export_worker.run, job.id)
+        job = await ExportJob.objects.aget(pk=job.id)
+
+    # Accès disque dans un thread, comme les écritures
+    export_file = await sync_to_async(open_job_file)(job)
+    if export_file is None:
+        return redirect('survey_app:export_status', job_id=job.id)
+    response = FileResponse(
+        export_file,
+        as_attachment=True,
+        filename=f'{survey.title}_results.pdf',
+        content_type='application/pdf',
+    )
+    response['X-Frame-Options'] = 'DENY'
+    return response
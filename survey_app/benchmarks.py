@@ -0,0 +1,271 @@
+"""
+Outils communs aux commandes de benchmark.
+
+Les benchmarks tournent dans une base de test jetable (comme ``manage.py test``)
+pour ne jamais toucher aux données réelles.
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.utils import timezone
+
+from .models import Survey, Question, Choice, Submission, Response, UserProfile
+from .tallies import rebuild_tallies
+
+QUESTION_TYPE_CYCLE = ['single_choice', 'multiple_choice', 'scale', 'text']
+
+
+@contextmanager
+def benchmark_database(on_disk=False):
+    """
+    Crée une base de test temporaire et la détruit à la sortie.
+
+    ``on_disk`` : avec SQLite, base dans un fichier plutôt qu'en mémoire, pour
+    que plusieurs threads écrivent dans la même base avec un vrai verrouillage.
+    Les limites de débit des soumissions sont désactivées : toutes les
+    requêtes d'un benchmark viennent du même client.
+    """
+    setup_test_environment(debug=False)
+    directory = None
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    test_name = test_settings.get('NAME')
+    if on_disk and connection.vendor == 'sqlite':
+        directory = tempfile.TemporaryDirectory()
+        test_settings['NAME'] = os.path.join(directory.name, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(SUBMISSION_RATE_LIMITS={}):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        if directory is not None:
+            test_settings['NAME'] = test_name
+            directory.cleanup()
+
+
+def build_survey(creator, question_count, choices_per_question=4, title=None):
+    """Crée un sondage de ``question_count`` questions de types alternés"""
+    survey = Survey.objects.create(
+        title=title or f'Benchmark {question_count} questions',
+        description='Sondage généré pour les benchmarks',
+        creator=creator,
+    )
+    questions = Question.objects.bulk_create([
+        Question(
+            survey=survey,
+            text=f'Question {i + 1}',
+            question_type=QUESTION_TYPE_CYCLE[i % len(QUESTION_TYPE_CYCLE)],
+            order=i,
+        )
+        for i in range(question_count)
+    ])
+    Choice.objects.bulk_create([
+        Choice(question=question, text=f'Choix {j + 1}', order=j)
+        for question in questions
+        if question.question_type in ('single_choice', 'multiple_choice')
+        for j in range(choices_per_question)
+    ])
+    return survey
+
+
+def seed_submissions(survey, submission_count, users=(), batch_size=1000, seed=0):
+    """
+    Insère ``submission_count`` soumissions complètes aléatoires, par lots.
+
+    Les réponses sont étalées sur les 30 derniers jours, une transaction par
+    lot ; le compteur de répondants et les agrégats du sondage sont mis à
+    jour à la fin. Retourne le nombre de ``Response`` créées.
+    """
+    rng = random.Random(seed)
+    questions = list(survey.questions.prefetch_related('choices'))
+    choices = {question.id: [choice.pk for choice in question.choices.all()] for question in questions}
+    # Popularité des choix très inégale (loi de Pareto), comme dans les vrais sondages
+    weights = {question_id: [rng.paretovariate(1.5) for _ in pks] for question_id, pks in choices.items()}
+    users = list(users) or [None]
+    now = timezone.now()
+    created = 0
+
+    for start in range(0, submission_count, batch_size):
+        count = min(batch_size, submission_count - start)
+        with transaction.atomic():
+            created += insert_submission_batch(
+                survey, questions, choices, weights, users, count, now, rng, batch_size,
+            )
+
+    Survey.objects.filter(pk=survey.pk).update(respondent_count=F('respondent_count') + submission_count)
+    rebuild_tallies([survey.id])
+    return created
+
+
+def weighted_sample(rng, population, weights, k):
+    """``k`` éléments distincts tirés selon ``weights`` (méthode d'Efraimidis-Spirakis)"""
+    keyed = sorted(zip(population, weights), key=lambda item: rng.random() ** (1 / item[1]), reverse=True)
+    return [item for item, _ in keyed[:k]]
+
+
+def insert_submission_batch(survey, questions, choices, weights, users, count, now, rng, batch_size):
+    """Un lot de ``count`` soumissions et leurs réponses (appelé dans une transaction)"""
+    submissions = []
+    for _ in range(count):
+        finished = now - timedelta(seconds=rng.randint(0, 30 * 24 * 3600))
+        submissions.append(Submission(
+            survey=survey,
+            user=rng.choice(users),
+            ip_address=f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+            started_at=finished - timedelta(seconds=rng.randint(20, 900)),
+            finished_at=finished,
+        ))
+    Submission.objects.bulk_create(submissions)
+
+    responses = []
+    selections = []
+    for submission in submissions:
+        for question in questions:
+            response = Response(
+                survey=survey,
+                submission=submission,
+                question=question,
+                user=submission.user,
+                ip_address=submission.ip_address,
+                created_at=submission.finished_at,
+            )
+            pks = choices[question.id]
+            if question.question_type == 'single_choice' and pks:
+                selections.append(rng.choices(pks, weights[question.id]))
+            elif question.question_type == 'multiple_choice' and pks:
+                selections.append(weighted_sample(rng, pks, weights[question.id], min(len(pks), 1 + int(rng.expovariate(1)))))
+            else:
+                selections.append([])
+                if question.question_type == 'scale':
+                    # Distribution centrée, plus réaliste qu'une loi uniforme
+                    response.scale_response = max(1, min(10, round(rng.gauss(7, 2))))
+                elif question.question_type == 'text':
+                    response.text_response = f'Réponse libre {rng.randint(1, 10000)}'
+            responses.append(response)
+    Response.objects.bulk_create(responses, batch_size=batch_size)
+    through = Response.choice_response.through
+    through.objects.bulk_create(
+        [
+            through(response_id=response.pk, choice_id=choice_id)
+            for response, selected in zip(responses, selections)
+            for choice_id in selected
+        ],
+        batch_size=batch_size * 5,
+    )
+    return len(responses)
+
+
+def seed_users(count, prefix='load'):
+    """
+    Crée ``count`` comptes (et leurs profils) par lots, sans mot de passe
+    utilisable. Les comptes existants de même nom sont réutilisés.
+    """
+    usernames = [f'{prefix}{i}' for i in range(count)]
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    # bulk_create ne déclenche pas post_save : les profils sont créés explicitement
+    created = User.objects.bulk_create(
+        [User(username=username, password='!') for username in usernames if username not in existing],
+        batch_size=1000,
+    )
+    UserProfile.objects.bulk_create([UserProfile(user=user) for user in created], batch_size=1000)
+    return list(User.objects.filter(username__in=usernames))
+
+
+def benchmark_user(username='bench'):
+    user, _ = User.objects.get_or_create(username=username)
+    return user
+
+
+def submission_post_data(survey):
+    """Données POST valides répondant à toutes les questions du sondage"""
+    data = {}
+    for question in survey.questions.prefetch_related('choices'):
+        prefix = str(question.id)
+        choices = list(question.choices.all())
+        if question.question_type == 'single_choice':
+            data[f'{prefix}-choice_response'] = str(choices[0].pk)
+        elif question.question_type == 'multiple_choice':
+            data[f'{prefix}-choice_response'] = [str(choice.pk) for choice in choices[:2]]
+        elif question.question_type == 'scale':
+            data[f'{prefix}-scale_response'] = '7'
+        else:
+            data[f'{prefix}-text_response'] = 'Réponse libre'
+    return data
+
+
+def measure(func, repeat):
+    """
+    Exécute ``func`` ``repeat`` fois.
+
+    Retourne ``(requêtes par appel, liste des durées en millisecondes)``.
+    """
+    durations = []
+    queries = 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            func()
+            durations.append((time.perf_counter() - start) * 1000)
+        queries = len(ctx.captured_queries)
+    return queries, durations
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_concurrently(task, concurrency, total):
+    """
+    Exécute ``task()`` ``total`` fois réparti sur ``concurrency`` threads (une connexion chacun).
+
+    ``task`` retourne True si l'opération a réussi ; une exception compte
+    comme une erreur. Retourne ``(durée en s, latences réussies en ms, erreurs)``.
+    """
+    remaining = iter(range(total))
+    lock = threading.Lock()
+    durations = []
+    errors = [0]
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        break
+                start = time.perf_counter()
+                try:
+                    ok = task()
+                except Exception:
+                    ok = False
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    if ok:
+                        durations.append(elapsed)
+                    else:
+                        errors[0] += 1
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, durations, errors[0]
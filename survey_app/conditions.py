@@ -0,0 +1,148 @@
+"""
+Moteur de questions conditionnelles (``conditional_question``/``conditional_value``).
+
+Le graphe de dépendances d'un sondage est compilé une fois en un plan
+d'évaluation ordonné topologiquement (stocké dans le schéma compilé, voir
+``schema``). À la soumission, les questions sont parcourues dans cet ordre :
+une question dont la condition n'est pas remplie est masquée, elle n'est ni
+validée ni enregistrée, et ses propres dépendantes sont masquées à leur tour.
+"""
+import heapq
+from dataclasses import dataclass, field
+
+
+class ConditionCycleError(ValueError):
+    """Les conditions forment une boucle (A dépend de B qui dépend de A...)"""
+
+    def __init__(self, cycle):
+        self.cycle = cycle
+        super().__init__(' -> '.join(str(question_id) for question_id in cycle))
+
+
+@dataclass(frozen=True)
+class EvaluationPlan:
+    # Ids des questions, chaque question après celle dont elle dépend
+    order: tuple
+    # Question conditionnelle -> question dont elle dépend (conditions valides seulement)
+    parents: dict = field(default_factory=dict)
+    # Question conditionnelle -> valeur attendue
+    expected: dict = field(default_factory=dict)
+
+
+def find_cycle(parents):
+    """Premier cycle du graphe ``{question: question parente}``, ou None"""
+    state = {}
+    for start in parents:
+        path = []
+        node = start
+        while node is not None and node not in state:
+            state[node] = start
+            path.append(node)
+            node = parents.get(node)
+        if node is not None and state[node] == start:
+            return path[path.index(node):] + [node]
+    return None
+
+
+def compile_plan(questions):
+    """
+    Plan d'évaluation des questions d'un sondage.
+
+    Ordre topologique stable (à égalité, l'ordre d'affichage est conservé).
+    Les conditions vers une question d'un autre sondage ou prises dans une
+    boucle sont ignorées : la question est alors toujours affichée.
+    """
+    position = {question.id: index for index, question in enumerate(questions)}
+    parents = {
+        question.id: question.conditional_question_id
+        for question in questions
+        if question.conditional_question_id in position
+    }
+    while True:
+        cycle = find_cycle(parents)
+        if cycle is None:
+            break
+        for question_id in cycle:
+            parents.pop(question_id, None)
+
+    children = {}
+    for child, parent in parents.items():
+        children.setdefault(parent, []).append(child)
+    ready = [(position[question_id], question_id) for question_id in position if question_id not in parents]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        _, question_id = heapq.heappop(ready)
+        order.append(question_id)
+        for child in children.get(question_id, ()):
+            heapq.heappush(ready, (position[child], child))
+
+    expected = {question.id: question.conditional_value for question in questions if question.id in parents}
+    return EvaluationPlan(order=tuple(order), parents=parents, expected=expected)
+
+
+def check_new_condition(questions, question_id, parent_id):
+    """
+    Lève ``ConditionCycleError`` si faire dépendre ``question_id`` de
+    ``parent_id`` crée une boucle (``question_id`` vaut None pour une nouvelle question).
+    """
+    if parent_id is None:
+        return
+    parents = {
+        question.id: question.conditional_question_id
+        for question in questions
+        if question.conditional_question_id is not None
+    }
+    node_id = question_id if question_id is not None else object()
+    parents[node_id] = parent_id
+    cycle = find_cycle(parents)
+    if cycle is not None:
+        raise ConditionCycleError(['nouvelle' if node is node_id and question_id is None else node for node in cycle])
+
+
+def condition_met(question, answer, expected):
+    """La réponse ``answer`` à ``question`` déclenche-t-elle la valeur attendue ?"""
+    if answer in (None, '', [], ()):
+        return False
+    if not expected or not expected.strip():
+        # Sans valeur attendue, toute réponse suffit
+        return True
+    expected = expected.strip().casefold()
+    if question.question_type in ('single_choice', 'multiple_choice'):
+        answers = answer if isinstance(answer, (list, tuple)) else [answer]
+        return any(choice.text.strip().casefold() == expected or str(choice.pk) == expected for choice in answers)
+    return str(answer).strip().casefold() == expected
+
+
+def form_answer(question, form):
+    """Réponse nettoyée d'un formulaire validé"""
+    if question.question_type in ('single_choice', 'multiple_choice'):
+        return form.cleaned_data.get('choice_response')
+    if question.question_type == 'scale':
+        return form.cleaned_data.get('scale_response')
+    return form.cleaned_data.get('text_response')
+
+
+def validate_visible(plan, question_forms):
+    """
+    Valide uniquement les formulaires des questions visibles, dans l'ordre du plan.
+
+    Retourne ``(tous valides, [(question, formulaire) visibles dans l'ordre d'affichage])``.
+    """
+    by_id = {question.id: (question, form) for question, form in question_forms}
+    answers = {}
+    visible = set()
+    all_valid = True
+    for question_id in plan.order:
+        question, form = by_id[question_id]
+        parent_id = plan.parents.get(question_id)
+        if parent_id is not None:
+            parent, _ = by_id[parent_id]
+            if parent_id not in visible or not condition_met(parent, answers.get(parent_id), plan.expected[question_id]):
+                continue
+        visible.add(question_id)
+        if form.is_valid():
+            answers[question_id] = form_answer(question, form)
+        else:
+            all_valid = False
+    return all_valid, [(question, form) for question, form in question_forms if question.id in visible]
@@ -0,0 +1,22 @@
+"""
+Réglages appliqués à chaque nouvelle connexion à la base.
+
+Les PRAGMA SQLite du profil (clé ``PRAGMAS`` de l'entrée ``DATABASES``, voir
+``survey_project.db_profiles``) ne valent que pour la connexion courante,
+sauf ``journal_mode=WAL`` qui est mémorisé dans le fichier : ils sont donc
+exécutés à chaque ouverture, via le signal ``connection_created``.
+"""
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS', ())
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
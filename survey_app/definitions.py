@@ -0,0 +1,485 @@
+"""
+Définitions de sondages au format JSON ou YAML (import et export en masse).
+
+Format compact : les valeurs par défaut sont omises, une question est
+désignée par sa clé (``key``, par défaut ``q<position>``) dans les conditions,
+un choix par son texte::
+
+    {"format": 1, "surveys": [{
+        "title": "Satisfaction",
+        "questions": [
+            {"text": "Êtes-vous satisfait ?", "type": "single_choice", "choices": ["Oui", "Non"]},
+            {"text": "Pourquoi ?", "type": "text", "required": false,
+             "condition": {"question": "q1", "value": "Non"}}
+        ]
+    }]}
+
+Un document peut aussi être un seul sondage ou une liste de sondages. Tout
+est validé en mémoire (types, longueurs, choix, conditions : question
+existante, valeur parmi ses choix, absence de boucle) avant la moindre
+écriture. L'import crée ensuite tous les sondages, questions et choix en une
+transaction et un nombre fixe de requêtes (``bulk_create`` puis
+``bulk_update`` des conditions), quelle que soit la taille du document.
+L'export part du schéma compilé (``schema``) : aucune requête s'il est en cache.
+
+Les sondages modèles (``Survey.template``) sont dupliqués par le même
+chemin : définition tirée du schéma compilé, mise en cache par version du
+schéma, puis ``create_surveys`` ; créer des centaines de copies d'un modèle
+(une évaluation par classe) coûte le même nombre de requêtes qu'une seule.
+
+Le mot de passe d'un sondage n'est jamais exporté ni importé.
+"""
+import json
+from dataclasses import dataclass, replace
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .conditions import find_cycle
+from .models import Survey, Question, Choice
+from .schema import SCHEMA_CACHE_TIMEOUT, survey_schema
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover - dépend de l'environnement
+    yaml = None
+
+FORMAT_VERSION = 1
+FORMATS = ('json', 'yaml')
+CONTENT_TYPES = {'json': 'application/json', 'yaml': 'application/yaml'}
+CHOICE_TYPES = ('single_choice', 'multiple_choice')
+QUESTION_TYPES = tuple(key for key, _ in Question.QUESTION_TYPES)
+BULK_BATCH_SIZE = 1000
+# Nombre d'erreurs rapportées au plus (un document invalide peut en contenir des milliers)
+MAX_ERRORS = 20
+
+
+class DefinitionError(ValueError):
+    """Document de définition illisible ou invalide ; ``errors`` liste les problèmes trouvés"""
+
+    def __init__(self, errors):
+        self.errors = errors if isinstance(errors, list) else [errors]
+        super().__init__(' ; '.join(self.errors))
+
+
+@dataclass(frozen=True)
+class QuestionDefinition:
+    key: str
+    text: str
+    question_type: str
+    required: bool = True
+    choices: tuple = ()
+    condition_key: str | None = None
+    condition_value: str | None = None
+
+
+@dataclass(frozen=True)
+class SurveyDefinition:
+    title: str
+    description: str = ''
+    is_public: bool = True
+    is_anonymous: bool = False
+    end_date: datetime | None = None
+    max_responses: int = 0
+    one_response_per_person: bool = False
+    template: bool = False
+    questions: tuple = ()
+
+
+def definition_format(filename, default='json'):
+    """Format déduit de l'extension du fichier"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension in ('yaml', 'yml'):
+        return 'yaml'
+    if extension == 'json':
+        return 'json'
+    return default
+
+
+def load_document(content, fmt='json'):
+    """Document brut (dict ou liste) lu depuis ``content`` (texte ou octets)"""
+    if isinstance(content, bytes):
+        try:
+            content = content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise DefinitionError('Le fichier doit être encodé en UTF-8.')
+    if fmt == 'yaml':
+        if yaml is None:
+            raise DefinitionError('Le format YAML demande PyYAML (pip install pyyaml).')
+        try:
+            return yaml.safe_load(content)
+        except yaml.YAMLError as exc:
+            raise DefinitionError(f'YAML invalide : {exc}')
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError as exc:
+        raise DefinitionError(f'JSON invalide : {exc}')
+
+
+class _Checker:
+    """Accumule les erreurs de validation, chacune préfixée par son chemin dans le document"""
+
+    def __init__(self):
+        self.errors = []
+
+    def error(self, path, message):
+        self.errors.append(f'{path} : {message}')
+
+    def text(self, data, name, path, max_length, required=False, default=''):
+        value = data.get(name, default)
+        if value is None and not required:
+            return default
+        if not isinstance(value, str):
+            self.error(f'{path}.{name}', 'texte attendu')
+            return default
+        value = value.strip()
+        if required and not value:
+            self.error(f'{path}.{name}', 'obligatoire')
+        elif len(value) > max_length:
+            self.error(f'{path}.{name}', f'{max_length} caractères au plus')
+        return value
+
+    def boolean(self, data, name, path, default):
+        value = data.get(name, default)
+        if not isinstance(value, bool):
+            self.error(f'{path}.{name}', 'booléen attendu (true/false)')
+            return default
+        return value
+
+    def integer(self, data, name, path, default=0):
+        value = data.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            self.error(f'{path}.{name}', 'entier positif attendu')
+            return default
+        return value
+
+    def moment(self, data, name, path):
+        value = data.get(name)
+        if value is None:
+            return None
+        if isinstance(value, datetime):
+            moment = value
+        elif isinstance(value, str):
+            moment = parse_datetime(value)
+        else:
+            moment = None
+        if moment is None:
+            self.error(f'{path}.{name}', 'date ISO 8601 attendue (AAAA-MM-JJTHH:MM)')
+            return None
+        return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+def _survey_items(document):
+    if isinstance(document, list):
+        return document
+    if isinstance(document, dict):
+        version = document.get('format', FORMAT_VERSION)
+        if version != FORMAT_VERSION:
+            raise DefinitionError(f'Version de format non prise en charge : {version}')
+        if 'surveys' in document:
+            if not isinstance(document['surveys'], list):
+                raise DefinitionError('« surveys » doit être une liste')
+            return document['surveys']
+        return [document]
+    raise DefinitionError('Le document doit être un sondage, une liste de sondages ou {"surveys": [...]}')
+
+
+def _parse_questions(items, path, checker):
+    if not isinstance(items, list):
+        checker.error(path, 'liste de questions attendue')
+        return ()
+    questions = []
+    keys = {}
+    for index, item in enumerate(items):
+        item_path = f'{path}[{index}]'
+        if not isinstance(item, dict):
+            checker.error(item_path, 'objet attendu')
+            continue
+        key = item.get('key', f'q{index + 1}')
+        if not isinstance(key, str) or not key:
+            checker.error(f'{item_path}.key', 'texte attendu')
+            key = f'q{index + 1}'
+        if key in keys:
+            checker.error(f'{item_path}.key', f'clé « {key} » déjà utilisée')
+        question_type = item.get('type')
+        if question_type not in QUESTION_TYPES:
+            checker.error(f'{item_path}.type', f'type attendu parmi {", ".join(QUESTION_TYPES)}')
+        choices = item.get('choices', [])
+        if question_type in CHOICE_TYPES:
+            if not isinstance(choices, list) or not choices:
+                checker.error(f'{item_path}.choices', 'liste de choix non vide attendue')
+                choices = []
+            for choice_index, choice in enumerate(choices):
+                if not isinstance(choice, str) or not choice.strip():
+                    checker.error(f'{item_path}.choices[{choice_index}]', 'texte non vide attendu')
+                elif len(choice.strip()) > 200:
+                    checker.error(f'{item_path}.choices[{choice_index}]', '200 caractères au plus')
+            choices = tuple(choice.strip() for choice in choices if isinstance(choice, str) and choice.strip())
+        elif choices:
+            checker.error(f'{item_path}.choices', 'seules les questions à choix ont des choix')
+            choices = ()
+        else:
+            choices = ()
+        condition = item.get('condition')
+        condition_key = condition_value = None
+        if condition is not None:
+            if not isinstance(condition, dict) or not isinstance(condition.get('question'), str):
+                checker.error(f'{item_path}.condition', 'objet {"question": <clé>, "value": <valeur>} attendu')
+            else:
+                condition_key = condition['question']
+                condition_value = checker.text(condition, 'value', f'{item_path}.condition', 200) or None
+        keys[key] = index
+        questions.append(QuestionDefinition(
+            key=key,
+            text=checker.text(item, 'text', item_path, 500, required=True),
+            question_type=question_type,
+            required=checker.boolean(item, 'required', item_path, True),
+            choices=choices,
+            condition_key=condition_key,
+            condition_value=condition_value,
+        ))
+    _check_conditions(questions, path, checker)
+    return tuple(questions)
+
+
+def _check_conditions(questions, path, checker):
+    """Conditions : question existante du même sondage, valeur parmi ses choix, pas de boucle"""
+    by_key = {question.key: question for question in questions}
+    parents = {}
+    for index, question in enumerate(questions):
+        if question.condition_key is None:
+            continue
+        condition_path = f'{path}[{index}].condition'
+        parent = by_key.get(question.condition_key)
+        if parent is None or parent is question:
+            checker.error(condition_path, f'question « {question.condition_key} » inconnue')
+            continue
+        parents[question.key] = parent.key
+        value = question.condition_value
+        if value and parent.question_type in CHOICE_TYPES:
+            if value.casefold() not in {choice.casefold() for choice in parent.choices}:
+                checker.error(f'{condition_path}.value', f'« {value} » ne correspond à aucun choix de « {parent.key} »')
+    cycle = find_cycle(parents)
+    if cycle is not None:
+        checker.error(path, f'les conditions forment une boucle ({" -> ".join(cycle)})')
+
+
+def parse_definitions(document):
+    """
+    Valide un document (voir ``load_document``) et retourne la liste des
+    ``SurveyDefinition``. Lève ``DefinitionError`` avec toutes les erreurs
+    trouvées (``MAX_ERRORS`` au plus), sans rien écrire.
+    """
+    checker = _Checker()
+    definitions = []
+    for index, item in enumerate(_survey_items(document)):
+        path = f'surveys[{index}]'
+        if not isinstance(item, dict):
+            checker.error(path, 'objet attendu')
+            continue
+        definitions.append(SurveyDefinition(
+            title=checker.text(item, 'title', path, 200, required=True),
+            description=checker.text(item, 'description', path, 10000),
+            is_public=checker.boolean(item, 'is_public', path, True),
+            is_anonymous=checker.boolean(item, 'is_anonymous', path, False),
+            end_date=checker.moment(item, 'end_date', path),
+            max_responses=checker.integer(item, 'max_responses', path),
+            one_response_per_person=checker.boolean(item, 'one_response_per_person', path, False),
+            template=checker.boolean(item, 'template', path, False),
+            questions=_parse_questions(item.get('questions', []), f'{path}.questions', checker),
+        ))
+    if not definitions and not checker.errors:
+        checker.error('surveys', 'aucun sondage')
+    if checker.errors:
+        raise DefinitionError(checker.errors[:MAX_ERRORS])
+    return definitions
+
+
+def create_surveys(definitions, creator):
+    """
+    Crée les sondages de ``definitions`` (déjà validées) pour ``creator``.
+
+    Une transaction : un INSERT par lots par table (sondages, questions,
+    choix) puis une mise à jour par lots des conditions, qui désignent des
+    questions créées dans le même INSERT. Les signaux ``post_save`` ne sont
+    pas émis : ``updated_at`` est avancé à la fin (version du schéma).
+    Retourne les ``Survey`` créés.
+    """
+    with transaction.atomic():
+        surveys = Survey.objects.bulk_create([
+            Survey(
+                title=definition.title,
+                description=definition.description,
+                creator=creator,
+                is_public=definition.is_public,
+                is_anonymous=definition.is_anonymous,
+                end_date=definition.end_date,
+                max_responses=definition.max_responses,
+                one_response_per_person=definition.one_response_per_person,
+                template=definition.template,
+            )
+            for definition in definitions
+        ], batch_size=BULK_BATCH_SIZE)
+
+        questions = []
+        for survey, definition in zip(surveys, definitions):
+            for order, question in enumerate(definition.questions):
+                questions.append(Question(
+                    survey=survey,
+                    text=question.text,
+                    question_type=question.question_type,
+                    required=question.required,
+                    order=order,
+                    conditional_value=question.condition_value,
+                ))
+        Question.objects.bulk_create(questions, batch_size=BULK_BATCH_SIZE)
+
+        choices = []
+        conditional = []
+        created = iter(questions)
+        for definition in definitions:
+            by_key = {}
+            survey_questions = []
+            for question in definition.questions:
+                instance = next(created)
+                by_key[question.key] = instance
+                survey_questions.append((question, instance))
+                choices.extend(
+                    Choice(question=instance, text=text, order=order)
+                    for order, text in enumerate(question.choices)
+                )
+            for question, instance in survey_questions:
+                if question.condition_key is not None:
+                    instance.conditional_question = by_key[question.condition_key]
+                    conditional.append(instance)
+        Choice.objects.bulk_create(choices, batch_size=BULK_BATCH_SIZE)
+        if conditional:
+            Question.objects.bulk_update(conditional, ['conditional_question'], batch_size=BULK_BATCH_SIZE)
+        Survey.objects.filter(pk__in=[survey.pk for survey in surveys]).update(updated_at=timezone.now())
+    return surveys
+
+
+def import_definitions(content, fmt, creator):
+    """Lit, valide et crée les sondages d'un document ; lève ``DefinitionError``"""
+    return create_surveys(parse_definitions(load_document(content, fmt)), creator)
+
+
+def condition_value_text(parent, value):
+    """Valeur de condition sous forme de texte de choix (un id de choix ne survit pas à une copie)"""
+    value = (value or '').strip()
+    for choice in parent.choices:
+        if value == str(choice.pk):
+            return choice.text
+    return value
+
+
+def templates_for(user):
+    """Sondages modèles utilisables par ``user`` : publics, ou dont il est le créateur"""
+    return Survey.objects.filter(template=True).filter(Q(is_public=True) | Q(creator=user)).order_by('title')
+
+
+def template_definition(survey):
+    """
+    ``SurveyDefinition`` d'un sondage modèle, tirée de son schéma compilé et
+    mise en cache sous la version du schéma : aucune requête tant que le
+    modèle ne change pas. La copie n'est pas un modèle et n'a pas de date de fin.
+    """
+    schema = survey_schema(survey)
+    key = f'survey-template:{survey.pk}:{schema.version}'
+    definition = cache.get(key)
+    if definition is None:
+        position = {question.id: index for index, question in enumerate(schema.questions)}
+        questions = []
+        for question in schema.questions:
+            condition_key = condition_value = None
+            parent_id = schema.plan.parents.get(question.id)
+            if parent_id is not None:
+                condition_key = f'q{position[parent_id] + 1}'
+                condition_value = condition_value_text(
+                    schema.questions[position[parent_id]], schema.plan.expected.get(question.id),
+                ) or None
+            questions.append(QuestionDefinition(
+                key=f'q{position[question.id] + 1}',
+                text=question.text,
+                question_type=question.question_type,
+                required=question.required,
+                choices=tuple(choice.text for choice in question.choices),
+                condition_key=condition_key,
+                condition_value=condition_value,
+            ))
+        definition = SurveyDefinition(
+            title=survey.title,
+            description=survey.description,
+            is_public=survey.is_public,
+            is_anonymous=survey.is_anonymous,
+            max_responses=survey.max_responses,
+            one_response_per_person=survey.one_response_per_person,
+            questions=tuple(questions),
+        )
+        cache.set(key, definition, SCHEMA_CACHE_TIMEOUT)
+    return definition
+
+
+def clone_template(survey, creator, titles):
+    """Crée une copie du modèle ``survey`` par titre de ``titles`` ; retourne les ``Survey`` créés"""
+    definition = template_definition(survey)
+    return create_surveys([replace(definition, title=title) for title in titles], creator)
+
+
+def schema_definition(survey, schema):
+    """
+    Définition compacte d'un sondage depuis son schéma compilé. Seules les
+    conditions valides sont exportées (voir ``conditions.compile_plan``) ;
+    une valeur de condition donnée par id de choix est traduite en texte.
+    """
+    position = {question.id: index for index, question in enumerate(schema.questions)}
+    referenced = set(schema.plan.parents.values())
+    questions = []
+    for question in schema.questions:
+        item = {}
+        if question.id in referenced:
+            item['key'] = f'q{position[question.id] + 1}'
+        item['text'] = question.text
+        item['type'] = question.question_type
+        if not question.required:
+            item['required'] = False
+        if question.question_type in CHOICE_TYPES:
+            item['choices'] = [choice.text for choice in question.choices]
+        parent_id = schema.plan.parents.get(question.id)
+        if parent_id is not None:
+            parent = schema.questions[position[parent_id]]
+            value = condition_value_text(parent, schema.plan.expected.get(question.id))
+            condition = {'question': f'q{position[parent_id] + 1}'}
+            if value:
+                condition['value'] = value
+            item['condition'] = condition
+        questions.append(item)
+
+    definition = {'title': survey.title}
+    if survey.description:
+        definition['description'] = survey.description
+    defaults = SurveyDefinition(title='')
+    for name in ('is_public', 'is_anonymous', 'max_responses', 'one_response_per_person', 'template'):
+        if getattr(survey, name) != getattr(defaults, name):
+            definition[name] = getattr(survey, name)
+    if survey.end_date:
+        definition['end_date'] = survey.end_date.isoformat()
+    definition['questions'] = questions
+    return definition
+
+
+def export_definitions(surveys, fmt='json'):
+    """Document ``{"format": 1, "surveys": [...]}`` des sondages, en texte JSON ou YAML"""
+    document = {
+        'format': FORMAT_VERSION,
+        'surveys': [schema_definition(survey, survey_schema(survey)) for survey in surveys],
+    }
+    if fmt == 'yaml':
+        if yaml is None:
+            raise DefinitionError('Le format YAML demande PyYAML (pip install pyyaml).')
+        return yaml.safe_dump(document, allow_unicode=True, sort_keys=False)
+    return json.dumps(document, ensure_ascii=False, indent=2)
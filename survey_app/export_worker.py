@@ -0,0 +1,18 @@
+"""
+Points d'entrée des processus du pool de ``run_export_worker``.
+
+Ce module n'importe rien de Django au chargement : avec le démarrage « spawn »,
+il est importé dans le processus fils avant que Django soit configuré.
+"""
+import os
+
+
+def init_process():
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'survey_project.settings')
+    django.setup()
+
+
+def run(job_id):
+    from .jobs import run_job
+    return run_job(job_id)
@@ -0,0 +1,165 @@
+"""
+Exports des résultats d'un sondage.
+
+Les exports CSV et NDJSON sont produits par des générateurs : les réponses sont
+lues par blocs (``iterator(chunk_size=...)``, choix préchargés bloc par bloc)
+et envoyées au fil de l'eau, la mémoire reste donc constante quel que soit le
+nombre de réponses.
+
+Sous ASGI, Django consommerait un générateur synchrone en entier
+(``sync_to_async(list)``) avant d'envoyer le premier octet : la vue le passe
+alors par ``aiter_rows``, qui le lit par lots de ``STREAM_BATCH_ROWS`` lignes
+dans le thread de l'ORM.
+"""
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+
+from .models import Response, Submission
+
+EXPORT_CHUNK_SIZE = 2000
+STREAM_BATCH_ROWS = 500
+ANSWER_COLUMNS = ['submission', 'question_id', 'question', 'answer', 'created_at', 'user']
+
+
+class Echo:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de l'écrire"""
+    def write(self, value):
+        return value
+
+
+def answer_value(question, response):
+    """Valeur d'une réponse : liste de choix, entier ou texte (None si vide)"""
+    if question.question_type in ('single_choice', 'multiple_choice'):
+        return [choice.text for choice in response.choice_response.all()]
+    if question.question_type == 'scale':
+        return response.scale_response
+    return response.text_response or None
+
+
+def answer_text(question, response):
+    """Valeur d'une réponse mise en forme pour un tableau"""
+    value = answer_value(question, response)
+    if value is None or value == []:
+        return ''
+    if isinstance(value, list):
+        return ', '.join(value)
+    return str(value)
+
+
+def iter_responses(survey):
+    """Réponses du sondage par ordre d'id, lues par blocs avec leurs choix préchargés"""
+    return (
+        Response.objects.filter(survey=survey)
+        .select_related('user')
+        .prefetch_related('choice_response')
+        .order_by('id')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def iter_submissions(survey):
+    """Soumissions du sondage par ordre d'id, lues par blocs avec réponses et choix préchargés"""
+    return (
+        Submission.objects.filter(survey=survey)
+        .select_related('user')
+        .prefetch_related(Prefetch('responses', queryset=Response.objects.prefetch_related('choice_response')))
+        .order_by('id')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE // 10)
+    )
+
+
+def _username(user):
+    return user.username if user else ''
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def csv_answer_rows(survey, questions):
+    """Une ligne CSV par réponse à une question"""
+    by_id = {question.id: question for question in questions}
+    writer = csv.writer(Echo())
+    yield writer.writerow(ANSWER_COLUMNS)
+    for response in iter_responses(survey):
+        question = by_id[response.question_id]
+        yield writer.writerow([
+            response.submission_id or '',
+            question.id,
+            question.text,
+            answer_text(question, response),
+            response.created_at.isoformat(),
+            _username(response.user),
+        ])
+
+
+def csv_submission_rows(survey, questions):
+    """Une ligne CSV par soumission, une colonne par question"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(['submission', 'started_at', 'finished_at', 'user'] + [question.text for question in questions])
+    by_id = {question.id: question for question in questions}
+    for submission in iter_submissions(survey):
+        answers = {
+            response.question_id: answer_text(by_id[response.question_id], response)
+            for response in submission.responses.all()
+        }
+        yield writer.writerow(
+            [submission.id, _isoformat(submission.started_at), _isoformat(submission.finished_at), _username(submission.user)]
+            + [answers.get(question.id, '') for question in questions]
+        )
+
+
+def ndjson_answer_rows(survey, questions):
+    """Un objet JSON par ligne et par réponse à une question"""
+    by_id = {question.id: question for question in questions}
+    for response in iter_responses(survey):
+        question = by_id[response.question_id]
+        yield json.dumps({
+            'submission': response.submission_id,
+            'question_id': question.id,
+            'question': question.text,
+            'answer': answer_value(question, response),
+            'created_at': response.created_at.isoformat(),
+            'user': _username(response.user) or None,
+        }, ensure_ascii=False) + '\n'
+
+
+def ndjson_submission_rows(survey, questions):
+    """Un objet JSON par ligne et par soumission, réponses indexées par id de question"""
+    by_id = {question.id: question for question in questions}
+    for submission in iter_submissions(survey):
+        yield json.dumps({
+            'submission': submission.id,
+            'started_at': _isoformat(submission.started_at),
+            'finished_at': _isoformat(submission.finished_at),
+            'user': _username(submission.user) or None,
+            'answers': {
+                str(response.question_id): answer_value(by_id[response.question_id], response)
+                for response in submission.responses.all()
+            },
+        }, ensure_ascii=False) + '\n'
+
+
+
+async def aiter_rows(rows):
+    """Itérateur asynchrone sur un générateur de lignes, un lot de lignes par passage dans le thread de l'ORM"""
+    rows = iter(rows)
+    # thread_sensitive : le curseur de ``iterator()`` reste sur la connexion qui l'a ouvert
+    next_batch = sync_to_async(lambda: ''.join(islice(rows, STREAM_BATCH_ROWS)), thread_sensitive=True)
+    try:
+        while chunk := await next_batch():
+            yield chunk
+    finally:
+        if hasattr(rows, 'close'):
+            await sync_to_async(rows.close, thread_sensitive=True)()
+
+
+STREAM_FORMATS = {
+    # format: (content type, {granularité: générateur})
+    'csv': ('text/csv; charset=utf-8', {'answer': csv_answer_rows, 'submission': csv_submission_rows}),
+    'ndjson': ('application/x-ndjson; charset=utf-8', {'answer': ndjson_answer_rows, 'submission': ndjson_submission_rows}),
+}
@@ -1,7 +1,10 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from .conditions import ConditionCycleError, check_new_condition
+from .definitions import DefinitionError, definition_format, load_document, parse_definitions
 from .models import Survey, Question, Choice, Response, UserProfile
+from .schema import survey_schema
 
 class UserRegistrationForm(UserCreationForm):
     email = forms.EmailField(required=True)
@@ -18,11 +21,49 @@ class UserProfileForm(forms.ModelForm):
 class SurveyForm(forms.ModelForm):
     class Meta:
         model = Survey
-        fields = ('title', 'description', 'is_public', 'password', 'end_date', 'is_anonymous', 'max_responses', 'template')
+        fields = ('title', 'description', 'is_public', 'password', 'end_date', 'is_anonymous', 'max_responses', 'one_response_per_person', 'template')
         widgets = {
             'end_date': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
         }
 
+class SurveyImportForm(forms.Form):
+    """Import de sondages depuis un fichier de définition (voir ``definitions``)"""
+    MAX_SIZE = 5 * 1024 * 1024
+
+    definition = forms.FileField(
+        label='Fichier de définition (JSON ou YAML)',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.json,.yaml,.yml'}),
+    )
+
+    def clean_definition(self):
+        upload = self.cleaned_data['definition']
+        if upload.size > self.MAX_SIZE:
+            raise forms.ValidationError('Le fichier dépasse 5 Mo.')
+        try:
+            self.definitions = parse_definitions(load_document(upload.read(), definition_format(upload.name)))
+        except DefinitionError as exc:
+            raise forms.ValidationError(exc.errors)
+        return upload
+
+class TemplateCloneForm(forms.Form):
+    """Copies d'un sondage modèle : une par titre"""
+    MAX_COPIES = 500
+
+    titles = forms.CharField(
+        label='Titres des sondages à créer (un par ligne)',
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 6}),
+    )
+
+    def clean_titles(self):
+        titles = [line.strip() for line in self.cleaned_data['titles'].splitlines() if line.strip()]
+        if not titles:
+            raise forms.ValidationError('Indiquez au moins un titre.')
+        if len(titles) > self.MAX_COPIES:
+            raise forms.ValidationError(f'{self.MAX_COPIES} sondages au plus à la fois.')
+        if any(len(title) > 200 for title in titles):
+            raise forms.ValidationError('Un titre fait 200 caractères au plus.')
+        return titles
+
 class QuestionForm(forms.ModelForm):
     class Meta:
         model = Question
@@ -36,6 +77,35 @@ class QuestionForm(forms.ModelForm):
             'conditional_value': forms.TextInput(attrs={'class': 'form-control'}),
         }
 
+    def __init__(self, *args, survey=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.survey = survey
+        if survey is not None:
+            # Une condition ne peut porter que sur une question du même sondage
+            queryset = Question.objects.filter(survey=survey)
+            if self.instance.pk:
+                queryset = queryset.exclude(pk=self.instance.pk)
+            self.fields['conditional_question'].queryset = queryset
+
+    def clean(self):
+        cleaned_data = super().clean()
+        parent = cleaned_data.get('conditional_question')
+        if parent is None or self.survey is None:
+            return cleaned_data
+        schema = survey_schema(self.survey)
+        try:
+            check_new_condition(schema.questions, self.instance.pk, parent.pk)
+        except ConditionCycleError as exc:
+            raise forms.ValidationError(
+                f'Cette condition crée une boucle entre les questions ({exc}).'
+            )
+        value = (cleaned_data.get('conditional_value') or '').strip()
+        if value and parent.question_type in ('single_choice', 'multiple_choice'):
+            choices = schema.question(parent.pk).choices
+            if not any(value.casefold() in (choice.text.strip().casefold(), str(choice.pk)) for choice in choices):
+                self.add_error('conditional_value', 'Cette valeur ne correspond à aucun choix de la question.')
+        return cleaned_data
+
 class ChoiceForm(forms.ModelForm):
     class Meta:
         model = Choice
@@ -45,6 +115,33 @@ class ChoiceForm(forms.ModelForm):
             'order': forms.NumberInput(attrs={'class': 'form-control'}),
         }
 
+class ChoiceResponseField(forms.ChoiceField):
+    """Choix unique validé contre les choix déjà chargés de la question (aucune requête)"""
+
+    def __init__(self, choice_objects, **kwargs):
+        choice_objects = list(choice_objects)
+        self.choice_objects = {str(choice.pk): choice for choice in choice_objects}
+        super().__init__(choices=[(choice.pk, choice.text) for choice in choice_objects], **kwargs)
+
+    def clean(self, value):
+        value = super().clean(value)
+        if value in self.empty_values:
+            return None
+        return self.choice_objects[str(value)]
+
+
+class MultipleChoiceResponseField(forms.MultipleChoiceField):
+    """Choix multiple validé contre les choix déjà chargés de la question (aucune requête)"""
+
+    def __init__(self, choice_objects, **kwargs):
+        choice_objects = list(choice_objects)
+        self.choice_objects = {str(choice.pk): choice for choice in choice_objects}
+        super().__init__(choices=[(choice.pk, choice.text) for choice in choice_objects], **kwargs)
+
+    def clean(self, value):
+        value = super().clean(value)
+        return [self.choice_objects[str(pk)] for pk in value]
+
 class ResponseForm(forms.ModelForm):
     class Meta:
         model = Response
@@ -60,24 +157,29 @@ class ResponseForm(forms.ModelForm):
 
         if question:
             if question.question_type == 'single_choice':
-                self.fields['choice_response'] = forms.ModelChoiceField(
-                    queryset=question.choices.all(),
+                self.fields['choice_response'] = ChoiceResponseField(
+                    question.choices.all(),
                     widget=forms.RadioSelect,
                     required=question.required,
-                    empty_label=None
                 )
                 self.fields['text_response'].widget = forms.HiddenInput()
                 self.fields['scale_response'].widget = forms.HiddenInput()
             elif question.question_type == 'multiple_choice':
-                self.fields['choice_response'] = forms.ModelMultipleChoiceField(
-                    queryset=question.choices.all(),
+                self.fields['choice_response'] = MultipleChoiceResponseField(
+                    question.choices.all(),
                     widget=forms.CheckboxSelectMultiple,
                     required=question.required,
                 )
                 self.fields['text_response'].widget = forms.HiddenInput()
                 self.fields['scale_response'].widget = forms.HiddenInput()
             elif question.question_type == 'scale':
-                self.fields['scale_response'].widget = forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'max': 10})
+                scale_min, scale_max = getattr(question, 'scale_bounds', (1, 10))
+                self.fields['scale_response'] = forms.IntegerField(
+                    min_value=scale_min,
+                    max_value=scale_max,
+                    required=question.required,
+                    widget=forms.NumberInput(attrs={'class': 'form-control', 'min': scale_min, 'max': scale_max}),
+                )
                 self.fields['text_response'].widget = forms.HiddenInput()
                 if 'choice_response' in self.fields:
                     del self.fields['choice_response']
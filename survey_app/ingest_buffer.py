@@ -0,0 +1,287 @@
+"""
+Tampon d'ingestion des soumissions (écriture différée) pour les pics de trafic.
+
+Activé par ``SUBMISSION_BUFFER_PATH`` : les soumissions validées sont ajoutées
+à une file durable, un fichier SQLite séparé en mode WAL, au lieu d'être
+écrites dans la base principale. La requête ne prend donc jamais le verrou
+d'écriture de la base principale. ``manage.py flush_submissions`` vide la file
+par gros lots, chacun dans une seule transaction. Un seul processus de vidage
+à la fois.
+
+Sémantique « au moins une fois » : les entrées ne sont retirées de la file
+qu'après le commit du lot. Un rejeu (arrêt entre le commit et la suppression)
+est sans effet, car chaque entrée porte une clé d'idempotence enregistrée dans
+``Submission.idempotency_key``. La limite ``max_responses`` est vérifiée
+approximativement à l'ajout, puis strictement au vidage : les soumissions en
+excès sont alors écartées. De même pour les sondages à une réponse par
+personne (``respondent_filter``) : les doublons sont écartés au vidage.
+"""
+import json
+import sqlite3
+import threading
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Survey, Question, Submission, Response, Choice
+from .respondent_filter import claim_respondent, respondent_key
+from .submission import SurveyLimitReached
+from .tallies import record_submission
+
+QueuedSubmission = namedtuple('QueuedSubmission', 'idempotency_key survey_id')
+
+FLUSH_BATCH_SIZE = 500
+_local = threading.local()
+
+
+class BufferUnavailable(Exception):
+    """Le tampon d'ingestion n'est pas configuré"""
+
+
+def buffer_path():
+    return getattr(settings, 'SUBMISSION_BUFFER_PATH', None)
+
+
+def is_enabled():
+    return bool(buffer_path())
+
+
+def queue_connection():
+    """Connexion SQLite à la file, une par thread et par fichier"""
+    path = buffer_path()
+    if not path:
+        raise BufferUnavailable('SUBMISSION_BUFFER_PATH n\'est pas défini')
+    path = str(path)
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    connection = connections.get(path)
+    if connection is None:
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        # FULL : une soumission acquittée survit à une coupure de courant
+        connection.execute('PRAGMA synchronous=FULL')
+        create_queue(connection)
+        connections[path] = connection
+    return connection
+
+
+def create_queue(connection):
+    """
+    Crée la table de la file. Comme ``Submission.idempotency_key``, une clé
+    est unique par sondage : le même formulaire rejoué sur un autre sondage
+    est une autre soumission. Une file créée avant la colonne ``survey_id``
+    est convertie, entrées en attente comprises.
+    """
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(pending)')]
+        if columns and 'survey_id' not in columns:
+            connection.execute('ALTER TABLE pending RENAME TO pending_old')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS pending ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' survey_id INTEGER NOT NULL,'
+            ' idempotency_key TEXT NOT NULL,'
+            ' payload TEXT NOT NULL,'
+            ' UNIQUE (survey_id, idempotency_key))'
+        )
+        if columns and 'survey_id' not in columns:
+            connection.execute(
+                'INSERT INTO pending (id, survey_id, idempotency_key, payload)'
+                " SELECT id, json_extract(payload, '$.survey_id'), idempotency_key, payload FROM pending_old"
+            )
+            connection.execute('DROP TABLE pending_old')
+        connection.execute('COMMIT')
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+
+
+def answer_payload(question, form):
+    response = form.save(commit=False)
+    choices = form.cleaned_data.get('choice_response') or []
+    if not isinstance(choices, (list, tuple)):
+        choices = [choices]
+    return {
+        'question_id': question.id,
+        'text': response.text_response,
+        'scale': response.scale_response,
+        'choices': [choice.pk for choice in choices],
+    }
+
+
+def enqueue(survey, question_forms, user=None, ip_address=None, started_at=None, idempotency_key=None):
+    """
+    Ajoute une soumission validée à la file. Un second ajout avec la même
+    clé pour le même sondage est ignoré. Retourne un ``QueuedSubmission``.
+    """
+    if survey.is_full():
+        raise SurveyLimitReached(survey.pk)
+    now = timezone.now()
+    key = idempotency_key or uuid.uuid4().hex
+    payload = {
+        'survey_id': survey.pk,
+        'user_id': user.pk if user is not None else None,
+        'ip_address': ip_address,
+        'started_at': (started_at or now).isoformat(),
+        'finished_at': now.isoformat(),
+        'answers': [answer_payload(question, form) for question, form in question_forms],
+    }
+    queue_connection().execute(
+        'INSERT OR IGNORE INTO pending (survey_id, idempotency_key, payload) VALUES (?, ?, ?)',
+        (survey.pk, key, json.dumps(payload)),
+    )
+    return QueuedSubmission(key, survey.pk)
+
+
+def pending_count():
+    return queue_connection().execute('SELECT COUNT(*) FROM pending').fetchone()[0]
+
+
+def flush(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Écrit au plus ``batch_size`` entrées de la file dans la base principale.
+
+    Retourne ``(entrées traitées, soumissions créées)`` ; les entrées déjà
+    enregistrées (rejeu) ou refusées (sondage complet) sont traitées sans
+    rien créer.
+    """
+    queue = queue_connection()
+    rows = queue.execute(
+        'SELECT id, idempotency_key, payload FROM pending ORDER BY id LIMIT ?', (batch_size,)
+    ).fetchall()
+    if not rows:
+        return 0, 0
+
+    entries = [(key, json.loads(payload)) for _, key, payload in rows]
+    with transaction.atomic():
+        created = write_entries(entries)
+    # Après le commit seulement : un arrêt ici provoque un rejeu sans effet
+    queue.execute(f'DELETE FROM pending WHERE id IN ({",".join("?" * len(rows))})', [row[0] for row in rows])
+    return len(rows), created
+
+
+def write_entries(entries):
+    """Insère par lots les entrées ``(clé, payload)`` encore absentes ; retourne le nombre de soumissions créées"""
+    # Les clés sont uniques par sondage : une entrée est connue si son couple (sondage, clé) l'est
+    known = set(
+        Submission.objects.filter(
+            survey_id__in={payload['survey_id'] for _, payload in entries},
+            idempotency_key__in=[key for key, _ in entries],
+        ).values_list('survey_id', 'idempotency_key')
+    )
+    entries = [(key, payload) for key, payload in entries if (payload['survey_id'], key) not in known]
+    entries = accept_within_limits(drop_repeat_respondents(entries))
+    if not entries:
+        return 0
+
+    # Questions, choix ou comptes supprimés depuis l'ajout à la file : ignorés
+    survey_ids = {payload['survey_id'] for _, payload in entries}
+    question_ids = set(Question.objects.filter(survey_id__in=survey_ids).values_list('id', flat=True))
+    choice_ids = set(Choice.objects.filter(question__survey_id__in=survey_ids).values_list('id', flat=True))
+    user_ids = set(User.objects.filter(
+        pk__in={payload['user_id'] for _, payload in entries if payload['user_id']}
+    ).values_list('id', flat=True))
+
+    submissions = [
+        Submission(
+            survey_id=payload['survey_id'],
+            user_id=payload['user_id'] if payload['user_id'] in user_ids else None,
+            ip_address=payload['ip_address'],
+            started_at=datetime.fromisoformat(payload['started_at']),
+            finished_at=datetime.fromisoformat(payload['finished_at']),
+            idempotency_key=key,
+        )
+        for key, payload in entries
+    ]
+    Submission.objects.bulk_create(submissions)
+
+    responses = []
+    choices_by_response = []
+    for submission, (_, payload) in zip(submissions, entries):
+        for answer in payload['answers']:
+            if answer['question_id'] not in question_ids:
+                continue
+            responses.append(Response(
+                survey_id=submission.survey_id,
+                submission=submission,
+                question_id=answer['question_id'],
+                user_id=submission.user_id,
+                ip_address=submission.ip_address,
+                created_at=submission.finished_at,
+                text_response=answer['text'],
+                scale_response=answer['scale'],
+            ))
+            choices_by_response.append([Choice(pk=choice_id) for choice_id in answer['choices'] if choice_id in choice_ids])
+    Response.objects.bulk_create(responses, batch_size=FLUSH_BATCH_SIZE)
+    through = Response.choice_response.through
+    through.objects.bulk_create(
+        [
+            through(response_id=response.pk, choice_id=choice.pk)
+            for response, choices in zip(responses, choices_by_response)
+            for choice in choices
+        ],
+        batch_size=FLUSH_BATCH_SIZE * 5,
+    )
+    record_submission(responses, choices_by_response)
+    return len(submissions)
+
+
+def drop_repeat_respondents(entries):
+    """
+    Écarte les entrées des personnes ayant déjà répondu à un sondage à une
+    réponse par personne (en base ou plus tôt dans le même lot), et ajoute
+    les autres au filtre des répondants.
+    """
+    strict = set(Survey.objects.filter(
+        pk__in={payload['survey_id'] for _, payload in entries}, one_response_per_person=True,
+    ).values_list('pk', flat=True))
+    if not strict:
+        return entries
+    seen = set()
+    kept = []
+    for key, payload in entries:
+        survey_id = payload['survey_id']
+        respondent = respondent_key(payload['user_id'], payload['ip_address'])
+        if survey_id in strict and respondent is not None:
+            # Les soumissions du lot ne sont pas encore en base : claim_respondent ne les voit pas
+            if (survey_id, respondent) in seen:
+                continue
+            if not claim_respondent(survey_id, payload['user_id'], payload['ip_address']):
+                continue
+            seen.add((survey_id, respondent))
+        kept.append((key, payload))
+    return kept
+
+
+def accept_within_limits(entries):
+    """
+    Garde les entrées que ``max_responses`` autorise, dans l'ordre d'arrivée,
+    et avance ``respondent_count`` d'autant (une mise à jour par sondage).
+    """
+    wanted = {}
+    for _, payload in entries:
+        wanted[payload['survey_id']] = wanted.get(payload['survey_id'], 0) + 1
+    surveys = Survey.objects.filter(pk__in=wanted).only('max_responses', 'respondent_count').in_bulk()
+
+    accepted = {}
+    kept = []
+    for key, payload in entries:
+        survey = surveys.get(payload['survey_id'])
+        if survey is None:
+            continue
+        count = accepted.get(survey.pk, 0)
+        if survey.max_responses > 0 and survey.respondent_count + count >= survey.max_responses:
+            continue
+        accepted[survey.pk] = count + 1
+        kept.append((key, payload))
+    for survey_id, count in accepted.items():
+        Survey.objects.filter(pk=survey_id).update(respondent_count=F('respondent_count') + count)
+    return kept
@@ -0,0 +1,249 @@
+"""
+Instrumentation des requêtes : nombre et durée des requêtes SQL, temps de
+rendu des gabarits, taille de la réponse et pic d'allocation, par vue.
+
+- ``RequestMetricsMiddleware`` mesure chaque requête et écrit une ligne JSON
+  dans le logger ``survey_app.metrics`` ; synchrone ou asynchrone selon la
+  chaîne (sous ASGI, les vues asynchrones ne sont pas adaptées en synchrone) ;
+- les requêtes SQL lentes (``SLOW_QUERY_MS``) sont échantillonnées
+  (``SLOW_QUERY_SAMPLE_RATE``) avec leur SQL et la pile d'appel du projet
+  dans ``survey_app.slow_queries`` ;
+- ``VIEW_QUERY_BUDGETS`` fixe un nombre maximal de requêtes par vue : un
+  dépassement lève ``QueryBudgetExceeded`` si ``QUERY_BUDGET_STRICT`` (activé
+  par ``BudgetTestRunner`` pendant les tests), sinon il est journalisé ;
+- ``metrics_view`` expose les compteurs cumulés au format texte Prometheus,
+  aux seules adresses locales. Les compteurs sont propres à chaque processus.
+"""
+import json
+import logging
+import random
+import threading
+import time
+import tracemalloc
+import traceback
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, Http404
+from django.template.backends.django import DjangoTemplates, Template
+from django.test.runner import DiscoverRunner
+
+logger = logging.getLogger('survey_app.metrics')
+slow_query_logger = logging.getLogger('survey_app.slow_queries')
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+current_metrics = ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """Une vue a dépassé son budget de requêtes SQL (``VIEW_QUERY_BUDGETS``)"""
+
+
+@dataclass
+class RequestMetrics:
+    queries: int = 0
+    db_time: float = 0.0
+    template_time: float = 0.0
+    slow_queries: list = field(default_factory=list)
+
+
+def record_query(execute, sql, params, many, context):
+    """Enveloppe d'exécution installée sur chaque connexion (voir ``install_query_recorder``)"""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        metrics.queries += 1
+        metrics.db_time += duration
+        threshold = getattr(settings, 'SLOW_QUERY_MS', 100) / 1000
+        if duration >= threshold and random.random() < getattr(settings, 'SLOW_QUERY_SAMPLE_RATE', 1.0):
+            metrics.slow_queries.append({
+                'sql': sql,
+                'duration_ms': round(duration * 1000, 2),
+                'stack': project_stack(),
+            })
+
+
+def project_stack(limit=15):
+    """Pile d'appel réduite aux fichiers du projet (sans Django ni bibliothèques)"""
+    base = str(Path(settings.BASE_DIR))
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(base) and 'site-packages' not in frame.filename
+    ]
+    return [f'{frame.filename}:{frame.lineno} in {frame.name}' for frame in frames[-limit:]]
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Moteur de gabarits Django mesurant le temps de rendu de chaque page"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class MetricsRegistry:
+    """Compteurs cumulés par vue, au format Prometheus"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view, duration, metrics, response_size):
+        with self.lock:
+            stats = self.views.setdefault(view, {
+                'requests': 0, 'duration': 0.0, 'queries': 0, 'db_time': 0.0,
+                'template_time': 0.0, 'response_bytes': 0, 'slow_queries': 0,
+                'buckets': [0] * len(DURATION_BUCKETS),
+            })
+            stats['requests'] += 1
+            stats['duration'] += duration
+            stats['queries'] += metrics.queries
+            stats['db_time'] += metrics.db_time
+            stats['template_time'] += metrics.template_time
+            stats['response_bytes'] += response_size or 0
+            stats['slow_queries'] += len(metrics.slow_queries)
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    stats['buckets'][index] += 1
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text, key):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for view, stats in sorted(self.views.items()):
+                lines.append(f'{name}{{view="{view}"}} {stats[key]}')
+
+        with self.lock:
+            family('survey_http_requests_total', 'counter', 'Requêtes HTTP traitées', 'requests')
+            family('survey_db_queries_total', 'counter', 'Requêtes SQL exécutées', 'queries')
+            family('survey_db_seconds_total', 'counter', 'Temps passé en base', 'db_time')
+            family('survey_template_seconds_total', 'counter', 'Temps de rendu des gabarits', 'template_time')
+            family('survey_response_bytes_total', 'counter', 'Octets de réponse', 'response_bytes')
+            family('survey_slow_queries_total', 'counter', 'Requêtes SQL lentes échantillonnées', 'slow_queries')
+            lines.append('# HELP survey_http_request_duration_seconds Durée des requêtes HTTP')
+            lines.append('# TYPE survey_http_request_duration_seconds histogram')
+            for view, stats in sorted(self.views.items()):
+                # Les compteurs de seaux sont déjà cumulatifs (<= borne)
+                for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+                    lines.append(f'survey_http_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {count}')
+                lines.append(f'survey_http_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {stats["requests"]}')
+                lines.append(f'survey_http_request_duration_seconds_sum{{view="{view}"}} {stats["duration"]}')
+                lines.append(f'survey_http_request_duration_seconds_count{{view="{view}"}} {stats["requests"]}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token, trace_memory, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, trace_memory, start)
+
+    async def __acall__(self, request):
+        metrics, token, trace_memory, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, trace_memory, start)
+
+    def start(self):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        trace_memory = getattr(settings, 'REQUEST_METRICS_TRACEMALLOC', False) and tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.reset_peak()
+        return metrics, token, trace_memory, time.perf_counter()
+
+    def finish(self, request, response, metrics, trace_memory, start):
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        response_size = None if response.streaming else len(response.content)
+        REGISTRY.observe(view, duration, metrics, response_size)
+        logger.info(json.dumps({
+            'view': view,
+            'method': request.method,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'template_ms': round(metrics.template_time * 1000, 2),
+            'response_bytes': response_size,
+            'peak_alloc_bytes': tracemalloc.get_traced_memory()[1] if trace_memory else None,
+        }))
+        for query in metrics.slow_queries:
+            slow_query_logger.warning(json.dumps({'view': view, **query}))
+
+        budget = getattr(settings, 'VIEW_QUERY_BUDGETS', {}).get(view)
+        if budget is not None and metrics.queries > budget:
+            message = f'{view} : {metrics.queries} requêtes SQL pour un budget de {budget}'
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+def metrics_view(request):
+    """Compteurs au format texte Prometheus ; adresses locales uniquement"""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', LOCAL_ADDRESSES)
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        raise Http404()
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class BudgetTestRunner(DiscoverRunner):
+    """Lanceur de tests : les dépassements de budget de requêtes font échouer les tests"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_STRICT = True
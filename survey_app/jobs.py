@@ -0,0 +1,140 @@
+"""
+File d'attente des exports PDF, stockée en base (aucun broker externe).
+
+La vue d'export crée un ``ExportJob`` ; ``manage.py run_export_worker`` les
+réclame un par un (mise à jour conditionnelle du statut) et les exécute dans
+un pool de processus. Les fichiers sont mis en cache sur disque sous une clé
+(sondage, plus grand id de réponse) : tant qu'aucune nouvelle réponse
+n'arrive, un nouvel export est servi directement depuis le disque.
+"""
+import os
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ExportJob, Response
+
+ACTIVE_STATUSES = (ExportJob.STATUS_PENDING, ExportJob.STATUS_RUNNING)
+
+
+def export_root():
+    return Path(getattr(settings, 'EXPORT_ROOT', Path(settings.BASE_DIR) / 'exports'))
+
+
+def export_watermark(survey):
+    """Plus grand id de réponse du sondage (0 sans réponse) : change à chaque soumission"""
+    return Response.objects.filter(survey=survey).aggregate(watermark=Max('id'))['watermark'] or 0
+
+
+def cache_path(survey_id, watermark):
+    return export_root() / f'survey-{survey_id}-{watermark}.pdf'
+
+
+def request_export(survey, user=None):
+    """
+    Retourne le job d'export correspondant à l'état actuel du sondage.
+
+    Réutilise un job en cours ou terminé pour le même filigrane ; si le
+    fichier existe déjà sur disque, le job créé est immédiatement terminé.
+    """
+    watermark = export_watermark(survey)
+    existing = (
+        ExportJob.objects.filter(
+            survey=survey, watermark=watermark,
+            status__in=ACTIVE_STATUSES + (ExportJob.STATUS_DONE,),
+        ).order_by('-id').first()
+    )
+    if existing and (existing.status in ACTIVE_STATUSES or job_file(existing)):
+        return existing
+
+    path = cache_path(survey.id, watermark)
+    if path.exists():
+        now = timezone.now()
+        return ExportJob.objects.create(
+            survey=survey, requested_by=user, watermark=watermark,
+            status=ExportJob.STATUS_DONE, file_path=str(path),
+            started_at=now, finished_at=now,
+        )
+    return ExportJob.objects.create(survey=survey, requested_by=user, watermark=watermark)
+
+
+def claim_next_job():
+    """Réclame le plus ancien job en attente ; None si la file est vide"""
+    while True:
+        job_id = (
+            ExportJob.objects.filter(status=ExportJob.STATUS_PENDING)
+            .order_by('created_at', 'id').values_list('id', flat=True).first()
+        )
+        if job_id is None:
+            return None
+        # Mise à jour conditionnelle : un seul worker gagne le job
+        claimed = ExportJob.objects.filter(id=job_id, status=ExportJob.STATUS_PENDING).update(
+            status=ExportJob.STATUS_RUNNING, started_at=timezone.now()
+        )
+        if claimed:
+            return job_id
+
+
+def claim_job(job_id):
+    """Réclame un job précis s'il est encore en attente ; False si un worker l'a déjà pris"""
+    return bool(ExportJob.objects.filter(id=job_id, status=ExportJob.STATUS_PENDING).update(
+        status=ExportJob.STATUS_RUNNING, started_at=timezone.now()
+    ))
+
+
+def requeue_stale_jobs(max_age):
+    """Remet en attente les jobs restés « en cours » plus de ``max_age`` secondes (worker arrêté)"""
+    return ExportJob.objects.filter(
+        status=ExportJob.STATUS_RUNNING,
+        started_at__lt=timezone.now() - timedelta(seconds=max_age),
+    ).update(status=ExportJob.STATUS_PENDING, started_at=None)
+
+
+def run_job(job_id):
+    """
+    Produit le fichier d'un job réclamé. Exécuté dans un processus du pool.
+
+    Le PDF est écrit dans un fichier temporaire puis renommé atomiquement ;
+    les fichiers des filigranes précédents du même sondage sont supprimés.
+    """
+    from .pdf import build_results_pdf
+    from .submission import survey_questions
+
+    job = ExportJob.objects.select_related('survey').get(pk=job_id)
+    path = cache_path(job.survey_id, job.watermark)
+    try:
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as fileobj:
+                    build_results_pdf(job.survey, survey_questions(job.survey), fileobj)
+                os.replace(tmp_name, path)
+            except BaseException:
+                os.unlink(tmp_name)
+                raise
+            for old in path.parent.glob(f'survey-{job.survey_id}-*.pdf'):
+                if old != path:
+                    old.unlink(missing_ok=True)
+    except Exception as exc:
+        ExportJob.objects.filter(pk=job_id).update(
+            status=ExportJob.STATUS_FAILED, error=repr(exc), finished_at=timezone.now()
+        )
+        return job_id, False
+
+    ExportJob.objects.filter(pk=job_id).update(
+        status=ExportJob.STATUS_DONE, file_path=str(path), finished_at=timezone.now()
+    )
+    return job_id, True
+
+
+def job_file(job):
+    """Chemin du fichier d'un job terminé, ou None s'il a disparu du disque"""
+    if job.status != ExportJob.STATUS_DONE or not job.file_path:
+        return None
+    path = Path(job.file_path)
+    return path if path.exists() else None
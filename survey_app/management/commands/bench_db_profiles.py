@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+from django.utils.http import urlencode
+
+from survey_app.benchmarks import (
+    benchmark_database, benchmark_user, build_survey, seed_submissions, submission_post_data,
+    percentile, run_concurrently,
+)
+from survey_app.models import Survey
+from survey_app.results import survey_dashboard
+from survey_app.schema import survey_schema
+from survey_app.submission import submit_survey
+from survey_project.db_profiles import PROFILES
+
+
+class Command(BaseCommand):
+    help = (
+        'Rejoue une charge synthétique (soumissions et consultations des résultats) contre '
+        'chaque profil de base (SURVEY_DB_PROFILE) et compare au premier profil'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=['sqlite-basic', 'sqlite'],
+                            help='Profils comparés ; le premier sert de référence')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--operations', type=int, default=1000)
+        parser.add_argument('--write-ratio', type=float, default=0.3,
+                            help='Part des opérations qui sont des soumissions')
+        parser.add_argument('--seed-submissions', type=int, default=2000,
+                            help='Soumissions existantes avant la mesure')
+        # Usage interne : mesure d'un profil dans un processus fils
+        parser.add_argument('--run-profile', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['run_profile']:
+            self.stdout.write(json.dumps(run_workload(options)))
+            return
+
+        self.stdout.write(
+            f"{'profil':>13} {'op./s':>9} {'p50 ms':>9} {'p99 ms':>9} {'erreurs':>8} {'gain débit':>11} {'gain p99':>9}"
+        )
+        baseline = None
+        for profile in options['profiles']:
+            # Un processus par profil : DATABASES est figé au démarrage de Django
+            command = [
+                sys.executable, 'manage.py', 'bench_db_profiles', '--run-profile', profile,
+                '--concurrency', str(options['concurrency']),
+                '--operations', str(options['operations']),
+                '--write-ratio', str(options['write_ratio']),
+                '--seed-submissions', str(options['seed_submissions']),
+            ]
+            result = subprocess.run(
+                command, cwd=settings.BASE_DIR, capture_output=True, text=True,
+                env={**os.environ, 'SURVEY_DB_PROFILE': profile},
+            )
+            if result.returncode:
+                raise CommandError(f'Profil {profile} en échec :\n{result.stderr}')
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            baseline = baseline or stats
+            self.stdout.write(
+                f"{profile:>13} {stats['throughput']:>9.1f} {stats['p50']:>9.2f} {stats['p99']:>9.2f} "
+                f"{stats['errors']:>8} {stats['throughput'] / baseline['throughput']:>10.2f}x "
+                f"{baseline['p99'] / stats['p99'] if stats['p99'] else 0:>8.2f}x"
+            )
+
+
+def run_workload(options):
+    """Charge mixte dans une base de test du profil courant ; statistiques en dictionnaire"""
+    with benchmark_database(on_disk=True):
+        user = benchmark_user()
+        survey = build_survey(user, 20)
+        seed_submissions(survey, options['seed_submissions'])
+        data = QueryDict(urlencode(submission_post_data(survey), doseq=True))
+        questions = survey_schema(survey).questions
+        rng = random.Random(0)
+
+        def operation():
+            if rng.random() < options['write_ratio']:
+                _, submission = submit_survey(survey, questions, data, user=user, ip_address='127.0.0.1')
+                return submission is not None
+            current = Survey.objects.get(pk=survey.pk)
+            return bool(survey_dashboard(current, survey_schema(current).questions))
+
+        elapsed, durations, errors = run_concurrently(operation, options['concurrency'], options['operations'])
+    return {
+        'throughput': len(durations) / elapsed,
+        'p50': percentile(durations, 0.5),
+        'p99': percentile(durations, 0.99),
+        'errors': errors,
+    }
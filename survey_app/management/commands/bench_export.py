@@ -0,0 +1,51 @@
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from survey_app.benchmarks import benchmark_database, benchmark_user, build_survey, seed_submissions
+from survey_app.pdf import build_results_pdf
+from survey_app.submission import survey_questions
+
+
+class Command(BaseCommand):
+    help = "Mesure la durée et la mémoire du rendu de l'export PDF (tel qu'exécuté par run_export_worker)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                            help='Nombre de réponses des sondages mesurés')
+        parser.add_argument('--questions', type=int, default=10,
+                            help='Nombre de questions par sondage')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            user = benchmark_user()
+
+            self.stdout.write(
+                f"{'réponses':>10} {'durée s':>9} {'taille Ko':>10} {'pic Python Mo':>14} {'RSS max Mo':>11}"
+            )
+            for size in options['sizes']:
+                survey = build_survey(user, options['questions'], title=f'Export {size}')
+                seed_submissions(survey, max(1, size // options['questions']), users=[user])
+
+                start = time.perf_counter()
+                length = self.export(survey)
+                duration = time.perf_counter() - start
+
+                # Deuxième passage sous tracemalloc, qui ralentit l'exécution : seul le pic est retenu
+                tracemalloc.start()
+                self.export(survey)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                self.stdout.write(
+                    f"{size:>10} {duration:>9.2f} {length / 1024:>10.0f} {peak / 2 ** 20:>14.1f} {max_rss:>11.0f}"
+                )
+
+    def export(self, survey):
+        with tempfile.TemporaryFile() as fileobj:
+            build_results_pdf(survey, survey_questions(survey), fileobj)
+            return fileobj.tell()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+from django.test import override_settings
+from django.utils.http import urlencode
+
+from survey_app import ingest_buffer
+from survey_app.benchmarks import (
+    benchmark_database, benchmark_user, build_survey, submission_post_data, percentile, run_concurrently
+)
+from survey_app.schema import survey_schema
+from survey_app.submission import submit_survey
+
+
+class Command(BaseCommand):
+    help = (
+        'Débit des soumissions concurrentes : écriture directe dans SQLite contre '
+        'tampon d\'ingestion (file WAL puis vidage par lots)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32],
+                            help='Nombres de soumetteurs simultanés')
+        parser.add_argument('--submissions', type=int, default=400,
+                            help='Soumissions par mesure')
+        parser.add_argument('--questions', type=int, default=20,
+                            help='Questions du sondage')
+
+    def handle(self, *args, **options):
+        with benchmark_database(on_disk=True), tempfile.TemporaryDirectory() as directory:
+            user = benchmark_user()
+            survey = build_survey(user, options['questions'])
+            data = QueryDict(urlencode(submission_post_data(survey), doseq=True))
+            questions = survey_schema(survey).questions
+
+            def submit():
+                _, submission = submit_survey(survey, questions, data, user=user, ip_address='127.0.0.1')
+                return submission is not None
+
+            self.stdout.write(
+                f"{'mode':>8} {'soumetteurs':>11} {'soum./s':>9} {'p50 ms':>9} {'p99 ms':>9} "
+                f"{'erreurs':>8} {'vidage/s':>9}"
+            )
+            for concurrency in options['concurrency']:
+                for mode in ('direct', 'tampon'):
+                    path = os.path.join(directory, f'buffer-{concurrency}.sqlite3') if mode == 'tampon' else None
+                    with override_settings(SUBMISSION_BUFFER_PATH=path):
+                        elapsed, durations, errors = run_concurrently(
+                            submit, concurrency, options['submissions'],
+                        )
+                        flush_rate = ''
+                        if path:
+                            start = time.perf_counter()
+                            created = 0
+                            while True:
+                                processed, count = ingest_buffer.flush()
+                                if not processed:
+                                    break
+                                created += count
+                            flush_rate = f'{created / (time.perf_counter() - start):.0f}'
+                    self.stdout.write(
+                        f"{mode:>8} {concurrency:>11} {len(durations) / elapsed:>9.1f} "
+                        f"{percentile(durations, 0.5):>9.2f} {percentile(durations, 0.99):>9.2f} "
+                        f"{errors:>8} {flush_rate:>9}"
+                    )
+
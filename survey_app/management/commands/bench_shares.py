@@ -0,0 +1,76 @@
+import secrets
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from survey_app import share_links
+from survey_app.benchmarks import benchmark_database, benchmark_user, build_survey, percentile
+from survey_app.models import SurveyShare
+
+
+class Command(BaseCommand):
+    help = (
+        'Mesure la résolution des liens de partage (LRU local, cache partagé, base, '
+        'jetons inconnus) sur une base temporaire de --shares liens'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shares', type=int, default=1_000_000)
+        parser.add_argument('--lookups', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            survey = build_survey(benchmark_user(), 1)
+            tokens = self.seed(survey, options['shares'])
+            sample = tokens[::max(1, len(tokens) // options['lookups'])][:options['lookups']]
+            unknown = [secrets.token_urlsafe(16) for _ in sample]
+
+            def reset_all():
+                cache.clear()
+                share_links.local_cache.clear()
+
+            self.stdout.write(f"{'niveau':>16} {'moy. µs':>9} {'p50 µs':>9} {'p99 µs':>9}")
+            self.report('base (index)', sample, before_each=reset_all)
+            self.warm(sample)
+            self.report('cache partagé', sample, before_each=share_links.local_cache.clear)
+            self.warm(sample)
+            self.report('LRU local', sample)
+            reset_all()
+            self.report('inconnu (base)', unknown)
+            share_links.local_cache.clear()
+            self.report('inconnu (cache)', unknown)
+
+    def seed(self, survey, count, batch_size=20000):
+        tokens = []
+        now = timezone.now()
+        with transaction.atomic():
+            for start in range(0, count, batch_size):
+                batch = [secrets.token_urlsafe(16) for _ in range(min(batch_size, count - start))]
+                SurveyShare.objects.bulk_create([
+                    SurveyShare(survey=survey, share_token=token, expires_at=now + timedelta(days=30))
+                    for token in batch
+                ])
+                tokens.extend(batch)
+        self.stdout.write(f'{len(tokens)} liens créés.')
+        return tokens
+
+    def warm(self, tokens):
+        for token in tokens:
+            share_links.resolve_share(token)
+
+    def report(self, label, tokens, before_each=None):
+        durations = []
+        for token in tokens:
+            if before_each is not None:
+                before_each()
+            start = time.perf_counter()
+            share_links.resolve_share(token)
+            durations.append((time.perf_counter() - start) * 1_000_000)
+        self.stdout.write(
+            f'{label:>16} {sum(durations) / len(durations):>9.1f} '
+            f'{percentile(durations, 0.5):>9.1f} {percentile(durations, 0.99):>9.1f}'
+        )
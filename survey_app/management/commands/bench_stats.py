@@ -0,0 +1,50 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from survey_app import stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Mesure le moteur de statistiques sur des données synthétiques en mémoire '
+        '(NumPy si installé, sinon repli en Python pur) : résumé de valeurs brutes, '
+        'résumé d\'histogramme, co-occurrence des choix'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--answers', type=int, default=10_000_000)
+        parser.add_argument('--choices', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        answers, size = options['answers'], options['choices']
+        self.stdout.write(f"Moteur : {'NumPy ' + stats.np.__version__ if stats.np is not None else 'Python pur'}")
+        values, pairs = self.generate(answers, size, options['seed'])
+        choice_ids = list(range(100, 100 + size))
+
+        def timed(label, func):
+            start = time.perf_counter()
+            result = func()
+            self.stdout.write(f'{label:>28} : {(time.perf_counter() - start) * 1000:9.1f} ms')
+            return result
+
+        histogram = timed(f'histogramme ({answers} val.)', lambda: stats.histogram(values))
+        timed(f'résumé brut ({answers} val.)', lambda: stats.summarize_values(values))
+        timed('résumé d\'histogramme', lambda: stats.summarize(histogram))
+        timed(f'co-occurrence ({answers} sél.)', lambda: stats.cooccurrence(pairs, choice_ids))
+
+    def generate(self, answers, size, seed):
+        """Valeurs d'échelle 1..10 et sélections triées par réponse (environ deux choix par réponse)"""
+        np = stats.np
+        if np is None:
+            rng = random.Random(seed)
+            values = [rng.randint(1, 10) for _ in range(answers)]
+            pairs = sorted((rng.randrange(answers // 2), 100 + rng.randrange(size)) for _ in range(answers))
+            return values, list(dict.fromkeys(pairs))
+        rng = np.random.default_rng(seed)
+        values = rng.integers(1, 11, size=answers)
+        response_ids = np.sort(rng.integers(0, answers // 2, size=answers))
+        choice_ids = 100 + rng.integers(0, size, size=answers)
+        return values, (response_ids, choice_ids)
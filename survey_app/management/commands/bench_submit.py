@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from survey_app.benchmarks import (
+    benchmark_database, benchmark_user, build_survey, submission_post_data, measure, percentile
+)
+
+
+class Command(BaseCommand):
+    help = 'Mesure les requêtes et la latence par soumission de TakeSurveyView.post'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200],
+                            help='Nombre de questions des sondages mesurés')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Nombre de soumissions par taille de sondage')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            user = benchmark_user()
+            client = Client()
+            client.force_login(user)
+
+            self.stdout.write(f"{'questions':>10} {'requêtes':>9} {'moy. ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+            for size in options['sizes']:
+                survey = build_survey(user, size)
+                url = reverse('survey_app:take_survey', args=[survey.id])
+                data = submission_post_data(survey)
+
+                def submit():
+                    response = client.post(url, data)
+                    assert response.status_code == 302, response.status_code
+
+                queries, durations = measure(submit, options['repeat'])
+                self.stdout.write(
+                    f"{size:>10} {queries:>9} {sum(durations) / len(durations):>9.2f} "
+                    f"{percentile(durations, 0.5):>9.2f} {percentile(durations, 0.95):>9.2f}"
+                )
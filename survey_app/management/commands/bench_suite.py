@@ -0,0 +1,167 @@
+import json
+import platform
+import tempfile
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from survey_app.benchmarks import (
+    benchmark_database, benchmark_user, build_survey, seed_submissions, submission_post_data,
+    measure, percentile,
+)
+from survey_app.jobs import claim_next_job, run_job, job_file
+from survey_app.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = (
+        'Mesure requêtes SQL et latence des vues principales (accueil, détail, réponse GET/POST, '
+        'résultats, export PDF) ; enregistre une référence JSON et la compare aux mesures suivantes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Mesures par scénario')
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--responses', type=int, default=20000,
+                            help='Réponses existantes dans le sondage mesuré')
+        parser.add_argument('--save', metavar='FICHIER', help='Enregistre les mesures comme référence JSON')
+        parser.add_argument('--compare', metavar='FICHIER', help='Compare à une référence JSON')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Hausse relative de latence médiane tolérée avant de signaler une régression')
+        parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                            help='Écart absolu de latence médiane en dessous duquel on ne signale rien')
+        parser.add_argument('--no-fail', action='store_true',
+                            help='Affiche les régressions sans échouer')
+
+    def handle(self, *args, **options):
+        with benchmark_database(), tempfile.TemporaryDirectory() as export_root, \
+                override_settings(EXPORT_ROOT=export_root):
+            results = self.run_scenarios(options)
+
+        report = {
+            'meta': {
+                'questions': options['questions'],
+                'responses': options['responses'],
+                'repeat': options['repeat'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'scenarios': results,
+        }
+        self.stdout.write(f"{'scénario':>14} {'requêtes':>9} {'moy. ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{name:>14} {stats['queries']:>9} {stats['mean_ms']:>9.2f} "
+                f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f}"
+            )
+        if options['save']:
+            with open(options['save'], 'w') as fileobj:
+                json.dump(report, fileobj, indent=2)
+            self.stdout.write(f"Référence enregistrée dans {options['save']}.")
+        if options['compare']:
+            self.compare(report, options)
+
+    def run_scenarios(self, options):
+        user = benchmark_user()
+        survey = build_survey(user, options['questions'])
+        seed_submissions(survey, max(1, options['responses'] // options['questions']), users=[user])
+        data = submission_post_data(survey)
+
+        anonymous = Client()
+        client = Client()
+        client.force_login(user)
+
+        def uncached(url):
+            # Les pages publiques sont mises en cache : on mesure le rendu complet
+            def run():
+                cache.clear()
+                response = anonymous.get(url)
+                assert response.status_code == 200, response.status_code
+            return run
+
+        def get(url, status=200):
+            def run():
+                response = client.get(url)
+                assert response.status_code == status, response.status_code
+            return run
+
+        def post():
+            response = client.post(reverse('survey_app:take_survey', args=[survey.id]), data)
+            assert response.status_code == 302, response.status_code
+
+        def export():
+            response = client.get(reverse('survey_app:export_results', args=[survey.id]))
+            assert response.status_code == 302, response.status_code
+            job_id = claim_next_job()
+            if job_id is not None:
+                run_job(job_id)
+            # Le fichier est supprimé pour que chaque mesure refasse le rendu
+            for job in ExportJob.objects.filter(survey=survey, status=ExportJob.STATUS_DONE):
+                path = job_file(job)
+                if path:
+                    path.unlink()
+
+        scenarios = {
+            'home': uncached(reverse('survey_app:home')),
+            'survey_detail': uncached(reverse('survey_app:survey_detail', args=[survey.id])),
+            'take_get': get(reverse('survey_app:take_survey', args=[survey.id])),
+            'take_post': post,
+            'results': get(reverse('survey_app:survey_results', args=[survey.id])),
+            'export': export,
+        }
+        results = {}
+        for name, scenario in scenarios.items():
+            scenario()  # échauffement : gabarits compilés, schéma en cache
+            repeat = max(1, options['repeat'] // 5) if name == 'export' else options['repeat']
+            queries, durations = measure(scenario, repeat)
+            results[name] = {
+                'queries': queries,
+                'mean_ms': round(sum(durations) / len(durations), 3),
+                'p50_ms': round(percentile(durations, 0.5), 3),
+                'p95_ms': round(percentile(durations, 0.95), 3),
+            }
+        return results
+
+    def compare(self, report, options):
+        try:
+            with open(options['compare']) as fileobj:
+                baseline = json.load(fileobj)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Référence illisible : {exc}')
+
+        self.stdout.write('')
+        self.stdout.write(f"{'scénario':>14} {'requêtes':>12} {'p50 ms':>20} {'':>10}")
+        regressions = []
+        for name, stats in report['scenarios'].items():
+            before = baseline.get('scenarios', {}).get(name)
+            if before is None:
+                self.stdout.write(f'{name:>14} (absent de la référence)')
+                continue
+            ratio = stats['p50_ms'] / before['p50_ms'] if before['p50_ms'] else 1.0
+            problems = []
+            if stats['queries'] > before['queries']:
+                problems.append('requêtes')
+            # Le nombre de requêtes est déterministe ; la latence dépend de la machine
+            slower = stats['p50_ms'] - before['p50_ms'] > options['min_delta_ms']
+            if ratio > 1 + options['tolerance'] and slower:
+                problems.append('latence')
+            if problems:
+                regressions.append(f"{name} ({', '.join(problems)})")
+            self.stdout.write(
+                f"{name:>14} {before['queries']:>5} -> {stats['queries']:<4} "
+                f"{before['p50_ms']:>8.2f} -> {stats['p50_ms']:<8.2f} "
+                f"{'RÉGRESSION' if problems else 'ok':>10}"
+            )
+        if regressions:
+            message = 'Régressions : ' + ', '.join(regressions)
+            if options['no_fail']:
+                self.stdout.write(self.style.WARNING(message))
+            else:
+                raise CommandError(message)
+        else:
+            self.stdout.write(self.style.SUCCESS('Aucune régression.'))
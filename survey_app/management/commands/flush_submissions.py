@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from survey_app import ingest_buffer
+
+
+class Command(BaseCommand):
+    help = 'Écrit dans la base les soumissions du tampon d\'ingestion (SUBMISSION_BUFFER_PATH), par lots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ingest_buffer.FLUSH_BATCH_SIZE,
+                            help='Soumissions écrites par transaction')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Attente entre deux consultations de la file vide (secondes)')
+        parser.add_argument('--once', action='store_true',
+                            help='Vide la file puis s\'arrête')
+
+    def handle(self, *args, **options):
+        if not ingest_buffer.is_enabled():
+            raise CommandError('Le tampon d\'ingestion est désactivé (SUBMISSION_BUFFER_PATH)')
+
+        while True:
+            processed, created = ingest_buffer.flush(options['batch_size'])
+            if processed:
+                self.stdout.write(f'{processed} entrée(s) traitée(s), {created} soumission(s) créée(s).')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
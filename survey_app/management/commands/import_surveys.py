@@ -0,0 +1,47 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from survey_app.definitions import (
+    DefinitionError, create_surveys, definition_format, load_document, parse_definitions,
+)
+
+
+class Command(BaseCommand):
+    help = 'Crée des sondages depuis des fichiers de définition JSON ou YAML (tout ou rien)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Fichiers de définition (.json, .yaml, .yml)')
+        parser.add_argument('--creator', required=True, help='Nom de l\'utilisateur créateur des sondages')
+        parser.add_argument('--format', choices=('json', 'yaml'),
+                            help='Format des fichiers (déduit de l\'extension par défaut)')
+
+    def handle(self, *args, **options):
+        try:
+            creator = User.objects.get(username=options['creator'])
+        except User.DoesNotExist:
+            raise CommandError(f'Utilisateur inconnu : {options["creator"]}')
+
+        # Tous les fichiers sont validés avant la première écriture
+        definitions = []
+        for path in options['paths']:
+            try:
+                with open(path, 'rb') as handle:
+                    content = handle.read()
+            except OSError as exc:
+                raise CommandError(f'{path} : {exc}')
+            try:
+                definitions += parse_definitions(
+                    load_document(content, options['format'] or definition_format(path))
+                )
+            except DefinitionError as exc:
+                raise CommandError(f'{path} : ' + '\n'.join(exc.errors))
+
+        start = time.perf_counter()
+        surveys = create_surveys(definitions, creator)
+        elapsed = (time.perf_counter() - start) * 1000
+        questions = sum(len(definition.questions) for definition in definitions)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(surveys)} sondage(s), {questions} question(s) importé(s) en {elapsed:.0f} ms.'
+        ))
@@ -0,0 +1,185 @@
+import importlib.util
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.client import HTTPConnection, HTTPException
+from http.cookiejar import CookieJar
+from urllib.parse import urlencode, urlsplit
+from urllib.request import HTTPCookieProcessor, build_opener
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from survey_app.benchmarks import percentile, submission_post_data
+from survey_app.models import Survey
+
+# Scénario -> (vue synchrone servie en WSGI, vue asynchrone servie en ASGI, méthode)
+SCENARIOS = {
+    'take': ('survey_app:take_survey', 'survey_app:take_survey_async', 'GET'),
+    'submit': ('survey_app:take_survey', 'survey_app:take_survey_async', 'POST'),
+    'results': ('survey_app:survey_results', 'survey_app:survey_results_async', 'GET'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare débit (req/s) et latence p99 des vues synchrones sous WSGI et des vues '
+        'asynchrones sous ASGI, sur des serveurs locaux. Le scénario « submit » écrit de '
+        'vraies réponses dans la base configurée.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_id', type=int)
+        parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='results')
+        parser.add_argument('--wsgi', default='http://127.0.0.1:8101', help='URL du serveur WSGI')
+        parser.add_argument('--asgi', default='http://127.0.0.1:8102', help='URL du serveur ASGI')
+        parser.add_argument('--start', action='store_true',
+                            help='Lance runserver (WSGI) et uvicorn ou daphne (ASGI) sur ces URL pendant le test')
+        parser.add_argument('--username', required=True, help='Compte utilisé (créateur du sondage pour « results »)')
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--concurrency', type=int, default=16, help='Clients simultanés')
+        parser.add_argument('--requests', type=int, default=1000, help='Requêtes par serveur')
+
+    def handle(self, *args, **options):
+        try:
+            survey = Survey.objects.get(pk=options['survey_id'])
+        except Survey.DoesNotExist:
+            raise CommandError(f"Sondage {options['survey_id']} introuvable")
+        sync_name, async_name, method = SCENARIOS[options['scenario']]
+        body = urlencode(submission_post_data(survey), doseq=True) if method == 'POST' else None
+
+        servers = []
+        try:
+            if options['start']:
+                servers.append(start_wsgi(options['wsgi']))
+                servers.append(start_asgi(options['asgi']))
+
+            self.stdout.write(
+                f"{'serveur':>8} {'req/s':>9} {'moy. ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'erreurs':>8}"
+            )
+            for label, base_url, url_name in (('WSGI', options['wsgi'], sync_name), ('ASGI', options['asgi'], async_name)):
+                wait_for_server(base_url)
+                cookies = login(base_url, options['username'], options['password'])
+                path = reverse(url_name, args=[survey.id])
+                run_load(base_url, method, path, body, cookies, options['concurrency'], options['concurrency'])
+                elapsed, durations, errors = run_load(
+                    base_url, method, path, body, cookies, options['concurrency'], options['requests'],
+                )
+                self.stdout.write(
+                    f"{label:>8} {len(durations) / elapsed:>9.1f} {sum(durations) / max(len(durations), 1):>9.2f} "
+                    f"{percentile(durations, 0.5):>9.2f} {percentile(durations, 0.99):>9.2f} {errors:>8}"
+                )
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait(timeout=10)
+
+
+def host_port(base_url):
+    parts = urlsplit(base_url)
+    return parts.hostname, parts.port or 80
+
+
+def start_wsgi(base_url):
+    host, port = host_port(base_url)
+    return subprocess.Popen(
+        [sys.executable, 'manage.py', 'runserver', f'{host}:{port}', '--noreload'],
+        cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def start_asgi(base_url):
+    host, port = host_port(base_url)
+    if importlib.util.find_spec('uvicorn'):
+        command = ['-m', 'uvicorn', 'survey_project.asgi:application', '--host', host, '--port', str(port), '--log-level', 'warning']
+    elif importlib.util.find_spec('daphne'):
+        command = ['-m', 'daphne', '-b', host, '-p', str(port), 'survey_project.asgi:application']
+    else:
+        raise CommandError('Aucun serveur ASGI installé : pip install uvicorn (ou daphne), ou lancez-le et passez --asgi')
+    return subprocess.Popen(
+        [sys.executable, *command],
+        cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_for_server(base_url, timeout=30):
+    host, port = host_port(base_url)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise CommandError(f'Serveur injoignable : {base_url}')
+            time.sleep(0.2)
+
+
+def login(base_url, username, password):
+    """Se connecte par le formulaire de connexion ; retourne l'en-tête Cookie de la session"""
+    jar = CookieJar()
+    opener = build_opener(HTTPCookieProcessor(jar))
+    login_url = base_url.rstrip('/') + reverse('login')
+    page = opener.open(login_url).read().decode()
+    token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1)
+    opener.open(login_url, urlencode({
+        'csrfmiddlewaretoken': token, 'username': username, 'password': password,
+    }).encode())
+    cookies = {cookie.name: cookie.value for cookie in jar}
+    if 'sessionid' not in cookies:
+        raise CommandError('Connexion refusée : vérifiez --username/--password')
+    return cookies
+
+
+def run_load(base_url, method, path, body, cookies, concurrency, total):
+    """
+    ``total`` requêtes réparties sur ``concurrency`` connexions persistantes.
+
+    Retourne ``(durée totale en s, latences réussies en ms, nombre d'erreurs)``.
+    """
+    host, port = host_port(base_url)
+    headers = {'Cookie': '; '.join(f'{name}={value}' for name, value in cookies.items())}
+    if method == 'POST':
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        headers['X-CSRFToken'] = cookies.get('csrftoken', '')
+        headers['Referer'] = base_url
+    remaining = iter(range(total))
+    lock = threading.Lock()
+    durations = []
+    errors = [0]
+
+    def client():
+        connection = HTTPConnection(host, port, timeout=60)
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    break
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, HTTPException):
+                connection.close()
+                connection = HTTPConnection(host, port, timeout=60)
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if ok:
+                    durations.append(elapsed)
+                else:
+                    errors[0] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, durations, errors[0]
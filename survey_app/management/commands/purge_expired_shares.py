@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from survey_app.share_links import purge_expired, PURGE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Supprime les liens de partage expirés, par lots bornés'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Pause entre deux lots (secondes), pour laisser passer les écritures')
+
+    def handle(self, *args, **options):
+        total = 0
+        for deleted in purge_expired(options['batch_size']):
+            total += deleted
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{deleted} lien(s) supprimé(s)')
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'{total} lien(s) de partage expiré(s) supprimé(s).'))
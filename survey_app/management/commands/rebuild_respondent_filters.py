@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from survey_app.respondent_filter import rebuild_filters
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les filtres « déjà répondu » des sondages à une réponse par personne'
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_ids', type=int, nargs='*',
+                            help='Sondages à reconstruire (tous par défaut)')
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_filters(options['survey_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'{rebuilt} filtre(s) reconstruit(s).'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from survey_app.tallies import rebuild_tallies
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les agrégats de résultats (tallies) à partir des réponses brutes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_ids', type=int, nargs='*',
+                            help='Sondages à recalculer (tous par défaut)')
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_tallies(options['survey_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'{rebuilt} sondage(s) recalculé(s).'))
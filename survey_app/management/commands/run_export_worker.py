@@ -0,0 +1,56 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from survey_app import export_worker
+from survey_app.jobs import claim_next_job, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = 'Exécute les exports PDF en attente (ExportJob) dans un pool de processus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Nombre de processus de rendu')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Attente entre deux consultations de la file vide (secondes)')
+        parser.add_argument('--stale-after', type=int, default=3600,
+                            help='Remet en attente les jobs « en cours » depuis plus de N secondes au démarrage')
+        parser.add_argument('--once', action='store_true',
+                            help='Vide la file puis s\'arrête')
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs(options['stale_after'])
+        if requeued:
+            self.stdout.write(f'{requeued} job(s) bloqué(s) remis en attente.')
+
+        workers = options['workers']
+        # « spawn » : les processus du pool ouvrent leurs propres connexions à la base
+        context = multiprocessing.get_context('spawn')
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=export_worker.init_process) as pool:
+            running = set()
+            while True:
+                while len(running) < workers:
+                    job_id = claim_next_job()
+                    if job_id is None:
+                        break
+                    self.stdout.write(f'Export #{job_id} démarré.')
+                    running.add(pool.submit(export_worker.run, job_id))
+
+                if not running:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, running = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id, ok = future.result()
+                    if ok:
+                        self.stdout.write(self.style.SUCCESS(f'Export #{job_id} terminé.'))
+                    else:
+                        self.stdout.write(self.style.ERROR(f'Export #{job_id} en échec.'))
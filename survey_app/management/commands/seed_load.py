@@ -0,0 +1,67 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from survey_app.benchmarks import build_survey, seed_submissions, seed_users
+from survey_app.models import Survey
+
+
+class Command(BaseCommand):
+    help = (
+        'Génère un jeu de données de charge dans la base configurée : comptes, sondages, '
+        'questions, choix et soumissions, avec une popularité des sondages en loi de Zipf'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--surveys', type=int, default=100)
+        parser.add_argument('--responses', type=int, default=1_000_000,
+                            help='Nombre total approximatif de lignes Response')
+        parser.add_argument('--questions-min', type=int, default=5)
+        parser.add_argument('--questions-max', type=int, default=30)
+        parser.add_argument('--public-ratio', type=float, default=0.8)
+        parser.add_argument('--anonymous-ratio', type=float, default=0.3,
+                            help='Part des soumissions sans compte')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Soumissions par transaction')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        start = time.perf_counter()
+        users = seed_users(options['users'])
+        self.stdout.write(f'{len(users)} comptes.')
+
+        # Zipf : quelques sondages concentrent l'essentiel des réponses
+        weights = [1 / (rank + 1) ** 1.1 for rank in range(options['surveys'])]
+        total_weight = sum(weights)
+        anonymous = int(len(users) * options['anonymous_ratio'] / max(1e-9, 1 - options['anonymous_ratio']))
+        respondents = users + [None] * anonymous
+        now = timezone.now()
+
+        created_total = 0
+        for rank, weight in enumerate(weights):
+            question_count = rng.randint(options['questions_min'], options['questions_max'])
+            survey = build_survey(
+                rng.choice(users), question_count,
+                choices_per_question=rng.randint(2, 8),
+                title=f'Sondage de charge {rank + 1}',
+            )
+            Survey.objects.filter(pk=survey.pk).update(
+                is_public=rng.random() < options['public_ratio'],
+                created_at=now - timedelta(days=rng.uniform(0, 365)),
+            )
+            target = options['responses'] * weight / total_weight
+            submissions = max(1, int(target / question_count))
+            created_total += seed_submissions(
+                survey, submissions, users=respondents,
+                batch_size=options['batch_size'], seed=rng.randrange(2 ** 32),
+            )
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'Sondage {rank + 1}/{options["surveys"]} : {submissions} soumission(s) ; '
+                f'{created_total} réponses en {elapsed:.0f} s ({created_total / elapsed:.0f}/s)'
+            )
+        self.stdout.write(self.style.SUCCESS(f'{created_total} réponses générées en {time.perf_counter() - start:.0f} s.'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from survey_app import notifications
+
+
+class Command(BaseCommand):
+    help = (
+        'Envoie par e-mail les résumés des nouvelles réponses et les avis de fin de sondage '
+        '(abonnements SurveyNotification), en regroupant les réponses par fenêtre'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=notifications.DELIVERY_WORKERS,
+                            help='Envois simultanés')
+        parser.add_argument('--interval', type=float, default=30.0,
+                            help='Attente entre deux passages (secondes)')
+        parser.add_argument('--once', action='store_true',
+                            help='Un seul passage puis s\'arrête')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = notifications.dispatch(options['workers'])
+            if sent or failed:
+                self.stdout.write(f'{sent} e-mail(s) envoyé(s), {failed} échec(s).')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
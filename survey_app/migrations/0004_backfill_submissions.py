@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+from django.db import migrations
+
+CHUNK_SIZE = 2000
+# Deux réponses d'un même répondant espacées de plus de SESSION_GAP appartiennent à deux passages distincts
+SESSION_GAP = timedelta(minutes=5)
+
+
+def backfill_submissions(apps, schema_editor):
+    """
+    Regroupe les réponses existantes en soumissions, sondage par sondage.
+
+    Les réponses sont parcourues par (utilisateur, ip, date) ; un nouveau
+    passage commence quand le répondant change, quand l'écart dépasse
+    SESSION_GAP ou quand une question revient une seconde fois. Les réponses
+    sont lues par blocs de CHUNK_SIZE (``iterator``) et les soumissions écrites
+    par lots de CHUNK_SIZE : la mémoire ne dépend pas du nombre de réponses.
+    """
+    Response = apps.get_model('survey_app', 'Response')
+    Submission = apps.get_model('survey_app', 'Submission')
+
+    survey_ids = (
+        Response.objects.filter(submission__isnull=True)
+        .order_by('survey_id').values_list('survey_id', flat=True).distinct()
+    )
+    for survey_id in list(survey_ids):
+        # Écritures pendant la lecture : PostgreSQL lit un instantané (curseur
+        # serveur dans la transaction de la migration) et SQLite trie toutes les
+        # lignes (aucun index sur cet ordre) avant de rendre la première
+        rows = (
+            Response.objects.filter(survey_id=survey_id, submission__isnull=True)
+            .order_by('user_id', 'ip_address', 'created_at', 'id')
+            .values_list('id', 'user_id', 'ip_address', 'created_at', 'question_id')
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        groups = []
+        current = None
+        for response_id, user_id, ip_address, created_at, question_id in rows:
+            if (
+                current is None
+                or current['key'] != (user_id, ip_address)
+                or created_at - current['last'] > SESSION_GAP
+                or question_id in current['questions']
+            ):
+                if len(groups) >= CHUNK_SIZE:
+                    _flush(Submission, Response, survey_id, groups)
+                    groups = []
+                current = {
+                    'key': (user_id, ip_address),
+                    'started': created_at,
+                    'last': created_at,
+                    'questions': set(),
+                    'responses': [],
+                }
+                groups.append(current)
+            current['last'] = created_at
+            current['questions'].add(question_id)
+            current['responses'].append(response_id)
+        _flush(Submission, Response, survey_id, groups)
+
+
+def _flush(Submission, Response, survey_id, groups):
+    if not groups:
+        return
+    submissions = Submission.objects.bulk_create([
+        Submission(
+            survey_id=survey_id,
+            user_id=group['key'][0],
+            ip_address=group['key'][1],
+            started_at=group['started'],
+            finished_at=group['last'],
+        )
+        for group in groups
+    ])
+    Response.objects.bulk_update(
+        [
+            Response(id=response_id, submission_id=submission.pk)
+            for submission, group in zip(submissions, groups)
+            for response_id in group['responses']
+        ],
+        ['submission'],
+        batch_size=CHUNK_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey_app', '0003_submission'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_submissions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+def rebuild(apps, schema_editor):
+    from survey_app.tallies import rebuild_tallies
+    rebuild_tallies(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey_app', '0005_tallies'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_respondent_count(apps, schema_editor):
+    Survey = apps.get_model('survey_app', 'Survey')
+    Submission = apps.get_model('survey_app', 'Submission')
+    counts = (
+        Submission.objects.filter(survey=OuterRef('pk'))
+        .values('survey').annotate(n=Count('id')).values('n')
+    )
+    Survey.objects.update(respondent_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey_app', '0008_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='survey',
+            name='respondent_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_respondent_count, migrations.RunPython.noop),
+    ]
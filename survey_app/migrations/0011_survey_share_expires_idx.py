@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey_app', '0010_submission_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='surveyshare',
+            index=models.Index(fields=['expires_at'], name='share_expires_idx'),
+        ),
+    ]
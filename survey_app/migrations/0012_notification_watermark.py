@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:06
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def start_at_latest_submission(apps, schema_editor):
+    """Les abonnements existants ne reçoivent pas l'historique complet dans leur premier résumé"""
+    Submission = apps.get_model('survey_app', 'Submission')
+    SurveyNotification = apps.get_model('survey_app', 'SurveyNotification')
+    latest = (
+        Submission.objects.filter(survey_id=OuterRef('survey_id'))
+        .order_by().values('survey_id').annotate(latest=Max('id')).values('latest')
+    )
+    SurveyNotification.objects.filter(survey__submissions__isnull=False).update(
+        last_notified_submission_id=Subquery(latest),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey_app', '0011_survey_share_expires_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='surveynotification',
+            name='completion_notified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='surveynotification',
+            name='last_notified_submission_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='surveynotification',
+            name='last_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(start_at_latest_submission, migrations.RunPython.noop),
+    ]
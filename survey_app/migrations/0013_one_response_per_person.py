@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey_app', '0012_notification_watermark'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RespondentFilterWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.PositiveIntegerField()),
+                ('bits', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='survey',
+            name='one_response_per_person',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['survey', 'ip_address'], name='submission_survey_ip_idx'),
+        ),
+        migrations.AddField(
+            model_name='respondentfilterword',
+            name='survey',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='respondent_filter', to='survey_app.survey'),
+        ),
+        migrations.AddConstraint(
+            model_name='respondentfilterword',
+            constraint=models.UniqueConstraint(fields=('survey', 'word'), name='respondent_filter_word_uniq'),
+        ),
+    ]
@@ -33,10 +33,26 @@ class Survey(models.Model):
     is_anonymous = models.BooleanField(default=False)
     max_responses = models.IntegerField(default=0)  # 0 means unlimited
     template = models.BooleanField(default=False)
+    # Une seule réponse par personne (utilisateur, ou adresse IP si anonyme), voir respondent_filter
+    one_response_per_person = models.BooleanField(default=False)
+    # Nombre de soumissions, incrémenté dans la transaction de chaque soumission
+    respondent_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Index partiel : Django écrit le filtre is_public=True « WHERE is_public », qu'un
+            # index composite (is_public, created_at) ne sait pas servir sous SQLite
+            models.Index(fields=['created_at'], condition=models.Q(is_public=True), name='survey_public_created_idx'),
+            models.Index(fields=['creator', 'created_at'], name='survey_creator_created_idx'),
+        ]
     
     def __str__(self):
         return self.title
 
+    def is_full(self):
+        """Limite de réponses atteinte (vérification O(1) sur le compteur)"""
+        return self.max_responses > 0 and self.respondent_count >= self.max_responses
+
 class Question(models.Model):
     QUESTION_TYPES = [
         ('single_choice', 'Choix unique'),
@@ -70,8 +86,33 @@ class Choice(models.Model):
     def __str__(self):
         return self.text
 
+class Submission(models.Model):
+    """Regroupe les réponses données par une personne lors d'un même passage"""
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='submissions')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Jeton du formulaire : un renvoi ou un rejeu du tampon d'ingestion ne crée pas de doublon.
+    # Unique par sondage : une clé rejouée sur un autre sondage ne désigne pas cette soumission
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['survey', 'started_at'], name='submission_survey_started_idx'),
+            # Confirmation d'un « déjà répondu » du filtre de répondants (survey_app.respondent_filter)
+            models.Index(fields=['survey', 'ip_address'], name='submission_survey_ip_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['survey', 'idempotency_key'], name='submission_survey_idempotency_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Submission #{self.pk} to {self.survey.title}"
+
 class Response(models.Model):
     survey = models.ForeignKey(Survey, on_delete=models.CASCADE)
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, null=True, blank=True, related_name='responses')
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
@@ -79,16 +120,107 @@ class Response(models.Model):
     text_response = models.TextField(blank=True, null=True)
     choice_response = models.ManyToManyField(Choice, blank=True)
     scale_response = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['survey', 'created_at'], name='response_survey_created_idx'),
+            models.Index(fields=['question', 'created_at'], name='response_question_created_idx'),
+        ]
     
     def __str__(self):
         return f"Response to {self.question.text}"
 
+class RespondentFilterWord(models.Model):
+    """Mot de 63 bits du filtre de Bloom des répondants d'un sondage (survey_app.respondent_filter)"""
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='respondent_filter')
+    word = models.PositiveIntegerField()
+    bits = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['survey', 'word'], name='respondent_filter_word_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Respondent filter word {self.word} of {self.survey.title}"
+
+class QuestionTally(models.Model):
+    """Nombre de réponses par question, tenu à jour à chaque soumission"""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='tally')
+    response_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Tally for {self.question.text}"
+
+class ChoiceTally(models.Model):
+    """Nombre de sélections par choix, tenu à jour à chaque soumission"""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='choice_tallies')
+    choice = models.OneToOneField(Choice, on_delete=models.CASCADE, related_name='tally')
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Tally for {self.choice.text}"
+
+class ScaleTally(models.Model):
+    """Histogramme des valeurs d'une question à échelle"""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='scale_tallies')
+    value = models.IntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['value']
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'value'], name='scale_tally_question_value_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Tally for {self.question.text} = {self.value}"
+
+class ExportJob(models.Model):
+    """Export PDF à produire en arrière-plan par ``manage.py run_export_worker``"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUSES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_DONE, 'Terminé'),
+        (STATUS_FAILED, 'Échec'),
+    ]
+
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='export_jobs')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=STATUS_PENDING)
+    # Plus grand id de Response au moment de la demande : clé du fichier en cache
+    watermark = models.BigIntegerField(default=0)
+    file_path = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='exportjob_status_created_idx'),
+            models.Index(fields=['survey', 'watermark'], name='exportjob_survey_watermark_idx'),
+        ]
+
+    def __str__(self):
+        return f"Export #{self.pk} of {self.survey.title} ({self.status})"
+
 class SurveyShare(models.Model):
     survey = models.ForeignKey(Survey, on_delete=models.CASCADE)
     share_token = models.CharField(max_length=100, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(null=True, blank=True)
-    
+
+    class Meta:
+        indexes = [
+            # Purge des liens expirés par lots (purge_expired_shares)
+            models.Index(fields=['expires_at'], name='share_expires_idx'),
+        ]
+
     def __str__(self):
         return f"Share link for {self.survey.title}"
 
@@ -98,6 +230,10 @@ class SurveyNotification(models.Model):
     is_active = models.BooleanField(default=True)
     notify_on_response = models.BooleanField(default=True)
     notify_on_completion = models.BooleanField(default=True)
+    # Filigrane : dernière soumission incluse dans un résumé envoyé (survey_app.notifications)
+    last_notified_submission_id = models.BigIntegerField(default=0)
+    last_sent_at = models.DateTimeField(null=True, blank=True)
+    completion_notified_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return f"Notifications for {self.user.username} - {self.survey.title}"
\ No newline at end of file
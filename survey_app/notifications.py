@@ -0,0 +1,197 @@
+"""
+Résumés par e-mail des nouvelles réponses (``SurveyNotification``).
+
+La soumission n'écrit rien de plus : les lignes ``Submission`` servent de
+journal d'événements, et chaque abonnement garde un filigrane
+(``last_notified_submission_id``), l'id de la dernière soumission déjà
+résumée. Le travail se fait hors requête, dans ``manage.py send_notifications`` :
+
+- une requête groupée trouve les abonnements ayant de nouvelles soumissions
+  et dont le dernier envoi date de plus de ``NOTIFICATION_DIGEST_WINDOW``
+  secondes : les réponses arrivées entre-temps sont regroupées dans un seul
+  résumé par (sondage, utilisateur) ;
+- les e-mails partent en parallèle dans un pool de threads (backend e-mail
+  de Django : SMTP en production, locmem ou fichier pour les essais) ;
+- le filigrane n'avance qu'après l'envoi, par une mise à jour conditionnelle.
+  Un arrêt entre les deux renvoie le même résumé, rien n'est perdu.
+
+``notify_on_completion`` envoie un message unique quand le sondage atteint
+sa limite de réponses ou sa date de fin.
+"""
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Count, F, Max, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Submission, SurveyNotification
+
+logger = logging.getLogger('survey_app.notifications')
+
+DIGEST_WINDOW = 300
+DELIVERY_WORKERS = 4
+
+Digest = namedtuple('Digest', 'kind subscription_ids watermark recipient subject body')
+
+
+def digest_window():
+    return timedelta(seconds=getattr(settings, 'NOTIFICATION_DIGEST_WINDOW', DIGEST_WINDOW))
+
+
+def results_url(survey_id):
+    base = getattr(settings, 'NOTIFICATION_BASE_URL', 'http://localhost:8000').rstrip('/')
+    return base + reverse('survey_app:survey_results', args=[survey_id])
+
+
+def subscribe(survey, user):
+    """Abonne ``user`` aux résumés de ``survey`` à partir de la dernière soumission"""
+    latest = Submission.objects.filter(survey=survey).aggregate(latest=Max('id'))['latest'] or 0
+    subscription, created = SurveyNotification.objects.get_or_create(
+        survey=survey, user=user, defaults={'last_notified_submission_id': latest},
+    )
+    if not created and not subscription.is_active:
+        SurveyNotification.objects.filter(pk=subscription.pk).update(
+            is_active=True, last_notified_submission_id=latest,
+        )
+    return subscription
+
+
+def unsubscribe(survey, user):
+    SurveyNotification.objects.filter(survey=survey, user=user).update(is_active=False)
+
+
+def pending_response_digests(now=None):
+    """
+    Résumés de nouvelles réponses à envoyer, un par (sondage, utilisateur).
+
+    Une seule requête : soumissions postérieures au filigrane (parcours d'index
+    à partir du filigrane) comptées par abonnement, abonnements encore dans
+    leur fenêtre de regroupement exclus.
+    """
+    now = now or timezone.now()
+    subscriptions = (
+        SurveyNotification.objects.filter(is_active=True, notify_on_response=True)
+        .filter(Q(last_sent_at__isnull=True) | Q(last_sent_at__lte=now - digest_window()))
+        # Dans le WHERE, avant l'agrégat : parcours d'index (survey_id, id) des seules soumissions
+        # postérieures au filigrane, et non de tout l'historique du sondage à chaque passage
+        .filter(survey__submissions__id__gt=F('last_notified_submission_id'))
+        .annotate(new_count=Count('survey__submissions'), latest=Max('survey__submissions__id'))
+        .values(
+            'pk', 'survey_id', 'survey__title', 'survey__respondent_count',
+            'user_id', 'user__email', 'new_count', 'latest',
+        )
+        .order_by('survey_id', 'user_id')
+    )
+
+    digests = {}
+    for row in subscriptions:
+        key = (row['survey_id'], row['user_id'])
+        digest = digests.get(key)
+        if digest is not None:
+            # Abonnement en double : un seul e-mail, tous les filigranes avancent
+            digests[key] = digest._replace(
+                subscription_ids=digest.subscription_ids + (row['pk'],),
+                watermark=max(digest.watermark, row['latest']),
+            )
+            continue
+        count = row['new_count']
+        digests[key] = Digest(
+            kind='responses',
+            subscription_ids=(row['pk'],),
+            watermark=row['latest'],
+            recipient=row['user__email'],
+            subject=f"{count} nouvelle{'s' if count > 1 else ''} réponse{'s' if count > 1 else ''} à « {row['survey__title']} »",
+            body=(
+                f"Votre sondage « {row['survey__title']} » a reçu {count} nouvelle(s) réponse(s) "
+                f"({row['survey__respondent_count']} au total).\n\n"
+                f"Résultats : {results_url(row['survey_id'])}\n"
+            ),
+        )
+    return list(digests.values())
+
+
+def pending_completion_digests(now=None):
+    """Messages de fin de sondage (limite de réponses atteinte ou date de fin passée), une seule fois"""
+    now = now or timezone.now()
+    subscriptions = (
+        SurveyNotification.objects.filter(
+            is_active=True, notify_on_completion=True, completion_notified_at__isnull=True,
+        )
+        .filter(
+            Q(survey__max_responses__gt=0, survey__respondent_count__gte=F('survey__max_responses'))
+            | Q(survey__end_date__lte=now)
+        )
+        .values('pk', 'survey_id', 'survey__title', 'survey__respondent_count', 'user__email')
+    )
+    return [
+        Digest(
+            kind='completion',
+            subscription_ids=(row['pk'],),
+            watermark=None,
+            recipient=row['user__email'],
+            subject=f"Le sondage « {row['survey__title']} » est terminé",
+            body=(
+                f"Votre sondage « {row['survey__title']} » est terminé avec "
+                f"{row['survey__respondent_count']} réponse(s).\n\n"
+                f"Résultats : {results_url(row['survey_id'])}\n"
+            ),
+        )
+        for row in subscriptions
+    ]
+
+
+def deliver(digest, connection=None):
+    """Envoie un résumé ; retourne True si un e-mail est parti (False sans adresse)"""
+    if not digest.recipient:
+        return False
+    EmailMessage(digest.subject, digest.body, to=[digest.recipient], connection=connection).send()
+    return True
+
+
+def mark_sent(digest, now):
+    subscriptions = SurveyNotification.objects.filter(pk__in=digest.subscription_ids)
+    if digest.kind == 'completion':
+        subscriptions.update(completion_notified_at=now)
+    else:
+        # Conditionnelle : ne recule jamais un filigrane avancé par un autre envoi
+        subscriptions.filter(last_notified_submission_id__lt=digest.watermark).update(
+            last_notified_submission_id=digest.watermark, last_sent_at=now,
+        )
+
+
+def dispatch(workers=DELIVERY_WORKERS, now=None):
+    """
+    Envoie les résumés en attente. Lecture et mise à jour des filigranes dans
+    le thread appelant, envois SMTP dans le pool de threads.
+
+    Retourne ``(e-mails envoyés, échecs)`` ; un résumé en échec sera retenté
+    au prochain passage.
+    """
+    now = now or timezone.now()
+    digests = pending_response_digests(now) + pending_completion_digests(now)
+    if not digests:
+        return 0, 0
+
+    def send(digest):
+        # Une connexion par envoi : les backends ne sont pas partagés entre threads
+        return deliver(digest, get_connection())
+
+    sent = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(digest, pool.submit(send, digest)) for digest in digests]
+        for digest, future in futures:
+            try:
+                delivered = future.result()
+            except Exception:
+                logger.exception('Échec de l\'envoi du résumé à %s', digest.recipient)
+                failed += 1
+                continue
+            # Sans adresse e-mail, le filigrane avance aussi : rien à renvoyer plus tard
+            mark_sent(digest, now)
+            sent += delivered
+    return sent, failed
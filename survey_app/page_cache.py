@@ -0,0 +1,107 @@
+"""
+Cache des pages publiques (détail d'un sondage, liste de l'accueil).
+
+Pour les visiteurs anonymes, la page est identique pour tous : elle est mise
+en cache (framework de cache Django) sous une clé contenant la version des
+données affichées, et servie avec un ETag. Un GET conditionnel dont l'ETag
+correspond reçoit un 304 sans rendu ni lecture du cache. Modifier un sondage,
+une question ou un choix fait avancer ``Survey.updated_at`` (voir ``schema``),
+donc la version : les anciennes entrées ne sont plus lues et expirent seules.
+Les nombres de réponses de la liste de l'accueil ne font pas partie de sa
+version (chaque soumission l'invaliderait) : ils peuvent avoir jusqu'à
+``LISTING_COUNTS_MAX_AGE`` secondes de retard.
+
+Les utilisateurs connectés (barre de navigation et jeton CSRF propres à
+chacun) ne passent pas par ce cache.
+"""
+import hashlib
+import time
+
+from django.contrib import messages
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import Survey
+
+PAGE_CACHE_TIMEOUT = 3600
+LISTING_COUNTS_MAX_AGE = 60
+
+
+def listing_version():
+    """
+    Version de la liste publique : change à l'ajout, la suppression, la
+    modification d'un sondage public, et toutes les ``LISTING_COUNTS_MAX_AGE``
+    secondes pour rafraîchir les nombres de réponses affichés.
+    """
+    stats = Survey.objects.filter(is_public=True).aggregate(updated=Max('updated_at'), total=Count('id'))
+    updated = stats['updated'].timestamp() if stats['updated'] else 0
+    return f"{updated}-{stats['total']}-{int(time.time() // LISTING_COUNTS_MAX_AGE)}"
+
+
+def survey_page_version(survey):
+    """Version d'une page de sondage : ``updated_at`` (sondage, questions, choix)"""
+    return str(int(survey.updated_at.timestamp() * 1_000_000))
+
+
+def page_etag(*parts):
+    digest = hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return quote_etag(digest[:20])
+
+
+def is_cacheable(request):
+    """Seules les requêtes GET anonymes sans message en attente sont partagées"""
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return False
+    # len() charge les messages sans les marquer comme lus
+    return not len(messages.get_messages(request))
+
+
+def cached_page(request, name, version, render_page, last_modified=None, vary=()):
+    """
+    Sert ``render_page()`` (qui retourne une réponse) à travers le cache.
+
+    ``name`` identifie la page, ``version`` la version des données (ou une
+    fonction la calculant, appelée seulement si la page est partageable) et
+    ``vary`` les paramètres de requête qui changent le contenu (curseur, format...).
+    """
+    if not is_cacheable(request):
+        response = render_page()
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+        return response
+
+    if callable(version):
+        version = version()
+    etag = page_etag(name, version, *vary)
+    not_modified = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if not_modified is not None:
+        return finalize(not_modified, etag, last_modified)
+
+    key = f'page:{name}:{etag.strip(chr(34))}'
+    cached = cache.get(key)
+    if cached is not None:
+        content, content_type = cached
+        response = HttpResponse(content, content_type=content_type)
+    else:
+        response = render_page()
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, (response.content, response['Content-Type']), PAGE_CACHE_TIMEOUT)
+    return finalize(response, etag, last_modified)
+
+
+def finalize(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Toujours revalider : la réponse change dès que la version change
+        patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
@@ -0,0 +1,73 @@
+"""
+Pagination par clé (keyset) des listes de sondages.
+
+Les pages sont ordonnées par ``(created_at, id)`` décroissants et le curseur
+encode la dernière clé vue : chaque page est un parcours d'index borné, quelle
+que soit sa profondeur, contrairement à ``OFFSET``.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+LISTING_PAGE_SIZE = 20
+MAX_PK = 2 ** 63
+
+
+def encode_cursor(created_at, pk):
+    raw = f'{created_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Clé ``(created_at, id)`` d'un curseur, ou None s'il est absent ou invalide"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        created_at, pk = datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    # Curseur modifié à la main : date sans fuseau, identifiant hors des bornes d'un entier SQL
+    if created_at.tzinfo is None or not 0 < pk < MAX_PK:
+        return None
+    return created_at, pk
+
+
+def keyset_page(queryset, cursor=None, page_size=None):
+    """
+    Une page de ``queryset`` après ``cursor`` (chaîne encodée), de
+    ``page_size`` objets (``LISTING_PAGE_SIZE`` par défaut).
+
+    Retourne ``(objets, curseur suivant ou None)`` ; une seule requête.
+    """
+    page_size = page_size or LISTING_PAGE_SIZE
+    queryset = queryset.order_by('-created_at', '-id')
+    key = decode_cursor(cursor)
+    if key is not None:
+        created_at, pk = key
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows[:page_size], next_cursor
+
+
+def listing_payload(surveys, next_cursor):
+    """Variante JSON d'une page de sondages (défilement infini)"""
+    return {
+        'results': [
+            {
+                'id': survey.id,
+                'title': survey.title,
+                'description': survey.description,
+                'created_at': survey.created_at.isoformat(),
+                'respondent_count': survey.respondent_count,
+            }
+            for survey in surveys
+        ],
+        'next': next_cursor,
+    }
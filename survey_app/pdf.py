@@ -0,0 +1,200 @@
+"""
+Export PDF des résultats d'un sondage.
+
+Les données sont lues en un nombre fixe de requêtes : agrégats pré-calculés
+pour les graphiques et les statistiques, une lecture des sélections pour les
+co-occurrences des choix multiples, puis un seul parcours par blocs des réponses pour les
+tableaux. Chaque tableau est plafonné à ``PDF_MAX_ROWS_PER_QUESTION`` lignes
+et se coupe sur plusieurs pages en répétant son en-tête. Au-delà de
+``PDF_RAW_ROWS_LIMIT`` réponses, seuls les graphiques agrégés sont produits.
+Le document est écrit directement dans un fichier plutôt qu'en mémoire.
+"""
+from reportlab.graphics.charts.barcharts import HorizontalBarChart
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from xml.sax.saxutils import escape
+
+from .exports import answer_text, iter_responses
+from .stats import summarize, survey_cooccurrence
+from .tallies import survey_tallies
+
+PDF_MAX_ROWS_PER_QUESTION = 500
+PDF_RAW_ROWS_LIMIT = 5000
+CHART_LABEL_LENGTH = 30
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+
+def collect_rows(survey, questions, max_rows=PDF_MAX_ROWS_PER_QUESTION):
+    """
+    Lignes des tableaux par question, en un seul parcours par blocs des réponses.
+
+    Le parcours s'arrête dès que toutes les questions ont atteint ``max_rows``.
+    """
+    by_id = {question.id: question for question in questions}
+    rows = {question.id: [] for question in questions}
+    remaining = len(questions)
+    for response in iter_responses(survey):
+        question_rows = rows[response.question_id]
+        if len(question_rows) >= max_rows:
+            continue
+        question_rows.append([
+            answer_text(by_id[response.question_id], response) or 'Aucune réponse',
+            response.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            response.user.username if response.user else 'Anonyme',
+        ])
+        if len(question_rows) == max_rows:
+            remaining -= 1
+            if not remaining:
+                break
+    return rows
+
+
+def bar_chart(labels, values):
+    """Graphique en barres horizontales (un libellé par barre)"""
+    bar_height = 18
+    height = max(60, bar_height * len(labels) + 30)
+    drawing = Drawing(6.5 * inch, height)
+    chart = HorizontalBarChart()
+    chart.x = 2.2 * inch
+    chart.y = 15
+    chart.width = 4 * inch
+    chart.height = height - 30
+    chart.data = [values or [0]]
+    chart.bars[0].fillColor = colors.HexColor('#28a745')
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.valueMax = max(values or [0]) or 1
+    chart.categoryAxis.categoryNames = [
+        label if len(label) <= CHART_LABEL_LENGTH else label[:CHART_LABEL_LENGTH - 1] + '…'
+        for label in labels
+    ] or ['']
+    chart.categoryAxis.labels.fontSize = 8
+    chart.categoryAxis.reverseDirection = True
+    chart.barLabelFormat = '%d'
+    chart.barLabels.fontSize = 7
+    chart.barLabels.nudge = 8
+    drawing.add(chart)
+    return drawing
+
+
+def question_chart(question, tally):
+    """Graphique agrégé d'une question à choix ou à échelle, None pour le texte libre"""
+    if question.question_type in ('single_choice', 'multiple_choice'):
+        choices = list(question.choices.all())
+        return bar_chart([choice.text for choice in choices], [tally['choices'].get(choice.id, 0) for choice in choices])
+    if question.question_type == 'scale' and tally['scale']:
+        histogram = sorted(tally['scale'].items())
+        return bar_chart([str(value) for value, _ in histogram], [count for _, count in histogram])
+    return None
+
+
+def scale_summary_text(tally):
+    """Résumé statistique d'une question à échelle, None sans réponse"""
+    summary = summarize(sorted(tally['scale'].items()))
+    if not summary['count']:
+        return None
+    quartiles = ' / '.join(f'{value:.1f}' for _, value in summary['quantiles'])
+    text = (
+        f"Moyenne {summary['mean']:.2f}, médiane {summary['median']:.1f}, "
+        f"écart-type {summary['stddev']:.2f}, quartiles {quartiles}"
+    )
+    if summary['ci_low'] is not None:
+        text += f" ; IC 95 % de la moyenne : {summary['ci_low']:.2f} – {summary['ci_high']:.2f}"
+    return text
+
+
+def cooccurrence_table(question, matrix, cell_style):
+    choices = list(question.choices.all())
+    data = [[''] + [Paragraph(escape(choice.text), cell_style) for choice in choices]]
+    data.extend(
+        [Paragraph(escape(choice.text), cell_style)] + [str(count) for count in row]
+        for choice, row in zip(choices, matrix)
+    )
+    width = 6.5 * inch / (len(choices) + 1)
+    table = Table(data, colWidths=[width] * (len(choices) + 1), repeatRows=1)
+    table.setStyle(TABLE_STYLE)
+    return table
+
+
+def build_results_pdf(survey, questions, fileobj):
+    """Écrit le PDF des résultats dans ``fileobj``"""
+    styles = getSampleStyleSheet()
+    cell_style = ParagraphStyle('Cell', parent=styles['Normal'], fontSize=9, leading=11)
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30
+    )
+
+    tallies = survey_tallies(survey)
+    total_responses = max((tally['responses'] for tally in tallies.values()), default=0)
+    include_rows = total_responses <= PDF_RAW_ROWS_LIMIT
+    rows = collect_rows(survey, questions) if include_rows and total_responses else {}
+    cooccurrence = survey_cooccurrence(survey, questions) if total_responses else {}
+
+    elements = [Paragraph(escape(survey.title), title_style), Spacer(1, 20)]
+    if not include_rows:
+        elements.append(Paragraph(
+            f'{total_responses} réponses : seuls les résultats agrégés sont inclus. '
+            f'Utilisez l\'export CSV pour les réponses individuelles.',
+            styles['Italic'],
+        ))
+        elements.append(Spacer(1, 20))
+
+    for question in questions:
+        tally = tallies.get(question.id, {'responses': 0, 'choices': {}, 'scale': {}})
+        elements.append(Paragraph(escape(question.text), styles['Heading2']))
+        elements.append(Paragraph(f"{tally['responses']} réponse(s)", styles['Normal']))
+        elements.append(Spacer(1, 10))
+
+        chart = question_chart(question, tally)
+        if chart is not None:
+            elements.append(chart)
+            elements.append(Spacer(1, 10))
+
+        if question.question_type == 'scale':
+            summary = scale_summary_text(tally)
+            if summary:
+                elements.append(Paragraph(summary, styles['Normal']))
+                elements.append(Spacer(1, 10))
+
+        matrix = cooccurrence.get(question.id)
+        if matrix and tally['responses']:
+            elements.append(Paragraph('Choix sélectionnés ensemble', styles['Heading4']))
+            elements.append(cooccurrence_table(question, matrix, cell_style))
+            elements.append(Spacer(1, 10))
+
+        question_rows = rows.get(question.id)
+        if question_rows:
+            data = [['Réponse', 'Date', 'Utilisateur']]  # En-tête du tableau
+            data.extend(
+                [Paragraph(escape(answer), cell_style), date, Paragraph(escape(user), cell_style)]
+                for answer, date, user in question_rows
+            )
+            # repeatRows : l'en-tête est répété quand le tableau se coupe entre deux pages
+            table = Table(data, colWidths=[3.4 * inch, 1.6 * inch, 1.5 * inch], repeatRows=1)
+            table.setStyle(TABLE_STYLE)
+            elements.append(table)
+            if tally['responses'] > len(question_rows):
+                elements.append(Paragraph(
+                    f"{len(question_rows)} premières réponses sur {tally['responses']}.",
+                    styles['Italic'],
+                ))
+        elements.append(Spacer(1, 30))
+
+    SimpleDocTemplate(fileobj, pagesize=letter).build(elements)
+
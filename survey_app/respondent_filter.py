@@ -0,0 +1,139 @@
+"""
+Filtre « déjà répondu » des sondages à une réponse par personne
+(``Survey.one_response_per_person``).
+
+Un filtre de Bloom par sondage, stocké en base par mots de 63 bits
+(``RespondentFilterWord``, créés à la première écriture) : un répondant
+(utilisateur, ou adresse IP pour un sondage anonyme) correspond à
+``HASH_COUNT`` bits. Vérifier un répondant lit au plus ``HASH_COUNT`` lignes
+par l'index unique (sondage, mot), quel que soit le nombre de réponses ;
+l'ajouter est une mise à jour ``bits = bits | masque`` faite par la base,
+sans réécrire le filtre. La taille est bornée : ``FILTER_WORDS`` lignes au
+plus par sondage, environ 1 % de faux positifs à ``CAPACITY`` répondants.
+
+Un bit absent prouve que la personne n'a pas répondu. Un « peut-être » est
+confirmé par une recherche indexée dans ``Submission`` : un faux positif ne
+refuse jamais une réponse légitime, il coûte une requête de plus.
+"""
+import hashlib
+
+from django.db.models import Case, F, Value, When
+
+from .models import RespondentFilterWord, Submission, Survey
+
+WORD_BITS = 63
+FILTER_WORDS = 16384
+FILTER_BITS = WORD_BITS * FILTER_WORDS
+HASH_COUNT = 7
+# Répondants pour ~1 % de faux positifs : FILTER_BITS × ln(2)² / ln(100)
+CAPACITY = 107000
+REBUILD_BATCH_SIZE = 1000
+
+
+def respondent_key(user_id=None, ip_address=None):
+    """Identité du répondant, None si elle est inconnue (aucun contrôle possible)"""
+    if user_id:
+        return f'u{user_id}'
+    if ip_address:
+        return f'ip{ip_address}'
+    return None
+
+
+def bit_masks(survey_id, key):
+    """``{mot: masque}`` des bits du répondant (double hachage sur une empreinte SHA-256)"""
+    digest = hashlib.sha256(f'{survey_id}:{key}'.encode()).digest()
+    first = int.from_bytes(digest[:8], 'big')
+    step = int.from_bytes(digest[8:16], 'big') | 1
+    masks = {}
+    for i in range(HASH_COUNT):
+        word, bit = divmod((first + i * step) % FILTER_BITS, WORD_BITS)
+        masks[word] = masks.get(word, 0) | (1 << bit)
+    return masks
+
+
+def contains(words, masks):
+    return all(words.get(word, 0) & mask == mask for word, mask in masks.items())
+
+
+def has_answered(survey_id, user_id=None, ip_address=None):
+    """Confirmation en base d'un « peut-être » du filtre"""
+    submissions = Submission.objects.filter(survey_id=survey_id)
+    if user_id:
+        return submissions.filter(user_id=user_id).exists()
+    return submissions.filter(ip_address=ip_address).exists()
+
+
+def already_answered(survey, user_id=None, ip_address=None):
+    """
+    La personne a-t-elle déjà répondu ? Vérification sans verrou, pour
+    refuser tôt (affichage du formulaire, avant validation) ; la vérification
+    qui fait foi est ``claim_respondent``, dans la transaction de la soumission.
+    """
+    if not survey.one_response_per_person:
+        return False
+    key = respondent_key(user_id, ip_address)
+    if key is None:
+        return False
+    masks = bit_masks(survey.pk, key)
+    words = dict(
+        RespondentFilterWord.objects.filter(survey_id=survey.pk, word__in=masks).values_list('word', 'bits')
+    )
+    return contains(words, masks) and has_answered(survey.pk, user_id, ip_address)
+
+
+def claim_respondent(survey_id, user_id=None, ip_address=None):
+    """
+    Ajoute le répondant au filtre ; retourne False s'il a déjà répondu.
+
+    À appeler dans la transaction de la soumission, avant son insertion :
+    les mots du filtre sont verrouillés (``select_for_update``), deux
+    soumissions concurrentes de la même personne sont sérialisées et la
+    seconde voit la première. Trois requêtes, une de plus sur un « peut-être ».
+    """
+    key = respondent_key(user_id, ip_address)
+    if key is None:
+        return True
+    masks = bit_masks(survey_id, key)
+    RespondentFilterWord.objects.bulk_create(
+        [RespondentFilterWord(survey_id=survey_id, word=word) for word in masks],
+        ignore_conflicts=True,
+    )
+    filter_words = RespondentFilterWord.objects.filter(survey_id=survey_id, word__in=masks)
+    words = dict(filter_words.select_for_update().values_list('word', 'bits'))
+    if contains(words, masks):
+        if has_answered(survey_id, user_id, ip_address):
+            return False
+        # Faux positif : les bits sont déjà en place
+        return True
+    filter_words.update(bits=F('bits').bitor(
+        Case(*[When(word=word, then=Value(mask)) for word, mask in masks.items()], default=Value(0))
+    ))
+    return True
+
+
+def rebuild_filters(survey_ids=None):
+    """
+    Reconstruit les filtres à partir des soumissions (mode activé sur un
+    sondage qui a déjà des réponses, soumissions supprimées). Retourne le
+    nombre de sondages traités.
+    """
+    surveys = Survey.objects.filter(one_response_per_person=True)
+    if survey_ids is not None:
+        surveys = surveys.filter(pk__in=survey_ids)
+    rebuilt = 0
+    for survey_id in surveys.values_list('pk', flat=True):
+        words = {}
+        respondents = Submission.objects.filter(survey_id=survey_id).values_list('user_id', 'ip_address')
+        for user_id, ip_address in respondents.iterator(chunk_size=REBUILD_BATCH_SIZE):
+            key = respondent_key(user_id, ip_address)
+            if key is None:
+                continue
+            for word, mask in bit_masks(survey_id, key).items():
+                words[word] = words.get(word, 0) | mask
+        RespondentFilterWord.objects.filter(survey_id=survey_id).delete()
+        RespondentFilterWord.objects.bulk_create(
+            [RespondentFilterWord(survey_id=survey_id, word=word, bits=bits) for word, bits in words.items()],
+            batch_size=REBUILD_BATCH_SIZE,
+        )
+        rebuilt += 1
+    return rebuilt
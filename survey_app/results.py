@@ -0,0 +1,118 @@
+"""
+Tableau de bord agrégé des résultats d'un sondage.
+
+Le tableau de bord complet coûte un nombre constant de requêtes : les comptages
+viennent des agrégats pré-calculés (voir ``tallies``) et le nombre de réponses
+textuelles d'une requête groupée. Statistiques et co-occurrences des choix
+viennent de ``stats`` (la co-occurrence, seule à lire les sélections, est
+mise en cache). Les réponses brutes ne sont accessibles que
+page par page (``response_page``), par pagination par clé.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import Count
+
+from .models import Response
+from .stats import summarize, proportion_intervals, survey_cooccurrence
+from .tallies import survey_tallies, asurvey_tallies
+
+DRILL_DOWN_PAGE_SIZE = 50
+
+
+def text_response_rows(survey):
+    return (
+        Response.objects.filter(survey=survey, question__question_type='text')
+        .exclude(text_response__isnull=True).exclude(text_response='')
+        .values('question_id').annotate(n=Count('id')).order_by()
+    )
+
+
+def text_response_counts(survey):
+    """Nombre de réponses textuelles non vides par question, en une requête groupée"""
+    return {row['question_id']: row['n'] for row in text_response_rows(survey)}
+
+
+def survey_dashboard(survey, questions):
+    """
+    Agrégats par question pour le tableau de bord des résultats.
+
+    ``questions`` doit avoir ses choix préchargés. Retourne une liste de
+    dictionnaires, un par question, dans l'ordre des questions.
+    """
+    return build_dashboard(
+        questions, survey_tallies(survey), text_response_counts(survey),
+        survey_cooccurrence(survey, questions),
+    )
+
+
+async def asurvey_dashboard(survey, questions):
+    """Variante asynchrone de ``survey_dashboard`` (vues ASGI)"""
+    tallies = await asurvey_tallies(survey)
+    text_counts = {row['question_id']: row['n'] async for row in text_response_rows(survey)}
+    cooccurrence = await sync_to_async(survey_cooccurrence)(survey, questions)
+    return build_dashboard(questions, tallies, text_counts, cooccurrence)
+
+
+def build_dashboard(questions, tallies, text_counts, cooccurrence=None):
+    dashboard = []
+    for question in questions:
+        tally = tallies.get(question.id, {'responses': 0, 'choices': {}, 'scale': {}})
+        total = tally['responses']
+        entry = {'question': question, 'responses': total}
+        if question.question_type in ('single_choice', 'multiple_choice'):
+            entry['kind'] = 'choice'
+            choices = list(question.choices.all())
+            counts = [tally['choices'].get(choice.id, 0) for choice in choices]
+            entry['choices'] = [
+                {
+                    'choice': choice,
+                    'count': count,
+                    'percentage': 100.0 * count / total if total else 0.0,
+                    'ci_low': low,
+                    'ci_high': high,
+                }
+                for choice, count, (low, high) in zip(choices, counts, proportion_intervals(counts, total))
+            ]
+            matrix = (cooccurrence or {}).get(question.id)
+            if matrix and total:
+                entry['cooccurrence'] = [
+                    {'choice': choice, 'counts': row} for choice, row in zip(choices, matrix)
+                ]
+        elif question.question_type == 'scale':
+            entry['kind'] = 'scale'
+            histogram = sorted(tally['scale'].items())
+            answered = sum(count for _, count in histogram)
+            entry['scale'] = summarize(histogram)
+            entry['histogram'] = [
+                {
+                    'value': value,
+                    'count': count,
+                    'percentage': 100.0 * count / answered if answered else 0.0,
+                }
+                for value, count in histogram
+            ]
+        else:
+            entry['kind'] = 'text'
+            entry['text_count'] = text_counts.get(question.id, 0)
+        dashboard.append(entry)
+    return dashboard
+
+
+def response_page(question, before=None, page_size=DRILL_DOWN_PAGE_SIZE):
+    """
+    Une page de réponses brutes d'une question, des plus récentes aux plus anciennes.
+
+    Pagination par clé sur ``id`` (``before`` = plus petit id de la page
+    précédente) : chaque page est un parcours d'index borné, quelle que soit
+    sa profondeur. Retourne ``(réponses, curseur suivant ou None)``.
+    """
+    queryset = (
+        Response.objects.filter(question=question)
+        .select_related('user')
+        .prefetch_related('choice_response')
+        .order_by('-id')
+    )
+    if before is not None:
+        queryset = queryset.filter(id__lt=before)
+    rows = list(queryset[:page_size + 1])
+    next_cursor = rows[page_size - 1].id if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
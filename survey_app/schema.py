@@ -0,0 +1,162 @@
+"""
+Définition compilée d'un sondage (questions, choix, conditions, validateurs).
+
+Un ``SurveySchema`` immuable est construit en une requête préchargée puis mis
+en cache (framework de cache Django) sous une clé versionnée par
+``Survey.updated_at``. Toute modification d'un sondage, d'une question ou d'un
+choix fait avancer ``updated_at`` (signaux ci-dessous), ce qui invalide la clé
+sans suppression explicite. Affichage et validation des formulaires de
+réponse s'appuient sur ce schéma, sans aucune requête par question.
+"""
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .conditions import compile_plan
+from .models import Survey, Question, Choice
+
+SCHEMA_CACHE_TIMEOUT = 24 * 3600
+SCALE_MIN = 1
+SCALE_MAX = 10
+QUESTION_TYPE_LABELS = dict(Question.QUESTION_TYPES)
+
+
+class ChoiceList(tuple):
+    """Tuple de choix exposant ``all()``/``exists()`` comme un gestionnaire lié (templates, formulaires)"""
+
+    def all(self):
+        return self
+
+    def exists(self):
+        return bool(self)
+
+
+@dataclass(frozen=True)
+class ChoiceSchema:
+    pk: int
+    text: str
+    order: int
+
+    @property
+    def id(self):
+        return self.pk
+
+    def __str__(self):
+        return self.text
+
+
+@dataclass(frozen=True)
+class QuestionSchema:
+    id: int
+    text: str
+    question_type: str
+    required: bool
+    order: int
+    conditional_question_id: int | None
+    conditional_value: str | None
+    choices: ChoiceList
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def scale_bounds(self):
+        """Bornes acceptées pour une question à échelle"""
+        return SCALE_MIN, SCALE_MAX
+
+    def get_question_type_display(self):
+        return QUESTION_TYPE_LABELS.get(self.question_type, self.question_type)
+
+    def __str__(self):
+        return self.text
+
+
+@dataclass(frozen=True)
+class SurveySchema:
+    survey_id: int
+    version: str
+    questions: tuple
+    # Plan d'évaluation des conditions (voir ``conditions``)
+    plan: object
+
+    def question(self, question_id):
+        for question in self.questions:
+            if question.id == question_id:
+                return question
+        raise KeyError(question_id)
+
+
+def schema_version(survey):
+    return str(int(survey.updated_at.timestamp() * 1_000_000))
+
+
+def schema_cache_key(survey_id, version):
+    return f'survey-schema:{survey_id}:{version}'
+
+
+def compile_schema(survey):
+    """Construit le schéma depuis la base (questions et choix en une requête préchargée) et son plan de conditions"""
+    questions = tuple(
+        QuestionSchema(
+            id=question.id,
+            text=question.text,
+            question_type=question.question_type,
+            required=question.required,
+            order=question.order,
+            conditional_question_id=question.conditional_question_id,
+            conditional_value=question.conditional_value,
+            choices=ChoiceList(
+                ChoiceSchema(pk=choice.pk, text=choice.text, order=choice.order)
+                for choice in question.choices.all()
+            ),
+        )
+        for question in Question.objects.filter(survey=survey).prefetch_related('choices')
+    )
+    return SurveySchema(
+        survey_id=survey.id,
+        version=schema_version(survey),
+        questions=questions,
+        plan=compile_plan(questions),
+    )
+
+
+def survey_schema(survey):
+    """Schéma du sondage depuis le cache, compilé et mis en cache au besoin"""
+    key = schema_cache_key(survey.id, schema_version(survey))
+    schema = cache.get(key)
+    if schema is None:
+        schema = compile_schema(survey)
+        cache.set(key, schema, SCHEMA_CACHE_TIMEOUT)
+    return schema
+
+
+async def asurvey_schema(survey):
+    """Variante asynchrone de ``survey_schema`` (vues ASGI) ; la compilation s'exécute dans un thread"""
+    key = schema_cache_key(survey.id, schema_version(survey))
+    schema = await cache.aget(key)
+    if schema is None:
+        schema = await sync_to_async(compile_schema)(survey)
+        await cache.aset(key, schema, SCHEMA_CACHE_TIMEOUT)
+    return schema
+
+
+def touch_survey(survey_id):
+    """Fait avancer ``updated_at`` (et donc la version du schéma) sans passer par save()"""
+    Survey.objects.filter(pk=survey_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    touch_survey(instance.survey_id)
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def choice_changed(sender, instance, **kwargs):
+    Survey.objects.filter(questions__id=instance.question_id).update(updated_at=timezone.now())
@@ -0,0 +1,270 @@
+"""
+Filtrage des résultats par segment et tableaux croisés.
+
+Un segment est un ensemble de soumissions défini par des critères combinés
+(ET) : choix sélectionnés (``choice=<question>:<choix>``), plage de valeurs
+d'échelle (``scale=<question>:<min>-<max>``) et période (``days=<n>`` ou
+``from``/``to`` au format AAAA-MM-JJ). Les critères sont compilés en
+sous-requêtes sur ``Response`` et la table des choix sélectionnés : les
+comptages du segment tiennent en une requête groupée par type d'agrégat,
+un tableau croisé en une requête, sans charger de réponse en mémoire.
+
+Les résultats sont mis en cache sous une clé formée du sondage, du segment
+sous forme canonique et d'un filigrane des données (``updated_at`` et
+nombre de répondants du sondage) : une nouvelle soumission invalide la clé.
+"""
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Response, Submission
+from .schema import SCALE_MIN, SCALE_MAX
+from .stats import compute_cooccurrence
+
+SEGMENT_CACHE_TIMEOUT = 3600
+CHOICE_TYPES = ('single_choice', 'multiple_choice')
+PIVOT_TYPES = CHOICE_TYPES + ('scale',)
+
+
+class SegmentError(ValueError):
+    """Critère de segment ou de tableau croisé invalide"""
+
+
+@dataclass(frozen=True)
+class Segment:
+    choices: tuple = ()  # ((question_id, choice_id), ...)
+    scales: tuple = ()  # ((question_id, minimum, maximum), ...)
+    since: datetime | None = None
+    until: datetime | None = None
+
+    def __bool__(self):
+        return bool(self.choices or self.scales or self.since or self.until)
+
+    def canonical(self):
+        """Forme canonique, indépendante de l'ordre des critères (clé de cache)"""
+        parts = [f'c{question_id}:{choice_id}' for question_id, choice_id in sorted(self.choices)]
+        parts += [f's{question_id}:{low}-{high}' for question_id, low, high in sorted(self.scales)]
+        if self.since:
+            parts.append(f'f{self.since.isoformat()}')
+        if self.until:
+            parts.append(f't{self.until.isoformat()}')
+        return ';'.join(parts)
+
+
+def _pair(raw, name):
+    question_id, sep, value = raw.partition(':')
+    if not sep:
+        raise SegmentError(f'Critère « {name} » invalide : {raw}')
+    try:
+        return int(question_id), value
+    except ValueError:
+        raise SegmentError(f'Critère « {name} » invalide : {raw}')
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _date(raw, name):
+    try:
+        return datetime.strptime(raw, '%Y-%m-%d').date()
+    except ValueError:
+        raise SegmentError(f'Date « {name} » invalide : {raw} (format AAAA-MM-JJ)')
+
+
+def parse_segment(params, questions):
+    """
+    Segment décrit par les paramètres ``params`` (``QueryDict``), validé
+    contre les questions du sondage (sans requête). Lève ``SegmentError``.
+    """
+    by_id = {question.id: question for question in questions}
+
+    choices = []
+    for raw in params.getlist('choice'):
+        question_id, value = _pair(raw, 'choice')
+        question = by_id.get(question_id)
+        if question is None or question.question_type not in CHOICE_TYPES:
+            raise SegmentError(f'Question à choix inconnue : {question_id}')
+        if not value.isdigit() or int(value) not in {choice.pk for choice in question.choices.all()}:
+            raise SegmentError(f'Choix inconnu pour la question {question_id} : {value}')
+        choices.append((question_id, int(value)))
+
+    scales = []
+    for raw in params.getlist('scale'):
+        question_id, value = _pair(raw, 'scale')
+        question = by_id.get(question_id)
+        if question is None or question.question_type != 'scale':
+            raise SegmentError(f'Question à échelle inconnue : {question_id}')
+        low, _, high = value.partition('-')
+        try:
+            low, high = int(low), int(high or low)
+        except ValueError:
+            raise SegmentError(f'Plage d\'échelle invalide : {value}')
+        if low > high:
+            raise SegmentError(f'Plage d\'échelle invalide : {value}')
+        scales.append((question_id, low, high))
+
+    since = until = None
+    if params.get('days'):
+        try:
+            days = int(params['days'])
+        except ValueError:
+            raise SegmentError(f'Nombre de jours invalide : {params["days"]}')
+        if days < 1:
+            raise SegmentError(f'Nombre de jours invalide : {days}')
+        # Arrondi au début du jour : la clé de cache reste stable toute la journée
+        since = _day_start(timezone.localdate() - timedelta(days=days - 1))
+    if params.get('from'):
+        since = _day_start(_date(params['from'], 'from'))
+    if params.get('to'):
+        until = _day_start(_date(params['to'], 'to') + timedelta(days=1))
+
+    return Segment(tuple(sorted(set(choices))), tuple(sorted(set(scales))), since, until)
+
+
+def parse_pivot(params, questions):
+    """Questions ``(lignes, colonnes)`` du tableau croisé demandé (``rows``, ``columns``), ou None"""
+    if not params.get('rows') and not params.get('columns'):
+        return None
+    by_id = {str(question.id): question for question in questions}
+    pivot = []
+    for name in ('rows', 'columns'):
+        question = by_id.get(params.get(name, ''))
+        if question is None or question.question_type not in PIVOT_TYPES:
+            raise SegmentError(f'Question de tableau croisé invalide ({name}) : {params.get(name, "")}')
+        pivot.append(question)
+    if pivot[0].id == pivot[1].id:
+        raise SegmentError('Le tableau croisé demande deux questions différentes')
+    return tuple(pivot)
+
+
+def segment_submissions(survey, segment):
+    """Soumissions du segment : un filtre par critère, chacun en sous-requête"""
+    submissions = Submission.objects.filter(survey=survey)
+    for question_id, choice_id in segment.choices:
+        submissions = submissions.filter(pk__in=Response.objects.filter(
+            question_id=question_id, choice_response=choice_id,
+        ).values('submission_id'))
+    for question_id, low, high in segment.scales:
+        submissions = submissions.filter(pk__in=Response.objects.filter(
+            question_id=question_id, scale_response__range=(low, high),
+        ).values('submission_id'))
+    if segment.since:
+        submissions = submissions.filter(started_at__gte=segment.since)
+    if segment.until:
+        submissions = submissions.filter(started_at__lt=segment.until)
+    return submissions
+
+
+def segment_responses(survey, segment):
+    return Response.objects.filter(survey=survey, submission__in=segment_submissions(survey, segment).values('pk'))
+
+
+def segment_counts(survey, segment):
+    """
+    Comptages du segment, au format de ``tallies.survey_tallies`` :
+    ``(répondants, agrégats par question, réponses textuelles par question)``.
+    """
+    responses = segment_responses(survey, segment).order_by()
+    tallies = {}
+
+    def tally(question_id):
+        return tallies.setdefault(question_id, {'responses': 0, 'choices': {}, 'scale': {}})
+
+    for row in responses.values('question_id').annotate(n=Count('id')):
+        tally(row['question_id'])['responses'] = row['n']
+    through = Response.choice_response.through
+    selections = (
+        through.objects.filter(response__in=responses.values('pk')).order_by()
+        .values('response__question_id', 'choice_id').annotate(n=Count('id'))
+    )
+    for row in selections:
+        tally(row['response__question_id'])['choices'][row['choice_id']] = row['n']
+    scale_rows = (
+        responses.exclude(scale_response__isnull=True)
+        .values('question_id', 'scale_response').annotate(n=Count('id'))
+    )
+    for row in scale_rows:
+        tally(row['question_id'])['scale'][row['scale_response']] = row['n']
+    text_counts = {
+        row['question_id']: row['n']
+        for row in responses.filter(question__question_type='text')
+        .exclude(text_response__isnull=True).exclude(text_response='')
+        .values('question_id').annotate(n=Count('id'))
+    }
+    respondents = segment_submissions(survey, segment).count()
+    return respondents, tallies, text_counts
+
+
+def pivot_labels(question):
+    """Valeurs ``[(clé, libellé)]`` d'un axe de tableau croisé"""
+    if question.question_type == 'scale':
+        return [(value, str(value)) for value in range(SCALE_MIN, SCALE_MAX + 1)]
+    return [(choice.pk, choice.text) for choice in question.choices.all()]
+
+
+def _pivot_value(question, path=''):
+    if question.question_type == 'scale':
+        return F(f'{path}scale_response')
+    return F(f'{path}choice_response')
+
+
+def crosstab(survey, segment, rows, columns):
+    """
+    Tableau croisé des répondants du segment : ``counts[i][j]`` est le nombre
+    de soumissions ayant répondu la valeur i à ``rows`` et la valeur j à
+    ``columns``. Une seule requête : les réponses à ``columns`` jointes à la
+    réponse de la même soumission à ``rows``.
+    """
+    cells = (
+        Response.objects.filter(
+            question=columns.id,
+            submission__in=segment_submissions(survey, segment).values('pk'),
+        )
+        .filter(submission__responses__question=rows.id)
+        .order_by()
+        .values(row=_pivot_value(rows, 'submission__responses__'), column=_pivot_value(columns))
+        .annotate(n=Count('submission_id', distinct=True))
+    )
+    row_labels = pivot_labels(rows)
+    column_labels = pivot_labels(columns)
+    row_index = {key: index for index, (key, _) in enumerate(row_labels)}
+    column_index = {key: index for index, (key, _) in enumerate(column_labels)}
+    counts = [[0] * len(column_labels) for _ in row_labels]
+    for cell in cells:
+        i, j = row_index.get(cell['row']), column_index.get(cell['column'])
+        if i is not None and j is not None:
+            counts[i][j] = cell['n']
+    return {
+        'rows': {'question': rows.id, 'text': rows.text, 'labels': [label for _, label in row_labels]},
+        'columns': {'question': columns.id, 'text': columns.text, 'labels': [label for _, label in column_labels]},
+        'counts': counts,
+        'row_totals': [sum(row) for row in counts],
+        'column_totals': [sum(column) for column in zip(*counts)] if counts else [],
+    }
+
+
+def segment_results(survey, questions, segment, pivot=None):
+    """
+    Comptages du segment, co-occurrences des choix multiples et tableau
+    croisé éventuel, mis en cache par
+    (sondage, segment, tableau croisé, filigrane des données).
+    """
+    watermark = f'{survey.updated_at.timestamp()}:{survey.respondent_count}'
+    pivot_key = f'{pivot[0].id}x{pivot[1].id}' if pivot else ''
+    key = f'survey-segment:{survey.pk}:{watermark}:{segment.canonical()}:{pivot_key}'
+    results = cache.get(key)
+    if results is None:
+        respondents, tallies, text_counts = segment_counts(survey, segment)
+        results = {
+            'respondents': respondents,
+            'tallies': tallies,
+            'text_counts': text_counts,
+            'cooccurrence': compute_cooccurrence(questions, segment_responses(survey, segment)),
+            'crosstab': crosstab(survey, segment, *pivot) if pivot else None,
+        }
+        cache.set(key, results, SEGMENT_CACHE_TIMEOUT)
+    return results
@@ -0,0 +1,186 @@
+"""
+Liens de partage ``/s/<jeton>/`` (``SurveyShare``).
+
+Résolution d'un jeton en trois niveaux, du plus rapide au plus coûteux :
+
+1. un cache LRU en mémoire du processus, à durée de vie courte
+   (``SHARE_LOCAL_TTL``) ;
+2. le cache partagé (framework de cache Django) ;
+3. l'index unique de ``share_token`` en base.
+
+Les jetons inconnus sont aussi mis en cache (cache négatif,
+``SHARE_NEGATIVE_TTL``) : un robot qui essaie des jetons au hasard ne
+provoque qu'une requête par jeton et par période. Les entrées mémorisent la
+date d'expiration, vérifiée à chaque résolution : un lien expiré est refusé
+même s'il est encore en cache. Création et suppression d'un lien effacent
+l'entrée du cache partagé et de l'LRU local ; les autres processus voient le
+changement au plus tard après ``SHARE_LOCAL_TTL``.
+
+Ouvrir un lien donne accès au sondage même s'il n'est pas public : le jeton
+est gardé dans la session (``remember_share``) et revérifié à chaque accès
+(``can_access``), de sorte qu'un lien expiré ou supprimé cesse d'ouvrir le
+sondage.
+"""
+import hashlib
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import SurveyShare
+
+SHARE_LOCAL_SIZE = 50000
+SHARE_LOCAL_TTL = 30
+SHARE_CACHE_TTL = 3600
+SHARE_NEGATIVE_TTL = 300
+PURGE_BATCH_SIZE = 1000
+TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,100}$')
+# Jetons ouverts gardés en session : {id du sondage: jeton}, les plus récents seulement
+SESSION_KEY = 'survey_shares'
+SESSION_MAX_SHARES = 50
+# Jeton inconnu (cache négatif) ; le cache partagé ne distingue pas None d'une absence
+MISSING = 'missing'
+
+
+class LocalCache:
+    """LRU borné à durée de vie, propre au processus"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, deadline = entry
+            if deadline < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalCache(SHARE_LOCAL_SIZE, SHARE_LOCAL_TTL)
+
+
+def cache_key(token):
+    # Empreinte : le jeton vient de l'URL, on ne le met pas tel quel dans une clé de cache
+    return 'share:' + hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def create_share(survey, expires_at=None):
+    """Crée un lien de partage au jeton aléatoire"""
+    return SurveyShare.objects.create(
+        survey=survey, share_token=secrets.token_urlsafe(16), expires_at=expires_at,
+    )
+
+
+def lookup(token):
+    """``(survey_id, expires_at)`` du jeton, ``MISSING`` s'il n'existe pas"""
+    key = cache_key(token)
+    entry = local_cache.get(key)
+    if entry is not None:
+        return entry
+    entry = cache.get(key)
+    if entry is None:
+        # [:1] plutôt que first() : pas de tri, seul l'index unique est lu
+        rows = SurveyShare.objects.filter(share_token=token).values_list('survey_id', 'expires_at')[:1]
+        entry = tuple(rows[0]) if rows else MISSING
+        cache.set(key, entry, SHARE_CACHE_TTL if rows else SHARE_NEGATIVE_TTL)
+    local_cache.set(key, entry)
+    return entry
+
+
+def resolve_share(token, now=None):
+    """Sondage (id) du lien de partage ``token``, None s'il est inconnu ou expiré"""
+    if not TOKEN_PATTERN.match(token):
+        return None
+    entry = lookup(token)
+    if entry == MISSING:
+        return None
+    survey_id, expires_at = entry
+    if expires_at is not None and expires_at <= (now or timezone.now()):
+        return None
+    return survey_id
+
+
+def remember_share(session, survey_id, token):
+    """Garde en session le jeton qui vient d'ouvrir ``survey_id``"""
+    shares = {key: value for key, value in session.get(SESSION_KEY, {}).items() if key != str(survey_id)}
+    shares[str(survey_id)] = token
+    session[SESSION_KEY] = dict(list(shares.items())[-SESSION_MAX_SHARES:])
+
+
+def shared_with(shares, survey_id):
+    token = shares.get(str(survey_id))
+    return token is not None and resolve_share(token) == survey_id
+
+
+def can_access(request, survey):
+    """Sondage public, créé par l'utilisateur, ou ouvert par un lien de partage encore valide"""
+    if survey.is_public or request.user == survey.creator:
+        return True
+    return shared_with(request.session.get(SESSION_KEY, {}), survey.pk)
+
+
+async def acan_access(request, user, survey):
+    """Variante asynchrone de ``can_access`` (``user`` déjà chargé par ``request.auser()``)"""
+    if survey.is_public or user.pk == survey.creator_id:
+        return True
+    shares = await request.session.aget(SESSION_KEY, {})
+    return await sync_to_async(shared_with)(shares, survey.pk)
+
+
+def forget(token):
+    key = cache_key(token)
+    cache.delete(key)
+    local_cache.delete(key)
+
+
+@receiver(post_save, sender=SurveyShare)
+@receiver(post_delete, sender=SurveyShare)
+def forget_share(sender, instance, **kwargs):
+    forget(instance.share_token)
+
+
+def purge_expired(batch_size=PURGE_BATCH_SIZE, now=None):
+    """
+    Supprime les liens expirés par lots de ``batch_size`` (une transaction
+    courte par lot, sans verrou prolongé). Générateur du nombre supprimé par lot.
+    """
+    now = now or timezone.now()
+    while True:
+        ids = list(
+            SurveyShare.objects.filter(expires_at__lt=now).order_by('expires_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        deleted, _ = SurveyShare.objects.filter(pk__in=ids).delete()
+        yield deleted
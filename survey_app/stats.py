@@ -0,0 +1,281 @@
+"""
+Statistiques des questions à échelle et à choix.
+
+Calculs vectorisés avec NumPy s'il est installé, repli en Python pur sinon
+(mêmes résultats). Deux sources de données :
+
+- les histogrammes ``[(valeur, effectif)]`` des agrégats pré-calculés : coût
+  proportionnel au nombre de valeurs distinctes, quel que soit le nombre de
+  réponses (tableau de bord, export PDF) ;
+- les valeurs brutes lues par ``values_list(...).iterator()`` (``scale_values``,
+  ``selection_pairs``), pour ce que les agrégats ne contiennent pas : la
+  co-occurrence des choix d'une question à choix multiples, ou les
+  statistiques d'un sous-ensemble de réponses.
+
+Quantiles par interpolation linéaire entre rangs (méthode par défaut de
+NumPy), intervalle de confiance de la moyenne par approximation normale,
+intervalle de Wilson pour les proportions.
+"""
+import bisect
+import math
+from collections import Counter
+from statistics import NormalDist
+
+from django.core.cache import cache
+
+from .models import Response
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dépend de l'environnement
+    np = None
+
+QUANTILES = (0.25, 0.5, 0.75)
+CONFIDENCE = 0.95
+ITERATOR_CHUNK_SIZE = 10000
+# Au-delà, les sélections d'une réponse ne tiennent plus dans un masque de 64 bits
+MAX_MASK_CHOICES = 62
+COOCCURRENCE_CACHE_TIMEOUT = 24 * 3600
+
+
+def z_score(confidence=CONFIDENCE):
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def scale_values(queryset):
+    """Valeurs ``scale_response`` non nulles d'un ensemble de réponses (tableau NumPy ou liste)"""
+    values = (
+        queryset.exclude(scale_response__isnull=True).order_by()
+        .values_list('scale_response', flat=True).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
+    if np is None:
+        return list(values)
+    return np.fromiter(values, dtype=np.int64)
+
+
+def histogram(values):
+    """Histogramme ``[(valeur, effectif)]`` trié de valeurs entières brutes"""
+    if np is None:
+        return sorted(Counter(values).items())
+    values = np.asarray(values, dtype=np.int64)
+    if not values.size:
+        return []
+    low = int(values.min())
+    counts = np.bincount(values - low)
+    present = np.flatnonzero(counts)
+    return list(zip((present + low).tolist(), counts[present].tolist()))
+
+
+def summarize(histogram, quantiles=QUANTILES, confidence=CONFIDENCE):
+    """
+    Statistiques d'un histogramme ``[(valeur, effectif)]`` trié.
+
+    Retourne un dictionnaire : ``count``, ``mean``, ``stddev`` (échantillon),
+    ``min``, ``max``, ``median``, ``quantiles`` (``[(fraction, valeur)]``) et
+    ``ci_low``/``ci_high``, l'intervalle de confiance de la moyenne (None
+    en dessous de deux réponses).
+    """
+    histogram = [(value, count) for value, count in histogram if count]
+    if not histogram:
+        return {
+            'count': 0, 'mean': None, 'stddev': None, 'min': None, 'max': None,
+            'median': None, 'quantiles': [], 'ci_low': None, 'ci_high': None,
+        }
+    if np is None:
+        total, mean, variance, cumulative = _moments_python(histogram)
+    else:
+        total, mean, variance, cumulative = _moments_numpy(histogram)
+    values = [value for value, _ in histogram]
+    stddev = math.sqrt(variance)
+    fractions = sorted(set(quantiles) | {0.5})
+    points = dict(zip(fractions, _quantiles(values, cumulative, total, fractions)))
+    margin = z_score(confidence) * stddev / math.sqrt(total) if total > 1 else None
+    return {
+        'count': total,
+        'mean': mean,
+        'stddev': stddev,
+        'min': values[0],
+        'max': values[-1],
+        'median': points[0.5],
+        'quantiles': [(fraction, points[fraction]) for fraction in quantiles],
+        'ci_low': mean - margin if margin is not None else None,
+        'ci_high': mean + margin if margin is not None else None,
+    }
+
+
+def _moments_python(histogram):
+    total = sum(count for _, count in histogram)
+    mean = sum(value * count for value, count in histogram) / total
+    variance = sum(count * (value - mean) ** 2 for value, count in histogram) / (total - 1) if total > 1 else 0.0
+    cumulative = []
+    seen = 0
+    for _, count in histogram:
+        seen += count
+        cumulative.append(seen)
+    return total, mean, variance, cumulative
+
+
+def _moments_numpy(histogram):
+    values = np.fromiter((value for value, _ in histogram), dtype=np.float64, count=len(histogram))
+    counts = np.fromiter((count for _, count in histogram), dtype=np.int64, count=len(histogram))
+    total = int(counts.sum())
+    mean = float(np.dot(values, counts) / total)
+    variance = float(np.dot(counts, (values - mean) ** 2) / (total - 1)) if total > 1 else 0.0
+    return total, mean, variance, np.cumsum(counts).tolist()
+
+
+def _quantiles(values, cumulative, total, fractions):
+    """Interpolation linéaire entre les valeurs aux rangs entourant ``fraction × (total - 1)``"""
+    def at_rank(rank):
+        return values[bisect.bisect_right(cumulative, rank)]
+
+    points = []
+    for fraction in fractions:
+        position = fraction * (total - 1)
+        lower = math.floor(position)
+        low_value = at_rank(lower)
+        high_value = at_rank(min(lower + 1, total - 1))
+        points.append(low_value + (position - lower) * (high_value - low_value))
+    return points
+
+
+def summarize_values(values, quantiles=QUANTILES, confidence=CONFIDENCE):
+    """Statistiques de valeurs entières brutes (voir ``summarize``)"""
+    return summarize(histogram(values), quantiles, confidence)
+
+
+def proportion_intervals(counts, total, confidence=CONFIDENCE):
+    """Intervalles de Wilson ``[(bas, haut)]`` des proportions ``count / total``, en pourcentage"""
+    if not total:
+        return [(0.0, 0.0)] * len(counts)
+    z = z_score(confidence)
+    if np is None:
+        intervals = []
+        for count in counts:
+            p = count / total
+            centre = (p + z * z / (2 * total)) / (1 + z * z / total)
+            spread = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / (1 + z * z / total)
+            intervals.append((100 * max(0.0, centre - spread), 100 * min(1.0, centre + spread)))
+        return intervals
+    p = np.asarray(counts, dtype=np.float64) / total
+    centre = (p + z * z / (2 * total)) / (1 + z * z / total)
+    spread = z * np.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / (1 + z * z / total)
+    low = 100 * np.clip(centre - spread, 0.0, 1.0)
+    high = 100 * np.clip(centre + spread, 0.0, 1.0)
+    return list(zip(low.tolist(), high.tolist()))
+
+
+def selection_pairs(queryset):
+    """
+    Paires ``(réponse, choix)`` des sélections des réponses de ``queryset``,
+    triées par réponse. Deux tableaux NumPy, ou une liste de paires.
+    """
+    through = Response.choice_response.through
+    pairs = (
+        through.objects.filter(response__in=queryset.values('pk'))
+        .order_by('response_id')
+        .values_list('response_id', 'choice_id')
+        .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
+    if np is None:
+        return list(pairs)
+    array = np.fromiter(pairs, dtype=np.dtype((np.int64, 2)))
+    return array[:, 0], array[:, 1]
+
+
+def cooccurrence(pairs, choice_ids):
+    """
+    Matrice de co-occurrence des choix ``choice_ids`` à partir de paires
+    ``(réponse, choix)`` triées par réponse (voir ``selection_pairs``).
+
+    ``matrice[i][j]`` est le nombre de réponses ayant sélectionné à la fois
+    les choix i et j ; la diagonale, le nombre de sélections de chaque choix.
+    """
+    if np is None or len(choice_ids) > MAX_MASK_CHOICES:
+        if np is not None:
+            pairs = list(zip(pairs[0].tolist(), pairs[1].tolist()))
+        return _cooccurrence_python(pairs, choice_ids)
+    return _cooccurrence_numpy(*pairs, choice_ids)
+
+
+def _cooccurrence_python(pairs, choice_ids):
+    index = {choice_id: position for position, choice_id in enumerate(choice_ids)}
+    masks = Counter()
+    current, mask = None, 0
+    for response_id, choice_id in pairs:
+        if choice_id not in index:
+            continue
+        if response_id != current:
+            if mask:
+                masks[mask] += 1
+            current, mask = response_id, 0
+        mask |= 1 << index[choice_id]
+    if mask:
+        masks[mask] += 1
+
+    size = len(choice_ids)
+    matrix = [[0] * size for _ in range(size)]
+    for mask, count in masks.items():
+        selected = [position for position in range(size) if mask >> position & 1]
+        for i in selected:
+            for j in selected:
+                matrix[i][j] += count
+    return matrix
+
+
+def _cooccurrence_numpy(response_ids, selected_ids, choice_ids):
+    size = len(choice_ids)
+    if not size or not len(response_ids):
+        return [[0] * size for _ in range(size)]
+    # Table choix -> bit, bordée de zéros : un choix inconnu (hors table) ne sélectionne rien
+    ids = np.asarray(choice_ids, dtype=np.int64)
+    low = int(ids.min())
+    table = np.zeros(int(ids.max()) - low + 3, dtype=np.int64)
+    table[ids - low + 1] = np.left_shift(1, np.arange(size, dtype=np.int64))
+    bits = np.take(table, selected_ids - (low - 1), mode='clip')
+
+    # Un masque de bits par réponse : les paires sont triées par réponse
+    starts = np.flatnonzero(response_ids[1:] != response_ids[:-1]) + 1
+    masks = np.bitwise_or.reduceat(bits, np.concatenate(([0], starts)))
+    if size <= 16:
+        counts = np.bincount(masks, minlength=1 << size)
+        masks = np.flatnonzero(counts)
+        counts = counts[masks]
+    else:
+        masks, counts = np.unique(masks, return_counts=True)
+
+    # Une ligne par combinaison distincte de choix : M = Bᵀ · diag(effectifs) · B
+    selected = (masks[:, None] >> np.arange(size)) & 1
+    matrix = selected.T @ (selected * counts[:, None])
+    return matrix.tolist()
+
+
+def survey_cooccurrence(survey, questions):
+    """
+    Matrices de co-occurrence des questions à choix multiples du sondage,
+    ``{question_id: matrice}``, en une lecture des sélections.
+
+    Mises en cache tant que le sondage et son nombre de répondants ne
+    changent pas.
+    """
+    questions = [question for question in questions if question.question_type == 'multiple_choice']
+    if not questions:
+        return {}
+    key = f'survey-cooccurrence:{survey.pk}:{survey.updated_at.timestamp()}:{survey.respondent_count}'
+    matrices = cache.get(key)
+    if matrices is None:
+        matrices = compute_cooccurrence(questions)
+        cache.set(key, matrices, COOCCURRENCE_CACHE_TIMEOUT)
+    return matrices
+
+
+def compute_cooccurrence(questions, responses=None):
+    """Matrices de co-occurrence ``{question_id: matrice}``, sur ``responses`` (défaut : toutes les réponses)"""
+    questions = [question for question in questions if question.question_type == 'multiple_choice']
+    if not questions:
+        return {}
+    choice_ids = {question.id: [choice.id for choice in question.choices.all()] for question in questions}
+    responses = Response.objects.all() if responses is None else responses
+    pairs = selection_pairs(responses.filter(question__in=[question.id for question in questions]))
+    # Les ensembles de choix sont disjoints : chaque question ne retient que les siens
+    return {question_id: cooccurrence(pairs, ids) for question_id, ids in choice_ids.items()}
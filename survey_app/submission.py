@@ -0,0 +1,210 @@
+"""
+Enregistrement des réponses à un sondage.
+
+Tous les formulaires sont validés avant la moindre écriture, puis les lignes
+``Response`` et les lignes de la table de liaison ``Response.choice_response``
+sont insérées par lots dans une seule transaction : le nombre de requêtes par
+soumission ne dépend pas du nombre de questions. Seules les questions visibles
+(conditions remplies, voir ``conditions``) sont validées et enregistrées.
+Pour un sondage à une réponse par personne, le répondant est vérifié et
+ajouté au filtre ``respondent_filter`` dans la même transaction.
+"""
+import re
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .conditions import validate_visible
+from .forms import ResponseForm
+from .models import Survey, Response, Submission
+from .respondent_filter import already_answered, claim_respondent
+from .schema import survey_schema
+from .tallies import record_submission
+
+CHOICE_TYPES = ('single_choice', 'multiple_choice')
+STARTED_FIELD = 'started'
+SUBMISSION_KEY_FIELD = 'submission_key'
+SUBMISSION_KEY_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+STARTED_SALT = 'survey_app.submission.started'
+# Un formulaire ouvert depuis plus longtemps est considéré comme commencé à la soumission
+STARTED_MAX_AGE = 7 * 24 * 3600
+
+
+class SurveyLimitReached(Exception):
+    """Le sondage a atteint ``max_responses`` : la soumission est refusée"""
+
+
+class AlreadyAnswered(Exception):
+    """Sondage à une réponse par personne : le répondant a déjà répondu"""
+
+
+def claim_respondent_slot(survey):
+    """
+    Incrémente le compteur de répondants si la limite le permet.
+
+    Mise à jour conditionnelle unique : deux soumissions concurrentes ne
+    peuvent pas dépasser ``max_responses``. À appeler dans la transaction de
+    la soumission ; lève ``SurveyLimitReached`` si la limite est atteinte.
+    """
+    claimed = (
+        Survey.objects.filter(pk=survey.pk)
+        .filter(Q(max_responses__lte=0) | Q(respondent_count__lt=F('max_responses')))
+        .update(respondent_count=F('respondent_count') + 1)
+    )
+    if not claimed:
+        raise SurveyLimitReached(survey.pk)
+
+
+def survey_questions(survey):
+    """Questions compilées du sondage (voir ``schema``) : aucune requête si le schéma est en cache"""
+    return survey_schema(survey).questions
+
+
+def build_response_forms(questions, data=None):
+    """Construit un ResponseForm préfixé par question"""
+    return [
+        (question, ResponseForm(data, question=question, prefix=str(question.id)))
+        for question in questions
+    ]
+
+
+def started_token():
+    """Jeton signé contenant l'heure d'ouverture du formulaire"""
+    return signing.dumps(timezone.now().timestamp(), salt=STARTED_SALT)
+
+
+def started_at_from(data):
+    """Heure d'ouverture du formulaire lue dans les données POST, ou None si absente/invalide"""
+    token = data.get(STARTED_FIELD)
+    if not token:
+        return None
+    try:
+        timestamp = signing.loads(token, salt=STARTED_SALT, max_age=STARTED_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def submission_key():
+    """Clé d'idempotence d'un formulaire affiché (champ caché)"""
+    return uuid.uuid4().hex
+
+
+def submission_key_from(data):
+    """Clé d'idempotence envoyée avec le formulaire, ou None si absente/invalide"""
+    key = data.get(SUBMISSION_KEY_FIELD) or ''
+    return key if SUBMISSION_KEY_PATTERN.match(key) else None
+
+
+def selected_choices(form):
+    """Choix sélectionnés dans un formulaire validé, toujours sous forme de liste"""
+    choices = form.cleaned_data.get('choice_response')
+    if not choices:
+        return []
+    if isinstance(choices, (list, tuple)):
+        return list(choices)
+    return [choices]
+
+
+def save_submission(survey, question_forms, user=None, ip_address=None, started_at=None, idempotency_key=None):
+    """
+    Enregistre les réponses de formulaires déjà validés.
+
+    Une ``Submission``, deux INSERT par lots et la mise à jour des agrégats
+    dans une transaction, quel que soit le nombre de questions. Retourne la
+    ``Submission`` créée, ou celle déjà enregistrée avec la même
+    ``idempotency_key`` (formulaire envoyé deux fois) ; lève
+    ``SurveyLimitReached`` (sans rien écrire) si le sondage est complet et
+    ``AlreadyAnswered`` si la personne a déjà répondu.
+    """
+    if idempotency_key:
+        existing = Submission.objects.filter(survey=survey, idempotency_key=idempotency_key).first()
+        if existing is not None:
+            return existing
+    now = timezone.now()
+    submission = Submission(
+        survey=survey,
+        user=user,
+        ip_address=ip_address,
+        started_at=started_at or now,
+        finished_at=now,
+        idempotency_key=idempotency_key,
+    )
+    responses = []
+    choices_by_response = []
+    for question, form in question_forms:
+        response = form.save(commit=False)
+        response.survey = survey
+        response.question_id = question.id
+        response.user = user
+        response.ip_address = ip_address
+        response.created_at = now
+        responses.append(response)
+        if question.question_type in CHOICE_TYPES:
+            choices_by_response.append(selected_choices(form))
+        else:
+            choices_by_response.append([])
+
+    through = Response.choice_response.through
+    try:
+        with transaction.atomic():
+            claim_respondent_slot(survey)
+            if survey.one_response_per_person and not claim_respondent(
+                survey.pk, user.pk if user is not None else None, ip_address,
+            ):
+                raise AlreadyAnswered(survey.pk)
+            submission.save()
+            for response in responses:
+                response.submission = submission
+            Response.objects.bulk_create(responses)
+            through.objects.bulk_create([
+                through(response_id=response.pk, choice_id=choice.pk)
+                for response, choices in zip(responses, choices_by_response)
+                for choice in choices
+            ])
+            record_submission(responses, choices_by_response)
+    except IntegrityError:
+        # Envoi concurrent du même formulaire : l'autre requête a gagné
+        if idempotency_key:
+            existing = Submission.objects.filter(survey=survey, idempotency_key=idempotency_key).first()
+            if existing is not None:
+                return existing
+        raise
+    return submission
+
+
+def submit_survey(survey, questions, data, user=None, ip_address=None):
+    """
+    Valide puis enregistre une soumission complète.
+
+    Les questions masquées par une condition ne sont ni validées ni
+    enregistrées. Retourne ``(question_forms, submission)`` ; ``submission``
+    vaut ``None`` si au moins un formulaire visible est invalide, auquel cas
+    rien n'est écrit. Si le tampon d'ingestion est activé (voir
+    ``ingest_buffer``), la soumission y est ajoutée et ``submission`` est un
+    ``QueuedSubmission`` : elle sera écrite en base par ``flush_submissions``.
+    Lève ``SurveyLimitReached`` ou ``AlreadyAnswered`` (voir ``save_submission``).
+    """
+    from . import ingest_buffer
+
+    question_forms = build_response_forms(questions, data)
+    # Tous les formulaires visibles sont validés (pas de court-circuit) pour afficher toutes les erreurs
+    valid, visible_forms = validate_visible(survey_schema(survey).plan, question_forms)
+    if not valid:
+        return question_forms, None
+    options = {
+        'user': user,
+        'ip_address': ip_address,
+        'started_at': started_at_from(data),
+        'idempotency_key': submission_key_from(data),
+    }
+    if ingest_buffer.is_enabled():
+        # Vérification anticipée : la file ne garde pas les doublons évidents
+        if already_answered(survey, user.pk if user is not None else None, ip_address):
+            raise AlreadyAnswered(survey.pk)
+        return question_forms, ingest_buffer.enqueue(survey, visible_forms, **options)
+    return question_forms, save_submission(survey, visible_forms, **options)
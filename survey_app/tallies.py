@@ -0,0 +1,169 @@
+"""
+Agrégats pré-calculés des résultats (QuestionTally, ChoiceTally, ScaleTally).
+
+Les compteurs sont incrémentés dans la transaction de chaque soumission, de
+sorte que la lecture des résultats coûte O(questions × choix) et non
+O(réponses). ``rebuild_tallies`` les recalcule à partir des réponses brutes
+(commande ``manage.py rebuild_tallies`` et migration initiale).
+"""
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When
+
+from .models import QuestionTally, ChoiceTally, ScaleTally
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def _increment(counts, *fields):
+    """Expression CASE ajoutant à chaque ligne l'incrément qui lui correspond"""
+    whens = []
+    for key, amount in counts.items():
+        key = key if isinstance(key, tuple) else (key,)
+        whens.append(When(Q(**dict(zip(fields, key))), then=Value(amount)))
+    return Case(*whens, default=Value(0))
+
+
+def record_submission(responses, choices_by_response):
+    """
+    Incrémente les agrégats pour une soumission.
+
+    ``responses`` est la liste des ``Response`` créées et
+    ``choices_by_response`` la liste parallèle des choix sélectionnés.
+    À appeler dans la transaction de la soumission : six requêtes au plus,
+    quel que soit le nombre de questions.
+    """
+    question_counts = Counter(response.question_id for response in responses)
+    choice_counts = Counter(
+        (response.question_id, choice.pk)
+        for response, choices in zip(responses, choices_by_response)
+        for choice in choices
+    )
+    scale_counts = Counter(
+        (response.question_id, response.scale_response)
+        for response in responses
+        if response.scale_response is not None
+    )
+
+    if question_counts:
+        QuestionTally.objects.bulk_create(
+            [QuestionTally(question_id=question_id) for question_id in question_counts],
+            ignore_conflicts=True,
+        )
+        QuestionTally.objects.filter(question_id__in=question_counts).update(
+            response_count=F('response_count') + _increment(question_counts, 'question_id')
+        )
+    if choice_counts:
+        ChoiceTally.objects.bulk_create(
+            [ChoiceTally(question_id=question_id, choice_id=choice_id) for question_id, choice_id in choice_counts],
+            ignore_conflicts=True,
+        )
+        by_choice = Counter({choice_id: amount for (_, choice_id), amount in choice_counts.items()})
+        ChoiceTally.objects.filter(choice_id__in=by_choice).update(
+            count=F('count') + _increment(by_choice, 'choice_id')
+        )
+    if scale_counts:
+        ScaleTally.objects.bulk_create(
+            [ScaleTally(question_id=question_id, value=value) for question_id, value in scale_counts],
+            ignore_conflicts=True,
+        )
+        # Seuls les couples soumis, pas le produit questions × valeurs : aucune autre ligne verrouillée
+        pairs = reduce(or_, (Q(question_id=question_id, value=value) for question_id, value in scale_counts))
+        ScaleTally.objects.filter(pairs).update(
+            count=F('count') + _increment(scale_counts, 'question_id', 'value')
+        )
+
+
+def rebuild_tallies(survey_ids=None, apps=global_apps):
+    """
+    Recalcule les agrégats à partir des réponses brutes.
+
+    Trois requêtes groupées (``annotate(Count(...))``) par sondage puis des
+    insertions par lots. ``survey_ids=None`` reconstruit tous les sondages.
+    ``apps`` permet l'appel depuis une migration avec les modèles historiques.
+    """
+    Survey = apps.get_model('survey_app', 'Survey')
+    Question = apps.get_model('survey_app', 'Question')
+    Response = apps.get_model('survey_app', 'Response')
+    QuestionTallyModel = apps.get_model('survey_app', 'QuestionTally')
+    ChoiceTallyModel = apps.get_model('survey_app', 'ChoiceTally')
+    ScaleTallyModel = apps.get_model('survey_app', 'ScaleTally')
+    through = Response.choice_response.through
+
+    if survey_ids is None:
+        survey_ids = Survey.objects.values_list('id', flat=True)
+    rebuilt = 0
+    for survey_id in list(survey_ids):
+        questions = Question.objects.filter(survey_id=survey_id)
+        with transaction.atomic():
+            QuestionTallyModel.objects.filter(question__in=questions).delete()
+            ChoiceTallyModel.objects.filter(question__in=questions).delete()
+            ScaleTallyModel.objects.filter(question__in=questions).delete()
+
+            QuestionTallyModel.objects.bulk_create(
+                [
+                    QuestionTallyModel(question_id=row['question_id'], response_count=row['n'])
+                    for row in Response.objects.filter(survey_id=survey_id)
+                    .values('question_id').annotate(n=Count('id')).order_by()
+                ],
+                batch_size=REBUILD_BATCH_SIZE,
+            )
+            ChoiceTallyModel.objects.bulk_create(
+                [
+                    ChoiceTallyModel(question_id=row['choice__question_id'], choice_id=row['choice_id'], count=row['n'])
+                    for row in through.objects.filter(response__survey_id=survey_id)
+                    .values('choice_id', 'choice__question_id').annotate(n=Count('id')).order_by()
+                ],
+                batch_size=REBUILD_BATCH_SIZE,
+            )
+            ScaleTallyModel.objects.bulk_create(
+                [
+                    ScaleTallyModel(question_id=row['question_id'], value=row['scale_response'], count=row['n'])
+                    for row in Response.objects.filter(survey_id=survey_id, scale_response__isnull=False)
+                    .values('question_id', 'scale_response').annotate(n=Count('id')).order_by()
+                ],
+                batch_size=REBUILD_BATCH_SIZE,
+            )
+        rebuilt += 1
+    return rebuilt
+
+
+def survey_tallies(survey):
+    """
+    Agrégats d'un sondage indexés par question, en trois requêtes.
+
+    Retourne ``{question_id: {'responses': n, 'choices': {choice_id: n}, 'scale': {valeur: n}}}``.
+    """
+    tallies = {}
+
+    def entry(question_id):
+        return tallies.setdefault(question_id, {'responses': 0, 'choices': {}, 'scale': {}})
+
+    for question_id, count in QuestionTally.objects.filter(question__survey=survey).values_list('question_id', 'response_count'):
+        entry(question_id)['responses'] = count
+    for question_id, choice_id, count in ChoiceTally.objects.filter(question__survey=survey).values_list('question_id', 'choice_id', 'count'):
+        entry(question_id)['choices'][choice_id] = count
+    for question_id, value, count in ScaleTally.objects.filter(question__survey=survey).values_list('question_id', 'value', 'count'):
+        entry(question_id)['scale'][value] = count
+    return tallies
+
+
+async def asurvey_tallies(survey):
+    """Variante asynchrone de ``survey_tallies`` (itération asynchrone de l'ORM)"""
+    tallies = {}
+
+    def entry(question_id):
+        return tallies.setdefault(question_id, {'responses': 0, 'choices': {}, 'scale': {}})
+
+    async for question_id, count in QuestionTally.objects.filter(question__survey=survey).values_list('question_id', 'response_count'):
+        entry(question_id)['responses'] = count
+    async for question_id, choice_id, count in ChoiceTally.objects.filter(question__survey=survey).values_list('question_id', 'choice_id', 'count'):
+        entry(question_id)['choices'][choice_id] = count
+    async for question_id, value, count in ScaleTally.objects.filter(question__survey=survey).values_list('question_id', 'value', 'count'):
+        entry(question_id)['scale'][value] = count
+    return tallies
+
@@ -1,3 +1,1562 @@
-from django.test import TestCase
+import base64
+import csv
+import importlib
+import io
+import json
+import os
+import random
+import re
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import connection
+from django.db.utils import ConnectionHandler
+from django.db.models import Max, Q
+from django.http import QueryDict
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from survey_project.db_profiles import SQLITE_BUSY_TIMEOUT, SQLITE_TUNED_PRAGMAS, database_profile
+
+from . import (
+    benchmarks, definitions, exports, ingest_buffer, jobs, notifications, page_cache, pagination, respondent_filter,
+    share_links, stats, throttling,
+)
+from .async_views import open_job_file
+from .benchmarks import build_survey, seed_submissions, submission_post_data
+from .instrumentation import QueryBudgetExceeded
+from .conditions import compile_plan
+from .database import apply_sqlite_pragmas
+from .forms import QuestionForm
+from .models import (
+    Survey, Question, Choice, Response, Submission, QuestionTally, ScaleTally, SurveyShare, SurveyNotification,
+    ExportJob, RespondentFilterWord,
+)
+from .schema import compile_schema, survey_schema, SCALE_MIN, SCALE_MAX
+from .submission import (
+    SurveyLimitReached, build_response_forms, save_submission, submit_survey, submission_key, survey_questions,
+)
+from .tallies import rebuild_tallies, survey_tallies
+
+# Accès à une table sans index : « SCAN <table> » sans « USING ... INDEX »
+FULL_SCAN = re.compile(r'\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX)(?! USING INTEGER PRIMARY KEY)')
+
+
+class QueryPlanAssertionsMixin:
+    """
+    Vérifie avec ``EXPLAIN QUERY PLAN`` (SQLite) que les requêtes critiques
+    passent par un index, pour que les régressions échouent en CI plutôt que
+    de se voir en latence en production.
+    """
+
+    def query_plan(self, queryset):
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, allow_sort=False):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN est propre à SQLite')
+        plan = self.query_plan(queryset)
+        scans = FULL_SCAN.findall(plan)
+        self.assertFalse(scans, f'Parcours complet de {", ".join(scans)} :\n{plan}\n{queryset.query}')
+        self.assertRegex(plan, r'USING (?:COVERING )?INDEX|USING INTEGER PRIMARY KEY', f'Aucun index utilisé :\n{plan}')
+        if not allow_sort:
+            self.assertNotIn('USE TEMP B-TREE', plan, f'Tri sans index :\n{plan}\n{queryset.query}')
+
+
+class HotQueryPlanTests(QueryPlanAssertionsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('abdo')
+        cls.survey = Survey.objects.create(title='Sondage', description='', creator=cls.user)
+        cls.question = Question.objects.create(survey=cls.survey, text='Q1', question_type='scale')
+        # Pas d'ANALYZE : sur des tables de quelques lignes, les statistiques pousseraient
+        # SQLite à préférer un parcours complet, ce qui ne reflète pas la production
+
+    def test_home_public_listing(self):
+        self.assertUsesIndex(Survey.objects.filter(is_public=True).order_by('-created_at'))
+
+    def test_home_listing_next_page(self):
+        created_at = timezone.now()
+        self.assertUsesIndex(
+            Survey.objects.filter(is_public=True)
+            .filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=10))
+            .order_by('-created_at', '-id')[:21]
+        )
+
+    def test_profile_listing_next_page(self):
+        created_at = timezone.now()
+        self.assertUsesIndex(
+            Survey.objects.filter(creator=self.user)
+            .filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=10))
+            .order_by('-created_at', '-id')[:21]
+        )
+
+    def test_profile_listing(self):
+        self.assertUsesIndex(Survey.objects.filter(creator=self.user).order_by('-created_at'))
+
+    def test_survey_response_count(self):
+        self.assertUsesIndex(Response.objects.filter(survey=self.survey))
+
+    def test_survey_responses_in_time_range(self):
+        since = timezone.now() - timedelta(days=7)
+        self.assertUsesIndex(Response.objects.filter(survey=self.survey, created_at__gte=since).order_by('created_at'))
+
+    def test_question_responses_in_time_range(self):
+        since = timezone.now() - timedelta(days=7)
+        self.assertUsesIndex(Response.objects.filter(question=self.question, created_at__gte=since).order_by('created_at'))
+
+    def test_question_drill_down_page(self):
+        self.assertUsesIndex(Response.objects.filter(question=self.question, id__lt=1000).order_by('-id'))
+
+    def test_export_watermark(self):
+        self.assertUsesIndex(Response.objects.filter(survey=self.survey).values('survey').annotate(m=Max('id')))
+
+    def test_submission_answers(self):
+        self.assertUsesIndex(Response.objects.filter(submission_id=1))
+
+    def test_survey_submissions_in_time_range(self):
+        now = timezone.now()
+        self.assertUsesIndex(Submission.objects.filter(
+            survey=self.survey, started_at__range=(now - timedelta(days=7), now)
+        ))
+
+    def test_results_tallies(self):
+        self.assertUsesIndex(QuestionTally.objects.filter(question__survey=self.survey))
+
+
+class BackfillSubmissionsTests(TestCase):
+    migration = importlib.import_module('survey_app.migrations.0004_backfill_submissions')
+
+    def test_responses_are_grouped_by_respondent_and_session(self):
+        user = User.objects.create_user('abdo')
+        other = User.objects.create_user('autre')
+        survey = Survey.objects.create(title='Sondage', description='', creator=user)
+        first, second = [
+            Question.objects.create(survey=survey, text=text, question_type='text') for text in ('Q1', 'Q2')
+        ]
+        start = timezone.now() - timedelta(days=1)
+
+        def answer(question, at, user=None, ip_address=None):
+            return Response(survey=survey, question=question, user=user, ip_address=ip_address, created_at=at)
+
+        Response.objects.bulk_create([
+            answer(first, start, user), answer(second, start + timedelta(minutes=1), user),
+            # Plus de SESSION_GAP après : nouveau passage
+            answer(first, start + timedelta(hours=1), user),
+            answer(first, start, other), answer(second, start, other),
+            answer(first, start, ip_address='10.0.0.1'),
+            answer(first, start, ip_address='10.0.0.2'),
+        ])
+        # Petits lots : les écritures se font pendant la lecture des réponses
+        with mock.patch.object(self.migration, 'CHUNK_SIZE', 2):
+            self.migration.backfill_submissions(apps, None)
+
+        self.assertFalse(Response.objects.filter(submission__isnull=True).exists())
+        groups = sorted(
+            sorted(submission.responses.values_list('question__text', flat=True))
+            for submission in Submission.objects.filter(survey=survey)
+        )
+        self.assertEqual(groups, [['Q1'], ['Q1'], ['Q1'], ['Q1', 'Q2'], ['Q1', 'Q2']])
+        together = Submission.objects.get(user=user, started_at=start)
+        self.assertEqual(together.finished_at, start + timedelta(minutes=1))
+        self.assertEqual(Submission.objects.filter(user=user).count(), 2)
+        self.assertEqual(Submission.objects.filter(user=other).count(), 1)
+        self.assertEqual(Submission.objects.filter(user__isnull=True).count(), 2)
+
+
+class ConditionalQuestionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('abdo')
+        cls.survey = Survey.objects.create(title='Sondage', description='', creator=cls.user)
+        cls.pet = Question.objects.create(survey=cls.survey, text='Animal ?', question_type='single_choice', order=1)
+        cls.dog = Choice.objects.create(question=cls.pet, text='Chien', order=1)
+        cls.cat = Choice.objects.create(question=cls.pet, text='Chat', order=2)
+        # Déclarée avant sa question parente : le plan doit la placer après
+        cls.breed = Question.objects.create(
+            survey=cls.survey, text='Race ?', question_type='text', order=0,
+            conditional_question=cls.pet, conditional_value='chien',
+        )
+        cls.age = Question.objects.create(
+            survey=cls.survey, text='Âge du chien ?', question_type='scale', order=2,
+            conditional_question=cls.breed,
+        )
+
+    def schema(self):
+        self.survey.refresh_from_db()
+        return survey_schema(self.survey)
+
+    def post(self, **answers):
+        data = {f'{question.id}-{field}': value for question, field, value in answers.values()}
+        return submit_survey(self.survey, self.schema().questions, data, user=self.user)
+
+    def test_plan_orders_parents_first(self):
+        order = self.schema().plan.order
+        self.assertLess(order.index(self.pet.id), order.index(self.breed.id))
+        self.assertLess(order.index(self.breed.id), order.index(self.age.id))
+
+    def test_plan_ignores_cycles(self):
+        Question.objects.filter(pk=self.pet.pk).update(conditional_question=self.age)
+        plan = compile_plan(compile_schema(self.survey).questions)
+        self.assertEqual(plan.parents, {})
+        self.assertEqual(len(plan.order), 3)
+
+    def test_hidden_questions_are_not_validated_or_stored(self):
+        # Question « Âge » obligatoire mais masquée : la soumission reste valide
+        _, submission = self.post(pet=(self.pet, 'choice_response', self.cat.pk))
+        self.assertIsNotNone(submission)
+        self.assertEqual(list(submission.responses.values_list('question_id', flat=True)), [self.pet.id])
+
+    def test_visible_questions_are_validated(self):
+        question_forms, submission = self.post(
+            pet=(self.pet, 'choice_response', self.dog.pk),
+            breed=(self.breed, 'text_response', 'Labrador'),
+        )
+        self.assertIsNone(submission)
+        errors = {question.id: form.errors for question, form in question_forms}
+        self.assertTrue(errors[self.age.id])
+
+    def test_visible_chain_is_stored(self):
+        _, submission = self.post(
+            pet=(self.pet, 'choice_response', self.dog.pk),
+            breed=(self.breed, 'text_response', 'Labrador'),
+            age=(self.age, 'scale_response', 3),
+        )
+        self.assertEqual(submission.responses.count(), 3)
+
+    def test_add_question_rejects_cycle(self):
+        form = QuestionForm({
+            'text': 'Animal ?', 'question_type': 'single_choice', 'order': 1,
+            'conditional_question': self.age.pk, 'conditional_value': '',
+        }, instance=self.pet, survey=self.survey)
+        self.assertFalse(form.is_valid())
+        self.assertIn('boucle', str(form.non_field_errors()))
+
+    def test_add_question_checks_choice_value(self):
+        form = QuestionForm({
+            'text': 'Nom ?', 'question_type': 'text', 'order': 3,
+            'conditional_question': self.pet.pk, 'conditional_value': 'Poisson',
+        }, survey=self.survey)
+        self.assertFalse(form.is_valid())
+        self.assertIn('conditional_value', form.errors)
+
+    def test_add_question_limits_conditions_to_survey(self):
+        other = Survey.objects.create(title='Autre', description='', creator=self.user)
+        foreign = Question.objects.create(survey=other, text='Q', question_type='text')
+        form = QuestionForm(survey=self.survey)
+        self.assertNotIn(foreign, form.fields['conditional_question'].queryset)
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('abdo', password='secret')
+        cls.survey = Survey.objects.create(title='Sondage', description='', creator=cls.user, is_public=True)
+        cls.question = Question.objects.create(survey=cls.survey, text='Q1', question_type='text')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('survey_app:survey_detail', args=[self.survey.id])
+
+    def test_anonymous_detail_is_cached(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('ETag', first)
+        # Une seule requête (le sondage) : ni schéma ni rendu
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+
+    def test_conditional_get_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_question_change_invalidates_page(self):
+        etag = self.client.get(self.url)['ETag']
+        Question.objects.create(survey=self.survey, text='Nouvelle question', question_type='text')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Nouvelle question')
+
+    def test_listing_counts_refresh_after_max_age(self):
+        now = time.time()
+        with mock.patch('survey_app.page_cache.time.time', return_value=now):
+            etag = self.client.get(reverse('survey_app:home'))['ETag']
+            # Une nouvelle réponse n'invalide pas la liste
+            Survey.objects.filter(pk=self.survey.pk).update(respondent_count=1)
+            response = self.client.get(reverse('survey_app:home'), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+        with mock.patch('survey_app.page_cache.time.time', return_value=now + page_cache.LISTING_COUNTS_MAX_AGE):
+            response = self.client.get(reverse('survey_app:home'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '1 réponse')
+
+    def test_listing_changes_with_new_survey(self):
+        etag = self.client.get(reverse('survey_app:home'))['ETag']
+        Survey.objects.create(title='Nouveau sondage', description='', creator=self.user, is_public=True)
+        response = self.client.get(reverse('survey_app:home'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Nouveau sondage')
+
+    def test_authenticated_pages_are_not_shared(self):
+        self.client.get(self.url)
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertNotIn('ETag', response)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertContains(response, 'Bienvenue, abdo')
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            caches = {'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}
+            with override_settings(CACHES=caches):
+                first = self.client.get(self.url)
+                with self.assertNumQueries(1):
+                    second = self.client.get(self.url)
+                self.assertEqual(second.content, first.content)
+
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('abdo')
+        Survey.objects.bulk_create([
+            Survey(title=f'Sondage {i}', description='', creator=cls.user, respondent_count=i) for i in range(25)
+        ])
+        # Deux groupes de sondages créés au même instant : seul l'id les départage
+        instant = timezone.now()
+        pks = list(Survey.objects.order_by('id').values_list('id', flat=True))
+        Survey.objects.filter(pk__in=pks[:12]).update(created_at=instant)
+        Survey.objects.filter(pk__in=pks[12:]).update(created_at=instant - timedelta(seconds=1))
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, page_size):
+        seen, cursor = [], None
+        while True:
+            surveys, cursor = pagination.keyset_page(Survey.objects.all(), cursor, page_size=page_size)
+            seen.extend(survey.id for survey in surveys)
+            if cursor is None:
+                return seen
+
+    def test_pages_neither_skip_nor_repeat_ties(self):
+        expected = list(Survey.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        for page_size in (1, 5, 7, 12, 25, 30):
+            self.assertEqual(self.walk(page_size), expected)
+
+    def test_cursor_round_trips_through_the_query_string(self):
+        first = self.client.get(reverse('survey_app:home'), {'format': 'json'}).json()
+        self.assertEqual(len(first['results']), pagination.LISTING_PAGE_SIZE)
+        second = self.client.get(reverse('survey_app:home'), {'format': 'json', 'after': first['next']}).json()
+        self.assertIsNone(second['next'])
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(ids, list(Survey.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        def encode(raw):
+            return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+        first = self.client.get(reverse('survey_app:home'), {'format': 'json'}).json()
+        for cursor in (
+            '!!!', 'YQ', encode(b'\xff\xfe'), encode(b'hier|3'), encode(b'2026-01-01T00:00:00|3'),
+            encode(b'2026-01-01T00:00:00+00:00|99999999999999999999999'), encode(b'2026-01-01T00:00:00+00:00|-1'),
+        ):
+            response = self.client.get(reverse('survey_app:home'), {'format': 'json', 'after': cursor})
+            self.assertEqual(response.status_code, 200, cursor)
+            self.assertEqual(response.json(), first, cursor)
+
+    def test_json_listings_expose_cursor_and_respondent_count(self):
+        self.client.force_login(self.user)
+        for name in ('survey_app:home', 'survey_app:profile'):
+            payload = self.client.get(reverse(name), {'format': 'json'}).json()
+            self.assertIsNotNone(payload['next'])
+            counts = dict(Survey.objects.values_list('id', 'respondent_count'))
+            for row in payload['results']:
+                self.assertEqual(row['respondent_count'], counts[row['id']])
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for page_size in (1, 10, 25):
+            with self.assertNumQueries(1):
+                pagination.keyset_page(Survey.objects.all(), page_size=page_size)
+        counts = []
+        for page_size in (5, 20):
+            with mock.patch.object(pagination, 'LISTING_PAGE_SIZE', page_size):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(reverse('survey_app:home'))
+            self.assertEqual(len(response.context['surveys']), page_size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class DatabaseProfileTests(TestCase):
+    base_dir = Path('/srv/sondages')
+
+    def test_profile_selection(self):
+        self.assertEqual(database_profile('sqlite', self.base_dir, env={})['NAME'], self.base_dir / 'db.sqlite3')
+        basic = database_profile('sqlite-basic', self.base_dir, env={})
+        self.assertEqual(basic, {'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.base_dir / 'db.sqlite3'})
+        postgres = database_profile('postgres', self.base_dir, env={'SURVEY_DB_NAME': 'prod', 'SURVEY_DB_HOST': 'db'})
+        self.assertEqual(postgres['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((postgres['NAME'], postgres['HOST']), ('prod', 'db'))
+        with self.assertRaisesMessage(ValueError, 'Profil de base inconnu : mysql'):
+            database_profile('mysql', self.base_dir, env={})
+
+    def test_tuned_sqlite_settings(self):
+        tuned = database_profile('sqlite', self.base_dir, env={'SURVEY_DB_CONN_MAX_AGE': '30'})
+        self.assertEqual(tuned['OPTIONS'], {'transaction_mode': 'IMMEDIATE', 'timeout': SQLITE_BUSY_TIMEOUT})
+        self.assertEqual(tuned['CONN_MAX_AGE'], 30)
+        self.assertTrue(tuned['CONN_HEALTH_CHECKS'])
+        self.assertEqual(tuned['PRAGMAS'], SQLITE_TUNED_PRAGMAS)
+        self.assertEqual(database_profile('sqlite', self.base_dir, env={})['CONN_MAX_AGE'], 60)
+
+    def test_postgres_pool(self):
+        pooled = database_profile('postgres', self.base_dir, env={'SURVEY_DB_POOL_SIZE': '20'})
+        self.assertEqual(pooled['CONN_MAX_AGE'], 0)
+        self.assertEqual(pooled['OPTIONS']['pool'], {'min_size': 5, 'max_size': 20})
+        self.assertNotIn('pool', database_profile('postgres', self.base_dir, env={})['OPTIONS'])
+
+    def test_pragmas_applied_on_new_connection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profile = database_profile('sqlite', Path(directory), env={})
+            handler = ConnectionHandler({'default': profile})
+            tuned = handler['default']
+            try:
+                with tuned.cursor() as cursor:
+                    values = {}
+                    for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+                        cursor.execute(f'PRAGMA {name}')
+                        values[name] = cursor.fetchone()[0]
+            finally:
+                handler.close_all()
+        self.assertEqual(values, {
+            'journal_mode': 'wal',
+            'synchronous': 1,
+            'busy_timeout': SQLITE_BUSY_TIMEOUT * 1000,
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -65536,
+        })
+
+    def test_pragmas_ignored_for_other_vendors(self):
+        other = mock.Mock(vendor='postgresql', settings_dict={'PRAGMAS': SQLITE_TUNED_PRAGMAS})
+        apply_sqlite_pragmas(sender=None, connection=other)
+        other.cursor.assert_not_called()
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('abdo')
+        cls.survey = Survey.objects.create(title='Sondage', description='', creator=cls.user, is_public=True)
+        cls.question = Question.objects.create(survey=cls.survey, text='Note ?', question_type='scale')
+
+    def setUp(self):
+        self.client = AsyncClient()
+        self.client.force_login(self.user)
+
+    async def test_take_survey_get(self):
+        response = await self.client.get(reverse('survey_app:take_survey_async', args=[self.survey.id]))
+        self.assertContains(response, 'Note ?')
+
+    async def test_take_survey_post_records_submission(self):
+        response = await self.client.post(
+            reverse('survey_app:take_survey_async', args=[self.survey.id]),
+            {f'{self.question.id}-scale_response': '8'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(await Response.objects.filter(survey=self.survey, scale_response=8).acount(), 1)
+
+    async def test_take_survey_post_invalid(self):
+        response = await self.client.post(
+            reverse('survey_app:take_survey_async', args=[self.survey.id]),
+            {f'{self.question.id}-scale_response': '42'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await Submission.objects.acount(), 0)
+
+    async def test_results_dashboard(self):
+        await self.client.post(
+            reverse('survey_app:take_survey_async', args=[self.survey.id]),
+            {f'{self.question.id}-scale_response': '6'},
+        )
+        response = await self.client.get(reverse('survey_app:survey_results_async', args=[self.survey.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['dashboard'][0]['responses'], 1)
+
+    async def test_results_restricted_to_creator(self):
+        other = await User.objects.acreate(username='autre')
+        await self.client.aforce_login(other)
+        response = await self.client.get(reverse('survey_app:survey_results_async', args=[self.survey.id]))
+        self.assertEqual(response.status_code, 302)
+
+
+class SubmissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('abdo')
+        self.client.force_login(self.user)
+
+    def row_counts(self):
+        return (
+            Submission.objects.count(), Response.objects.count(), Response.choice_response.through.objects.count(),
+            QuestionTally.objects.count(),
+        )
+
+    def test_query_count_does_not_depend_on_question_count(self):
+        counts = []
+        for question_count in (1, 10, 50):
+            # Un seul type de question : chaque type ajoute ses agrégats, une fois par soumission
+            with mock.patch.object(benchmarks, 'QUESTION_TYPE_CYCLE', ['multiple_choice']):
+                survey = build_survey(self.user, question_count)
+            url = reverse('survey_app:take_survey', args=[survey.id])
+            # Schéma en cache, comme en régime établi
+            survey_schema(survey)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, submission_post_data(survey))
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(Response.objects.filter(survey=survey).count(), question_count)
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+    def test_invalid_form_writes_nothing(self):
+        survey = build_survey(self.user, 8)
+        data = submission_post_data(survey)
+        scale = survey.questions.get(question_type='scale', order=2)
+        data[f'{scale.id}-scale_response'] = '42'
+        response = self.client.post(reverse('survey_app:take_survey', args=[survey.id]), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.row_counts(), (0, 0, 0, 0))
+
+    def test_failed_aggregate_update_rolls_back_submission(self):
+        survey = build_survey(self.user, 8)
+        data = QueryDict(mutable=True)
+        for name, value in submission_post_data(survey).items():
+            data.setlist(name, value if isinstance(value, list) else [value])
+        with mock.patch('survey_app.submission.record_submission', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                submit_survey(survey, survey_questions(survey), data, user=self.user)
+        self.assertEqual(self.row_counts(), (0, 0, 0, 0))
+        survey.refresh_from_db()
+        self.assertEqual(survey.respondent_count, 0)
+
+
+class TallyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('abdo')
+        self.client.force_login(self.user)
+        self.survey = build_survey(self.user, 8)
+        self.scales = list(self.survey.questions.filter(question_type='scale').order_by('order'))
+
+    def submit(self, *values):
+        data = submission_post_data(self.survey)
+        for question, value in zip(self.scales, values):
+            data[f'{question.id}-scale_response'] = str(value)
+        response = self.client.post(reverse('survey_app:take_survey', args=[self.survey.id]), data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_rebuild_matches_incremental_counts(self):
+        for values in ((3, 5), (5, 3), (3, 3), (3, 5)):
+            self.submit(*values)
+        incremental = survey_tallies(self.survey)
+        first, second = self.scales
+        self.assertEqual(incremental[first.id]['scale'], {3: 3, 5: 1})
+        self.assertEqual(incremental[second.id]['scale'], {3: 2, 5: 2})
+        self.assertEqual(incremental[first.id]['responses'], 4)
+
+        self.assertEqual(rebuild_tallies([self.survey.id]), 1)
+        self.assertEqual(survey_tallies(self.survey), incremental)
+
+    def test_only_submitted_scale_pairs_are_updated(self):
+        self.submit(3, 5)
+        first, second = self.scales
+        with CaptureQueriesContext(connection) as queries:
+            self.submit(5, 3)
+        update = next(
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE') and ScaleTally._meta.db_table in query['sql']
+        )
+        # Filtre par couple (question, valeur), pas question IN (...) AND value IN (...)
+        self.assertNotIn('"value" IN', update)
+        self.assertEqual(survey_tallies(self.survey)[first.id]['scale'], {3: 1, 5: 1})
+        self.assertEqual(survey_tallies(self.survey)[second.id]['scale'], {3: 1, 5: 1})
+
+
+class IngestBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('abdo')
+        cls.survey = Survey.objects.create(title='Sondage', description='', creator=cls.user, max_responses=2)
+        cls.question = Question.objects.create(survey=cls.survey, text='Animal ?', question_type='multiple_choice')
+        cls.choices = [Choice.objects.create(question=cls.question, text=text) for text in ('Chien', 'Chat')]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(SUBMISSION_BUFFER_PATH=os.path.join(directory.name, 'buffer.sqlite3'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def submit(self, key=None):
+        self.survey.refresh_from_db()
+        data = {f'{self.question.id}-choice_response': [str(choice.pk) for choice in self.choices]}
+        data['submission_key'] = key or submission_key()
+        query = QueryDict(mutable=True)
+        for name, value in data.items():
+            query.setlist(name, value if isinstance(value, list) else [value])
+        return submit_survey(self.survey, survey_schema(self.survey).questions, query, user=self.user)[1]
+
+    def test_submissions_are_queued_then_flushed(self):
+        queued = self.submit()
+        self.assertIsInstance(queued, ingest_buffer.QueuedSubmission)
+        self.assertEqual(Submission.objects.count(), 0)
+        self.assertEqual(ingest_buffer.flush(), (1, 1))
+        submission = Submission.objects.get(idempotency_key=queued.idempotency_key)
+        self.assertEqual(submission.responses.get().choice_response.count(), 2)
+        self.assertEqual(QuestionTally.objects.get(question=self.question).response_count, 1)
+        self.assertEqual(ingest_buffer.pending_count(), 0)
+
+    def test_resubmitted_form_is_queued_once(self):
+        key = submission_key()
+        self.submit(key)
+        self.submit(key)
+        self.assertEqual(ingest_buffer.pending_count(), 1)
+
+    def test_replay_after_flush_is_ignored(self):
+        queued = self.submit()
+        ingest_buffer.flush()
+        # Arrêt simulé entre le commit et la suppression : l'entrée est rejouée
+        self.submit(queued.idempotency_key)
+        self.assertEqual(ingest_buffer.flush(), (1, 0))
+        self.assertEqual(Submission.objects.count(), 1)
+
+    def test_same_key_is_queued_for_each_survey(self):
+        other = Survey.objects.create(title='Autre', description='', creator=self.user)
+        question = Question.objects.create(survey=other, text='Note ?', question_type='scale')
+        key = submission_key()
+        self.submit(key)
+        forms = build_response_forms([question], {f'{question.id}-scale_response': '7'})
+        self.assertTrue(forms[0][1].is_valid())
+        ingest_buffer.enqueue(other, forms, idempotency_key=key)
+        ingest_buffer.enqueue(other, forms, idempotency_key=key)
+        self.assertEqual(ingest_buffer.pending_count(), 2)
+        self.assertEqual(ingest_buffer.flush(), (2, 2))
+        self.assertEqual(
+            sorted(Submission.objects.filter(idempotency_key=key).values_list('survey_id', flat=True)),
+            sorted([self.survey.pk, other.pk]),
+        )
+
+    def test_queue_without_survey_column_is_converted(self):
+        path = ingest_buffer.buffer_path()
+        legacy = sqlite3.connect(path, isolation_level=None)
+        legacy.execute(
+            'CREATE TABLE pending (id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' idempotency_key TEXT NOT NULL UNIQUE, payload TEXT NOT NULL)'
+        )
+        now = timezone.now().isoformat()
+        payload = {
+            'survey_id': self.survey.pk, 'user_id': None, 'ip_address': None,
+            'started_at': now, 'finished_at': now, 'answers': [],
+        }
+        legacy.execute('INSERT INTO pending (idempotency_key, payload) VALUES (?, ?)', ('a' * 32, json.dumps(payload)))
+        legacy.close()
+        self.assertEqual(ingest_buffer.flush(), (1, 1))
+        self.assertEqual(Submission.objects.get().idempotency_key, 'a' * 32)
+
+    def test_flush_enforces_max_responses(self):
+        for _ in range(3):
+            self.submit()
+        self.assertEqual(ingest_buffer.flush(), (3, 2))
+        self.survey.refresh_from_db()
+        self.assertEqual(self.survey.respondent_count, 2)
+
+    @override_settings(SUBMISSION_BUFFER_PATH=None)
+    def test_direct_submission_is_idempotent(self):
+        key = submission_key()
+        first = self.submit(key)
+        second = self.submit(key)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Submission.objects.count(), 1)
+
+    def test_key_reused_on_another_survey_is_not_shared(self):
+        other = Survey.objects.create(title='Autre', description='', creator=self.user)
+        queued = self.submit()
+        ingest_buffer.flush()
+        now = timezone.now().isoformat()
+        payload = {
+            'survey_id': other.pk, 'user_id': None, 'ip_address': None,
+            'started_at': now, 'finished_at': now, 'answers': [],
+        }
+        self.assertEqual(ingest_buffer.write_entries([(queued.idempotency_key, payload)]), 1)
+        with override_settings(SUBMISSION_BUFFER_PATH=None):
+            key = submission_key()
+            first = self.submit(key)
+            second = save_submission(other, [], idempotency_key=key)
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertEqual(second.survey_id, other.pk)
+        self.assertEqual(Submission.objects.filter(survey=other).count(), 2)
+
+
+class StreamExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('abdo')
+        self.survey = build_survey(self.user, 4)
+        self.multiple = self.survey.questions.get(question_type='multiple_choice')
+        self.client.force_login(self.user)
+        for _ in range(3):
+            self.client.post(reverse('survey_app:take_survey', args=[self.survey.id]), submission_post_data(self.survey))
+
+    def stream(self, name, **params):
+        response = self.client.get(reverse(name, args=[self.survey.id]), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_one_row_per_response(self):
+        rows = list(csv.reader(io.StringIO(self.stream('survey_app:export_csv'))))
+        self.assertEqual(rows[0], ['submission', 'question_id', 'question', 'answer', 'created_at', 'user'])
+        self.assertEqual(len(rows) - 1, Response.objects.filter(survey=self.survey).count())
+        multiple = [row for row in rows[1:] if row[1] == str(self.multiple.id)]
+        self.assertEqual(len(multiple), 3)
+        self.assertTrue(all(row[3] == 'Choix 1, Choix 2' and row[5] == 'abdo' for row in multiple))
+
+        rows = list(csv.reader(io.StringIO(self.stream('survey_app:export_csv', per='submission'))))
+        self.assertEqual(rows[0][:4], ['submission', 'started_at', 'finished_at', 'user'])
+        self.assertEqual(len(rows), 4)
+
+    def test_ndjson_one_object_per_response(self):
+        lines = [json.loads(line) for line in self.stream('survey_app:export_ndjson').splitlines()]
+        self.assertEqual(len(lines), Response.objects.filter(survey=self.survey).count())
+        answers = [line['answer'] for line in lines if line['question_id'] == self.multiple.id]
+        self.assertEqual(answers, [['Choix 1', 'Choix 2']] * 3)
+
+        submissions = [json.loads(line) for line in self.stream('survey_app:export_ndjson', per='submission').splitlines()]
+        self.assertEqual(len(submissions), 3)
+        self.assertEqual(submissions[0]['answers'][str(self.multiple.id)], ['Choix 1', 'Choix 2'])
+
+    async def test_asgi_export_streams_asynchronously(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        expected = await sync_to_async(self.stream)('survey_app:export_csv')
+        with mock.patch.object(exports, 'STREAM_BATCH_ROWS', 2):
+            response = await client.get(reverse('survey_app:export_csv', args=[self.survey.id]))
+            # Itérateur asynchrone : Django n'a pas à lire tout l'export avant le premier envoi
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(b''.join(chunks).decode(), expected)
+        self.assertEqual(len(chunks), (len(expected.splitlines()) + 1) // 2)
+
+
+class ExportJobTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(EXPORT_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('abdo')
+        self.survey = build_survey(self.user, 4)
+        seed_submissions(self.survey, 5)
+        self.client.force_login(self.user)
+        self.url = reverse('survey_app:export_results', args=[self.survey.id])
+
+    def run_worker(self):
+        # Même travail que manage.py run_export_worker, sans pool de processus (base de test)
+        job_id = jobs.claim_next_job()
+        self.assertIsNotNone(job_id)
+        self.assertEqual(jobs.run_job(job_id), (job_id, True))
+        self.assertIsNone(jobs.claim_next_job())
+        return ExportJob.objects.get(pk=job_id)
+
+    def test_export_lifecycle_and_file_reuse(self):
+        response = self.client.get(self.url)
+        job = ExportJob.objects.get(survey=self.survey)
+        self.assertRedirects(response, reverse('survey_app:export_status', args=[job.id]), fetch_redirect_response=False)
+        self.assertEqual(job.status, ExportJob.STATUS_PENDING)
+        self.assertEqual(job.watermark, jobs.export_watermark(self.survey))
+
+        job = self.run_worker()
+        self.assertEqual(job.status, ExportJob.STATUS_DONE)
+        path = jobs.job_file(job)
+        self.assertTrue(path.exists())
+        self.assertTrue(path.read_bytes().startswith(b'%PDF'))
+
+        # Filigrane inchangé : même job, fichier servi depuis le disque
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('survey_app:export_download', args=[job.id]), fetch_redirect_response=False)
+        self.assertEqual(ExportJob.objects.filter(survey=self.survey).count(), 1)
+        download = self.client.get(reverse('survey_app:export_download', args=[job.id]))
+        self.assertEqual(b''.join(download.streaming_content), path.read_bytes())
+
+        # Fichier encore sur disque sans job réutilisable : job créé directement terminé
+        ExportJob.objects.all().delete()
+        reused = jobs.request_export(self.survey, self.user)
+        self.assertEqual(reused.status, ExportJob.STATUS_DONE)
+        self.assertEqual(jobs.job_file(reused), path)
+
+        # Nouvelle réponse : nouveau filigrane, nouvel export, l'ancien fichier est supprimé
+        self.client.post(reverse('survey_app:take_survey', args=[self.survey.id]), submission_post_data(self.survey))
+        fresh = jobs.request_export(self.survey, self.user)
+        self.assertEqual(fresh.status, ExportJob.STATUS_PENDING)
+        self.assertNotEqual(self.run_worker().file_path, str(path))
+        self.assertFalse(path.exists())
+
+    async def test_async_export_serves_cached_file(self):
+        await sync_to_async(jobs.request_export)(self.survey, self.user)
+        job = await sync_to_async(self.run_worker)()
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        url = reverse('survey_app:export_results_async', args=[self.survey.id])
+        response = await client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), jobs.job_file(job).read_bytes())
+
+        # Fichier supprimé du disque : pas d'erreur, la vue redirige vers la page d'état
+        Path(job.file_path).unlink()
+        self.assertIsNone(await sync_to_async(open_job_file)(job))
+
+
+class ResponseLimitTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('abdo')
+        self.survey = build_survey(self.user, 4)
+        Survey.objects.filter(pk=self.survey.pk).update(max_responses=2)
+        self.survey.refresh_from_db()
+        self.client.force_login(self.user)
+        self.url = reverse('survey_app:take_survey', args=[self.survey.id])
+
+    def row_counts(self):
+        return (
+            Submission.objects.filter(survey=self.survey).count(),
+            Response.objects.filter(survey=self.survey).count(),
+            Response.choice_response.through.objects.filter(response__survey=self.survey).count(),
+            sum(QuestionTally.objects.filter(question__survey=self.survey).values_list('response_count', flat=True)),
+        )
+
+    def test_submission_over_limit_writes_nothing(self):
+        # Instance lue avant que la limite soit atteinte : seule la mise à jour conditionnelle protège
+        stale = Survey.objects.get(pk=self.survey.pk)
+        for _ in range(2):
+            self.client.post(self.url, submission_post_data(self.survey))
+        self.survey.refresh_from_db()
+        self.assertEqual(self.survey.respondent_count, 2)
+        before = self.row_counts()
+
+        question_forms = build_response_forms(survey_questions(self.survey), submission_post_data(self.survey))
+        self.assertTrue(all(form.is_valid() for _, form in question_forms))
+        with self.assertRaises(SurveyLimitReached):
+            save_submission(stale, question_forms, user=self.user)
+        self.assertEqual(self.row_counts(), before)
+
+        response = self.client.post(self.url, submission_post_data(self.survey), follow=True)
+        self.assertContains(response, 'limite de réponses')
+        self.assertEqual(self.row_counts(), before)
+        self.survey.refresh_from_db()
+        self.assertEqual(self.survey.respondent_count, 2)
+
+
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('abdo')
+        cls.survey = build_survey(cls.user, 20)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_hot_views_stay_within_budget(self):
+        # Le lanceur de tests rend les budgets stricts : un dépassement lève QueryBudgetExceeded
+        take_url = reverse('survey_app:take_survey', args=[self.survey.id])
+        self.client.get(take_url)
+        response = self.client.post(take_url, submission_post_data(self.survey))
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(reverse('survey_app:survey_results', args=[self.survey.id]))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(VIEW_QUERY_BUDGETS={'survey_app:survey_results': 1})
+    def test_budget_overrun_raises_in_tests(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('survey_app:survey_results', args=[self.survey.id]))
+
+    @override_settings(VIEW_QUERY_BUDGETS={'survey_app:survey_results': 1}, QUERY_BUDGET_STRICT=False)
+    def test_budget_overrun_is_logged_in_production(self):
+        with self.assertLogs('survey_app.metrics', 'WARNING') as logs:
+            self.client.get(reverse('survey_app:survey_results', args=[self.survey.id]))
+        self.assertIn('budget de 1', logs.output[-1])
+
+    @override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_SAMPLE_RATE=1.0)
+    def test_slow_queries_are_sampled_with_stack(self):
+        with self.assertLogs('survey_app.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('survey_app:survey_results', args=[self.survey.id]))
+        sample = json.loads(logs.records[0].getMessage())
+        self.assertIn('SELECT', sample['sql'])
+        self.assertTrue(any('survey_app' in frame for frame in sample['stack']))
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('survey_app:survey_results', args=[self.survey.id]))
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'].split(';')[0], 'text/plain')
+        self.assertContains(response, 'survey_db_queries_total{view="survey_app:survey_results"}')
+        self.assertContains(response, 'survey_http_request_duration_seconds_bucket{view="survey_app:survey_results",le="+Inf"}')
+
+    @override_settings(DEBUG=True)
+    def test_middleware_chain_stays_async_under_asgi(self):
+        # Un middleware synchrone seulement serait adapté (message DEBUG) et rendrait toute la chaîne synchrone
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    def test_metrics_endpoint_is_local_only(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, 404)
+
+
+class SeedLoadTests(TestCase):
+    def test_seed_load_creates_consistent_data(self):
+        call_command(
+            'seed_load', users=5, surveys=3, responses=300,
+            questions_min=3, questions_max=4, stdout=io.StringIO(),
+        )
+        self.assertEqual(User.objects.filter(username__startswith='load').count(), 5)
+        self.assertEqual(Survey.objects.count(), 3)
+        for survey in Survey.objects.all():
+            submissions = Submission.objects.filter(survey=survey).count()
+            self.assertGreater(submissions, 0)
+            self.assertEqual(survey.respondent_count, submissions)
+            self.assertEqual(
+                Response.objects.filter(survey=survey).count(),
+                submissions * survey.questions.count(),
+            )
+            # Les compteurs agrégés sont reconstruits après l'insertion en masse
+            tallied = sum(QuestionTally.objects.filter(question__survey=survey).values_list('response_count', flat=True))
+            self.assertEqual(tallied, submissions * survey.questions.count())
+
+
+class StatisticsTests(TestCase):
+    def both_engines(self, func):
+        """Résultat avec NumPy (si installé) et avec le repli en Python pur"""
+        results = [func()] if stats.np is not None else []
+        with mock.patch.object(stats, 'np', None):
+            results.append(func())
+        return results
+
+    def test_summary_matches_statistics_module(self):
+        rng = random.Random(3)
+        values = [rng.randint(1, 10) for _ in range(501)]
+        expected_quartiles = statistics.quantiles(values, n=4, method='inclusive')
+        for summary in self.both_engines(lambda: stats.summarize_values(values)):
+            self.assertEqual(summary['count'], 501)
+            self.assertAlmostEqual(summary['mean'], statistics.mean(values))
+            self.assertAlmostEqual(summary['stddev'], statistics.stdev(values))
+            self.assertEqual(summary['median'], statistics.median(values))
+            for (_, value), expected in zip(summary['quantiles'], expected_quartiles):
+                self.assertAlmostEqual(value, expected)
+            self.assertLess(summary['ci_low'], summary['mean'])
+            self.assertGreater(summary['ci_high'], summary['mean'])
+
+    def test_empty_and_single_answer(self):
+        for empty, single in self.both_engines(lambda: (stats.summarize([]), stats.summarize([(4, 1)]))):
+            self.assertEqual(empty['count'], 0)
+            self.assertIsNone(empty['mean'])
+            self.assertEqual(single['median'], 4)
+            self.assertIsNone(single['ci_low'])
+
+    def test_proportion_intervals(self):
+        for intervals in self.both_engines(lambda: stats.proportion_intervals([0, 50, 100], 100)):
+            self.assertEqual(intervals[0][0], 0.0)
+            self.assertLess(intervals[1][0], 50)
+            self.assertGreater(intervals[1][1], 50)
+            self.assertEqual(intervals[2][1], 100.0)
+
+    def test_cooccurrence_counts_responses_selecting_both_choices(self):
+        user = User.objects.create_user(username='stats', password='secret')
+        survey = build_survey(user, 2)
+        seed_submissions(survey, 60)
+        question = survey.questions.get(question_type='multiple_choice')
+        choice_ids = list(question.choices.values_list('id', flat=True))
+
+        expected = [[0] * len(choice_ids) for _ in choice_ids]
+        for response in Response.objects.filter(question=question).prefetch_related('choice_response'):
+            selected = [choice_ids.index(choice.id) for choice in response.choice_response.all()]
+            for i in selected:
+                for j in selected:
+                    expected[i][j] += 1
+        self.assertGreater(sum(map(sum, expected)), 0)
+        for matrices in self.both_engines(lambda: stats.compute_cooccurrence(survey_schema(survey).questions)):
+            self.assertEqual(matrices[question.id], expected)
+
+    def test_results_page_shows_statistics(self):
+        user = User.objects.create_user(username='owner', password='secret')
+        survey = build_survey(user, 4)
+        seed_submissions(survey, 30)
+        survey.refresh_from_db()
+        self.client.force_login(user)
+        response = self.client.get(reverse('survey_app:survey_results', args=[survey.id]))
+        entries = {entry['question'].question_type: entry for entry in response.context['dashboard']}
+        self.assertIsNotNone(entries['scale']['scale']['ci_low'])
+        self.assertIn('ci_high', entries['single_choice']['choices'][0])
+        self.assertEqual(len(entries['multiple_choice']['cooccurrence']), 4)
+        self.assertContains(response, 'Choix sélectionnés ensemble')
+
+
+class SegmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.survey = build_survey(self.user, 4)
+        seed_submissions(self.survey, 80)
+        self.survey.refresh_from_db()
+        self.questions = list(survey_schema(self.survey).questions)
+        self.single, self.multiple, self.scale = self.questions[:3]
+        self.choice = self.single.choices[0]
+        self.client.force_login(self.user)
+
+    def answers(self):
+        """Réponses de chaque soumission : {soumission: {question: (choix, échelle)}}"""
+        answers = {}
+        for response in Response.objects.filter(survey=self.survey).prefetch_related('choice_response'):
+            answers.setdefault(response.submission_id, {})[response.question_id] = (
+                {choice.pk for choice in response.choice_response.all()}, response.scale_response,
+            )
+        return answers
+
+    def query(self, params):
+        return self.client.get(reverse('survey_app:survey_results_query', args=[self.survey.id]), params)
+
+    def test_choice_filter_counts_only_matching_respondents(self):
+        expected = [
+            answers for answers in self.answers().values()
+            if self.choice.pk in answers[self.single.id][0]
+        ]
+        payload = self.query({'choice': f'{self.single.id}:{self.choice.pk}'}).json()
+        self.assertEqual(payload['respondents'], len(expected))
+        by_id = {entry['id']: entry for entry in payload['questions']}
+        counts = {row['id']: row['count'] for row in by_id[self.single.id]['choices']}
+        self.assertEqual(counts[self.choice.pk], len(expected))
+        self.assertEqual(sum(counts.values()), len(expected))
+        scale = sum(by_id[self.scale.id]['scale'].values())
+        self.assertEqual(scale, sum(1 for answers in expected if answers[self.scale.id][1] is not None))
+
+    def test_crosstab_matches_brute_force(self):
+        payload = self.query({'rows': self.multiple.id, 'columns': self.scale.id}).json()
+        crosstab = payload['crosstab']
+        choice_ids = [choice.pk for choice in self.multiple.choices]
+        expected = [[0] * (SCALE_MAX - SCALE_MIN + 1) for _ in choice_ids]
+        for answers in self.answers().values():
+            value = answers[self.scale.id][1]
+            for choice_id in answers[self.multiple.id][0]:
+                expected[choice_ids.index(choice_id)][value - SCALE_MIN] += 1
+        self.assertEqual(crosstab['counts'], expected)
+        self.assertEqual(crosstab['columns']['labels'][0], str(SCALE_MIN))
+
+    def test_date_filter(self):
+        old = Submission.objects.filter(survey=self.survey).order_by('id')[:30]
+        Submission.objects.filter(pk__in=list(old.values_list('pk', flat=True))).update(
+            started_at=timezone.now() - timedelta(days=60),
+        )
+        self.assertEqual(self.query({'days': 30}).json()['respondents'], 50)
+
+    def test_results_are_cached_until_new_submission(self):
+        params = {'choice': f'{self.single.id}:{self.choice.pk}', 'rows': self.single.id, 'columns': self.scale.id}
+        first = self.query(params).json()
+        with CaptureQueriesContext(connection) as cold:
+            cache.clear()
+            self.query(params)
+        with CaptureQueriesContext(connection) as warm:
+            self.assertEqual(self.query(params).json(), first)
+        self.assertLess(len(warm), len(cold) - 4)
+
+        data = submission_post_data(self.survey)
+        data[str(self.single.id) + '-choice_response'] = str(self.choice.pk)
+        self.client.post(reverse('survey_app:take_survey', args=[self.survey.id]), data)
+        self.assertEqual(self.query(params).json()['respondents'], first['respondents'] + 1)
+
+    def test_invalid_filters(self):
+        self.assertEqual(self.query({'choice': f'{self.single.id}:999999'}).status_code, 400)
+        self.assertEqual(self.query({'rows': self.single.id, 'columns': self.single.id}).status_code, 400)
+        self.assertEqual(self.query({'days': 'abc'}).status_code, 400)
+        self.client.logout()
+        other = User.objects.create_user(username='other', password='secret')
+        self.client.force_login(other)
+        self.assertEqual(self.query({}).status_code, 403)
+
+    def test_results_page_filter_ui(self):
+        params = {'choice': f'{self.single.id}:{self.choice.pk}', 'rows': self.single.id, 'columns': self.scale.id}
+        response = self.client.get(reverse('survey_app:survey_results', args=[self.survey.id]), params)
+        self.assertContains(response, 'dans ce segment')
+        self.assertContains(response, f'value="{self.single.id}:{self.choice.pk}" selected')
+        self.assertIsNotNone(response.context['crosstab'])
+
+
+class ShareLinkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        share_links.local_cache.clear()
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.survey = build_survey(self.user, 1)
+
+    def test_share_link_redirects_and_is_cached(self):
+        share = share_links.create_share(self.survey)
+        response = self.client.get(reverse('share_link', args=[share.share_token]))
+        self.assertRedirects(response, reverse('survey_app:survey_detail', args=[self.survey.id]), fetch_redirect_response=False)
+        with self.assertNumQueries(0):
+            self.assertEqual(share_links.resolve_share(share.share_token), self.survey.id)
+        # Cache partagé seul (autre processus)
+        share_links.local_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(share_links.resolve_share(share.share_token), self.survey.id)
+
+    def test_share_link_opens_private_survey(self):
+        Survey.objects.filter(pk=self.survey.pk).update(is_public=False)
+        recipient = User.objects.create_user(username='recipient', password='secret')
+        self.client.force_login(recipient)
+        detail_url = reverse('survey_app:survey_detail', args=[self.survey.id])
+        take_url = reverse('survey_app:take_survey', args=[self.survey.id])
+        self.assertRedirects(self.client.get(detail_url), reverse('home'), fetch_redirect_response=False)
+
+        share = share_links.create_share(self.survey)
+        response = self.client.get(reverse('share_link', args=[share.share_token]), follow=True)
+        self.assertContains(response, self.survey.title)
+        self.assertEqual(self.client.get(take_url).status_code, 200)
+        async_client = AsyncClient()
+        async_client.cookies = self.client.cookies
+        response = async_to_sync(async_client.get)(reverse('survey_app:take_survey_async', args=[self.survey.id]))
+        self.assertEqual(response.status_code, 200)
+        self.client.post(take_url, submission_post_data(self.survey))
+        self.assertTrue(Submission.objects.filter(survey=self.survey, user=recipient).exists())
+
+        # Lien supprimé : l'accès gardé en session tombe avec lui
+        share.delete()
+        self.assertRedirects(self.client.get(detail_url), reverse('home'), fetch_redirect_response=False)
+
+    def test_unknown_tokens_are_negatively_cached(self):
+        self.assertEqual(self.client.get('/s/inconnu/').status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertIsNone(share_links.resolve_share('inconnu'))
+            self.assertIsNone(share_links.resolve_share('x' * 101))
+
+    def test_expired_and_deleted_links_are_refused(self):
+        expired = share_links.create_share(self.survey, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.client.get(reverse('share_link', args=[expired.share_token])).status_code, 404)
+
+        share = share_links.create_share(self.survey)
+        self.assertEqual(share_links.resolve_share(share.share_token), self.survey.id)
+        share.delete()
+        self.assertIsNone(share_links.resolve_share(share.share_token))
+
+    def test_creator_creates_share_link(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('survey_app:survey_share', args=[self.survey.id]), {'days': '7'}, follow=True)
+        share = SurveyShare.objects.get(survey=self.survey)
+        self.assertAlmostEqual(share.expires_at - timezone.now(), timedelta(days=7), delta=timedelta(minutes=1))
+        self.assertContains(response, reverse('share_link', args=[share.share_token]))
+
+        other = User.objects.create_user(username='other', password='secret')
+        self.client.force_login(other)
+        self.client.post(reverse('survey_app:survey_share', args=[self.survey.id]))
+        self.assertEqual(SurveyShare.objects.count(), 1)
+
+    def test_purge_expired_shares_in_batches(self):
+        past = timezone.now() - timedelta(days=1)
+        SurveyShare.objects.bulk_create([
+            SurveyShare(survey=self.survey, share_token=f'expired{i}', expires_at=past) for i in range(5)
+        ])
+        active = share_links.create_share(self.survey, timezone.now() + timedelta(days=1))
+        permanent = share_links.create_share(self.survey)
+        self.assertEqual(list(share_links.purge_expired(batch_size=2)), [2, 2, 1])
+        self.assertEqual(set(SurveyShare.objects.values_list('pk', flat=True)), {active.pk, permanent.pk})
+        out = io.StringIO()
+        call_command('purge_expired_shares', stdout=out)
+        self.assertIn('0 lien(s)', out.getvalue())
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret', email='owner@example.com')
+        self.survey = build_survey(self.user, 2)
+        seed_submissions(self.survey, 5)
+
+    def submit(self, count=1):
+        data = submission_post_data(self.survey)
+        for _ in range(count):
+            self.client.post(reverse('survey_app:take_survey', args=[self.survey.id]), data)
+
+    def test_submissions_are_coalesced_into_one_digest(self):
+        notifications.subscribe(self.survey, self.user)
+        self.client.force_login(self.user)
+        self.submit(3)
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(notifications.dispatch(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('3 nouvelles réponses', mail.outbox[0].subject)
+        self.assertEqual(mail.outbox[0].to, ['owner@example.com'])
+        self.assertEqual(notifications.dispatch(), (0, 0))
+
+        # Dans la fenêtre de regroupement : rien avant qu'elle soit écoulée
+        self.submit()
+        self.assertEqual(notifications.dispatch(), (0, 0))
+        later = timezone.now() + notifications.digest_window()
+        self.assertEqual(notifications.dispatch(now=later), (1, 0))
+        self.assertIn('1 nouvelle réponse', mail.outbox[1].subject)
+
+    def test_completion_is_notified_once(self):
+        notifications.subscribe(self.survey, self.user)
+        Survey.objects.filter(pk=self.survey.pk).update(max_responses=6)
+        self.client.force_login(self.user)
+        self.submit()
+        self.assertEqual(notifications.dispatch(), (2, 0))
+        self.assertEqual(sorted(message.subject.split()[0] for message in mail.outbox), ['1', 'Le'])
+        later = timezone.now() + notifications.digest_window()
+        self.assertEqual(notifications.dispatch(now=later), (0, 0))
+
+    def test_failed_delivery_is_retried(self):
+        notifications.subscribe(self.survey, self.user)
+        self.client.force_login(self.user)
+        self.submit()
+        with mock.patch.object(notifications, 'deliver', side_effect=OSError('smtp')), \
+                self.assertLogs('survey_app.notifications', 'ERROR'):
+            self.assertEqual(notifications.dispatch(), (0, 1))
+        self.assertEqual(notifications.dispatch(), (1, 0))
+
+    def test_toggle_from_survey_page(self):
+        self.client.force_login(self.user)
+        url = reverse('survey_app:survey_notifications', args=[self.survey.id])
+        self.client.post(url, {'active': '1'})
+        response = self.client.get(reverse('survey_app:survey_detail', args=[self.survey.id]))
+        self.assertContains(response, 'Ne plus recevoir')
+        self.client.post(url, {'active': '0'})
+        self.assertFalse(SurveyNotification.objects.get(survey=self.survey).is_active)
+        self.submit()
+        self.assertEqual(notifications.dispatch(), (0, 0))
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.survey = build_survey(self.user, 2)
+
+    @override_settings(SUBMISSION_RATE_LIMITS={'ip': (3, 60)})
+    def test_sliding_window(self):
+        start = 1000 * 60
+        for offset in range(3):
+            self.assertEqual(throttling.throttle_submission(self.survey, ip_address='10.0.0.1', now=start + offset), 0)
+        self.assertEqual(throttling.throttle_submission(self.survey, ip_address='10.0.0.1', now=start + 3), 58)
+        # Une autre adresse a sa propre fenêtre
+        self.assertEqual(throttling.throttle_submission(self.survey, ip_address='10.0.0.2', now=start + 3), 0)
+        # Période suivante : la précédente compte en proportion de son recouvrement (3 × 55/60)
+        self.assertEqual(throttling.throttle_submission(self.survey, ip_address='10.0.0.1', now=start + 65), 0)
+        self.assertGreater(throttling.throttle_submission(self.survey, ip_address='10.0.0.1', now=start + 66), 0)
+        self.assertEqual(throttling.throttle_submission(self.survey, ip_address='10.0.0.1', now=start + 90), 0)
+
+    @override_settings(SUBMISSION_RATE_LIMITS={'user': (2, 60)})
+    def test_view_rejects_submissions_over_limit(self):
+        self.client.force_login(self.user)
+        url = reverse('survey_app:take_survey', args=[self.survey.id])
+        data = submission_post_data(self.survey)
+        for _ in range(2):
+            self.client.post(url, data)
+        response = self.client.post(url, data, follow=True)
+        self.assertContains(response, 'Trop de réponses envoyées')
+        self.assertEqual(Submission.objects.filter(survey=self.survey).count(), 2)
+
+    @override_settings(SUBMISSION_RATE_LIMITS={'user': (2, 60)})
+    def test_invalid_submissions_are_not_counted(self):
+        self.client.force_login(self.user)
+        async_client = AsyncClient()
+        async_client.force_login(self.user)
+        for name in ('survey_app:take_survey', 'survey_app:take_survey_async'):
+            cache.clear()
+            url = reverse(name, args=[self.survey.id])
+            for _ in range(3):
+                # Aucune réponse : formulaire invalide, réaffiché
+                if name.endswith('_async'):
+                    response = async_to_sync(async_client.post)(url, {})
+                else:
+                    response = self.client.post(url, {})
+                self.assertEqual(response.status_code, 200)
+            data = submission_post_data(self.survey)
+            for _ in range(2):
+                self.assertEqual(self.client.post(url, data).status_code, 302)
+            response = self.client.post(url, data, follow=True)
+            self.assertContains(response, 'Trop de réponses envoyées')
+        self.assertEqual(Submission.objects.filter(survey=self.survey).count(), 4)
+
+    @override_settings(SUBMISSION_RATE_LIMITS=throttling.RATE_LIMITS)
+    def test_default_limits_accept_a_classroom_behind_one_address(self):
+        start = 1000 * 60
+        for offset in range(100):
+            student = User(pk=1000 + offset, username=f'eleve{offset}')
+            self.assertEqual(throttling.throttle_submission(
+                self.survey, student, ip_address='10.0.0.1', now=start + offset * 0.1,
+            ), 0)
+
+    @override_settings(SUBMISSION_RATE_LIMITS={'ip': (1, 60)})
+    def test_refund_restores_quota(self):
+        start = 1000 * 60
+        self.assertEqual(throttling.throttle_submission(self.survey, ip_address='10.0.0.1', now=start), 0)
+        throttling.refund_submission(self.survey, ip_address='10.0.0.1', now=start)
+        self.assertEqual(throttling.throttle_submission(self.survey, ip_address='10.0.0.1', now=start + 1), 0)
+        self.assertGreater(throttling.throttle_submission(self.survey, ip_address='10.0.0.1', now=start + 2), 0)
+
+
+class RespondentFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.survey = build_survey(self.user, 2)
+        Survey.objects.filter(pk=self.survey.pk).update(one_response_per_person=True)
+        self.survey.refresh_from_db()
+        self.url = reverse('survey_app:take_survey', args=[self.survey.id])
+
+    def test_second_response_is_refused(self):
+        self.client.force_login(self.user)
+        self.client.post(self.url, submission_post_data(self.survey))
+        self.assertEqual(Submission.objects.filter(survey=self.survey).count(), 1)
+
+        response = self.client.get(self.url, follow=True)
+        self.assertContains(response, 'Vous avez déjà répondu')
+        response = self.client.post(self.url, submission_post_data(self.survey), follow=True)
+        self.assertContains(response, 'Vous avez déjà répondu')
+        self.assertEqual(Submission.objects.filter(survey=self.survey).count(), 1)
+        self.survey.refresh_from_db()
+        self.assertEqual(self.survey.respondent_count, 1)
+
+        other = User.objects.create_user(username='other', password='secret')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_anonymous_survey_uses_ip_address(self):
+        Survey.objects.filter(pk=self.survey.pk).update(is_anonymous=True)
+        self.client.force_login(self.user)
+        self.client.post(self.url, submission_post_data(self.survey), REMOTE_ADDR='10.0.0.1')
+        self.client.post(self.url, submission_post_data(self.survey), REMOTE_ADDR='10.0.0.1')
+        self.client.post(self.url, submission_post_data(self.survey), REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(
+            sorted(Submission.objects.filter(survey=self.survey).values_list('ip_address', flat=True)),
+            ['10.0.0.1', '10.0.0.2'],
+        )
+
+    def test_filter_is_bounded_and_confirms_positives(self):
+        users = [User.objects.create_user(username=f'respondent{i}') for i in range(50)]
+        for user in users:
+            self.assertTrue(respondent_filter.claim_respondent(self.survey.pk, user.pk))
+        words = RespondentFilterWord.objects.filter(survey=self.survey)
+        self.assertLessEqual(words.count(), 50 * respondent_filter.HASH_COUNT)
+
+        # Bits présents mais aucune soumission : faux positif, la personne peut répondre
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(respondent_filter.already_answered(self.survey, users[0].pk))
+        self.assertEqual(len(queries), 2)
+        # Absent du filtre : une seule requête, pas de recherche dans Submission
+        stranger = User.objects.create_user(username='stranger')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(respondent_filter.already_answered(self.survey, stranger.pk))
+        self.assertEqual(len(queries), 1)
+
+    def test_rebuild_matches_incremental_filter(self):
+        Survey.objects.filter(pk=self.survey.pk).update(one_response_per_person=False)
+        seed_submissions(self.survey, 20, users=[
+            User.objects.create_user(username=f'respondent{i}') for i in range(20)
+        ])
+        self.assertEqual(RespondentFilterWord.objects.filter(survey=self.survey).count(), 0)
+        Survey.objects.filter(pk=self.survey.pk).update(one_response_per_person=True)
+        self.survey.refresh_from_db()
+
+        call_command('rebuild_respondent_filters', self.survey.pk, stdout=io.StringIO())
+        submission = Submission.objects.filter(survey=self.survey, user__isnull=False).first()
+        self.assertTrue(respondent_filter.already_answered(self.survey, submission.user_id))
+
+    def test_buffered_duplicates_are_dropped_at_flush(self):
+        payload = {'survey_id': self.survey.pk, 'user_id': self.user.pk, 'ip_address': '10.0.0.1'}
+        entries = [('a' * 32, payload), ('b' * 32, dict(payload))]
+        self.assertEqual([key for key, _ in ingest_buffer.drop_repeat_respondents(entries)], ['a' * 32])
+
+
+class DefinitionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('abdo', password='secret')
+        self.survey = build_survey(self.user, 4, title='Source')
+        questions = list(self.survey.questions.order_by('order'))
+        self.parent = questions[0]
+        # Valeur donnée par id de choix : exportée sous forme de texte
+        questions[3].conditional_question = self.parent
+        questions[3].conditional_value = str(self.parent.choices.get(order=1).pk)
+        questions[3].required = False
+        questions[3].save()
+        self.survey.refresh_from_db()
+
+    def structure(self, survey):
+        schema = compile_schema(survey)
+        position = {question.id: index for index, question in enumerate(schema.questions)}
+        return [
+            (
+                question.text, question.question_type, question.required,
+                [choice.text for choice in question.choices],
+                position.get(question.conditional_question_id), question.conditional_value,
+            )
+            for question in schema.questions
+        ]
+
+    def test_json_round_trip(self):
+        document = json.loads(definitions.export_definitions([self.survey]))
+        self.assertEqual(document['surveys'][0]['questions'][3]['condition'], {'question': 'q1', 'value': 'Choix 2'})
+        [copy] = definitions.import_definitions(json.dumps(document), 'json', self.user)
+        self.assertNotEqual(copy.pk, self.survey.pk)
+        expected = self.structure(self.survey)
+        expected[3] = expected[3][:5] + ('Choix 2',)
+        self.assertEqual(self.structure(copy), expected)
+
+    def test_yaml_import_command_uses_bulk_inserts(self):
+        document = {'surveys': [{
+            'title': 'Grand questionnaire',
+            'questions': [
+                {'text': f'Question {i}', 'type': 'multiple_choice', 'choices': [f'Choix {j}' for j in range(5)]}
+                for i in range(300)
+            ] + [{'text': 'Précisez', 'type': 'text', 'condition': {'question': 'q1', 'value': 'Choix 3'}}],
+        }]}
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False, encoding='utf-8') as handle:
+            handle.write(definitions.yaml.safe_dump(document, allow_unicode=True))
+        self.addCleanup(os.unlink, handle.name)
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_surveys', handle.name, creator='abdo', stdout=out)
+        self.assertIn('1 sondage(s), 301 question(s)', out.getvalue())
+        self.assertLess(len(queries), 40)
+        survey = Survey.objects.get(title='Grand questionnaire')
+        self.assertEqual(Choice.objects.filter(question__survey=survey).count(), 1500)
+        last = survey.questions.get(order=300)
+        self.assertEqual(last.conditional_question, survey.questions.get(order=0))
+
+    def test_invalid_document_creates_nothing(self):
+        document = {'title': 'Invalide', 'questions': [
+            {'text': 'A', 'type': 'single_choice', 'choices': ['Oui'], 'condition': {'question': 'b'}},
+            {'key': 'b', 'text': 'B', 'type': 'single_choice', 'choices': ['Oui'],
+             'condition': {'question': 'q1', 'value': 'Peut-être'}},
+            {'text': 'C', 'type': 'date'},
+            {'text': 'D', 'type': 'text', 'condition': {'question': 'zzz'}},
+        ]}
+        count = Survey.objects.count()
+        with self.assertRaises(definitions.DefinitionError) as caught:
+            definitions.import_definitions(json.dumps(document), 'json', self.user)
+        message = str(caught.exception)
+        self.assertIn('questions[2].type', message)
+        self.assertIn('« Peut-être » ne correspond à aucun choix', message)
+        self.assertIn('question « zzz » inconnue', message)
+        self.assertIn('boucle', message)
+        self.assertEqual(Survey.objects.count(), count)
+
+    def test_upload_and_download_views(self):
+        self.client.force_login(self.user)
+        content = definitions.export_definitions([self.survey], 'yaml').encode()
+        response = self.client.get(reverse('survey_app:definition_yaml', args=[self.survey.id]))
+        self.assertEqual(response.content, content)
+
+        upload = SimpleUploadedFile('source.yaml', content)
+        response = self.client.post(reverse('survey_app:survey_import'), {'definition': upload})
+        copy = Survey.objects.exclude(pk=self.survey.pk).get(title='Source')
+        self.assertRedirects(response, reverse('survey_app:survey_detail', args=[copy.id]))
+
+        response = self.client.post(reverse('survey_app:survey_import'), {
+            'definition': SimpleUploadedFile('bad.json', b'{"title": ""}'),
+        })
+        self.assertContains(response, 'surveys[0].title : obligatoire')
+
+        other = User.objects.create_user('other')
+        self.client.force_login(other)
+        response = self.client.get(reverse('survey_app:definition_json', args=[self.survey.id]))
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+
+    def test_yaml_download_without_pyyaml(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(definitions, 'yaml', None):
+            response = self.client.get(reverse('survey_app:definition_yaml', args=[self.survey.id]), follow=True)
+        self.assertRedirects(response, reverse('survey_app:survey_detail', args=[self.survey.id]))
+        self.assertContains(response, 'PyYAML')
+
+
+class TemplateCloneTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('abdo', password='secret')
+        self.template = build_survey(self.user, 6, title='Évaluation du cours')
+        questions = list(self.template.questions.order_by('order'))
+        self.parent = questions[0]
+        questions[5].conditional_question = self.parent
+        questions[5].conditional_value = str(self.parent.choices.get(order=2).pk)
+        questions[5].save()
+        Survey.objects.filter(pk=self.template.pk).update(template=True, one_response_per_person=True)
+        self.template.refresh_from_db()
+
+    def test_clone_remaps_questions_choices_and_conditions(self):
+        [copy] = definitions.clone_template(self.template, self.user, ['Classe A'])
+        self.assertFalse(copy.template)
+        self.assertTrue(copy.one_response_per_person)
+        source = compile_schema(self.template)
+        cloned = compile_schema(copy)
+        self.assertEqual(
+            [(q.text, q.question_type, [c.text for c in q.choices]) for q in cloned.questions],
+            [(q.text, q.question_type, [c.text for c in q.choices]) for q in source.questions],
+        )
+        self.assertFalse({c.pk for q in cloned.questions for c in q.choices} & {c.pk for q in source.questions for c in q.choices})
+        conditional = cloned.questions[5]
+        self.assertEqual(conditional.conditional_question_id, cloned.questions[0].id)
+        # L'id de choix du modèle est remplacé par le texte du choix
+        self.assertEqual(conditional.conditional_value, 'Choix 3')
+
+    def test_clone_uses_bulk_inserts(self):
+        definitions.clone_template(self.template, self.user, ['Échauffement'])
+        with CaptureQueriesContext(connection) as one:
+            definitions.clone_template(self.template, self.user, ['Classe A'])
+        with CaptureQueriesContext(connection) as many:
+            definitions.clone_template(self.template, self.user, [f'Classe {i}' for i in range(100)])
+        # Requêtes par lots : seul le découpage des INSERT (limite de paramètres SQLite) varie
+        self.assertLess(len(many), 3 * len(one))
+        self.assertEqual(Survey.objects.filter(title__startswith='Classe ').count(), 101)
+        self.assertEqual(Question.objects.filter(survey__title='Classe 99').count(), 6)
+
+    def test_template_definition_is_cached_until_template_changes(self):
+        first = definitions.template_definition(self.template)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(definitions.template_definition(self.template), first)
+        self.assertEqual(len(queries), 0)
+        Question.objects.create(survey=self.template, text='Nouvelle', question_type='text', order=10)
+        self.template.refresh_from_db()
+        self.assertEqual(len(definitions.template_definition(self.template).questions), 7)
+
+    def test_create_from_template_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('survey_app:survey_create'))
+        self.assertContains(response, reverse('survey_app:survey_from_template', args=[self.template.id]))
+
+        url = reverse('survey_app:survey_from_template', args=[self.template.id])
+        response = self.client.post(url, {'titles': 'Classe A\nClasse B\n\n'})
+        self.assertRedirects(response, reverse('survey_app:home'), fetch_redirect_response=False)
+        self.assertEqual(Survey.objects.filter(title__in=['Classe A', 'Classe B'], template=False).count(), 2)
+
+        regular = build_survey(self.user, 1)
+        response = self.client.get(reverse('survey_app:survey_from_template', args=[regular.id]), follow=True)
+        self.assertContains(response, 'n&#x27;est pas un modèle')
 
-# Create your tests here.
@@ -0,0 +1,108 @@
+"""
+Limitation du débit des soumissions (``TakeSurveyView.post``).
+
+Fenêtres glissantes par adresse IP, par utilisateur et, sur option, par
+sondage (``SUBMISSION_RATE_LIMITS``), tenues dans le cache : chaque fenêtre est
+approchée par deux compteurs de période fixe, la période courante et la
+précédente pondérée par sa part encore dans la fenêtre. Une vérification
+coûte un ``get_many`` et une incrémentation par portée, quel que soit le
+trafic : aucune lecture de la base, aucun historique par requête.
+
+Les soumissions refusées ne sont pas comptées : un client bloqué retrouve
+son débit dès que sa fenêtre se vide. Une soumission est comptée avant sa
+validation, pour que la limite protège aussi ce travail, puis décomptée
+(``refund_submission``) si elle n'est finalement pas enregistrée (formulaire
+invalide, sondage complet, personne ayant déjà répondu).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Portée : (soumissions autorisées, fenêtre en secondes). La portée 'survey' n'est pas
+# active par défaut : elle plafonnerait un sondage quel que soit le nombre de répondants
+RATE_LIMITS = {
+    'ip': (120, 60),
+    'user': (20, 60),
+}
+
+
+def rate_limits():
+    return getattr(settings, 'SUBMISSION_RATE_LIMITS', RATE_LIMITS)
+
+
+def bucket_key(scope, identity, window, bucket):
+    return f'throttle:{scope}:{window}:{identity}:{bucket}'
+
+
+def estimate(current, previous, elapsed, window):
+    """Soumissions dans la fenêtre glissante, à partir des deux compteurs de période"""
+    return current + previous * (window - elapsed) / window
+
+
+def scope_checks(survey, user, ip_address, now):
+    """``(limite, fenêtre, écoulé, clé courante, clé précédente)`` de chaque portée applicable"""
+    identities = {
+        'ip': ip_address,
+        'user': user.pk if user is not None and user.is_authenticated else None,
+        'survey': survey.pk,
+    }
+    checks = []
+    for scope, (limit, window) in rate_limits().items():
+        identity = identities.get(scope)
+        if identity is None:
+            continue
+        bucket = int(now // window)
+        checks.append((
+            limit, window, now - bucket * window,
+            bucket_key(scope, identity, window, bucket),
+            bucket_key(scope, identity, window, bucket - 1),
+        ))
+    return checks
+
+
+def throttle_submission(survey, user=None, ip_address=None, now=None):
+    """
+    Compte une soumission dans chaque portée si aucune limite n'est atteinte.
+
+    Retourne 0 si la soumission est acceptée, sinon le nombre de secondes à
+    attendre avant de réessayer.
+    """
+    now = time.time() if now is None else now
+    checks = scope_checks(survey, user, ip_address, now)
+    if not checks:
+        return 0
+
+    counts = cache.get_many([key for check in checks for key in check[3:]])
+    retry_after = 0
+    for limit, window, elapsed, current, previous in checks:
+        if estimate(counts.get(current, 0), counts.get(previous, 0), elapsed, window) >= limit:
+            # Au plus tard à la fin de la période courante, la période précédente ne compte plus
+            retry_after = max(retry_after, int(window - elapsed) + 1)
+    if retry_after:
+        return retry_after
+
+    for limit, window, elapsed, current, previous in checks:
+        # Les compteurs vivent deux périodes : la courante puis comme « précédente »
+        if not cache.add(current, 1, 2 * window):
+            try:
+                cache.incr(current)
+            except ValueError:
+                # Entrée expirée entre add() et incr()
+                cache.set(current, 1, 2 * window)
+    return 0
+
+
+def refund_submission(survey, user=None, ip_address=None, now=None):
+    """
+    Retire une soumission comptée par ``throttle_submission`` mais non
+    enregistrée. ``now`` doit être celui du décompte : c'est le compteur de
+    cette période qui est décrémenté.
+    """
+    now = time.time() if now is None else now
+    for limit, window, elapsed, current, previous in scope_checks(survey, user, ip_address, now):
+        try:
+            cache.decr(current)
+        except ValueError:
+            # Compteur expiré entre-temps : plus rien à retirer
+            pass
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 app_name = 'survey_app'
 
@@ -8,9 +8,25 @@ urlpatterns = [
     path('register/', views.RegisterView.as_view(), name='register'),
     path('profile/', views.ProfileView.as_view(), name='profile'),
     path('create/', views.SurveyCreateView.as_view(), name='survey_create'),
+    path('import/', views.SurveyImportView.as_view(), name='survey_import'),
     path('<int:survey_id>/', views.SurveyDetailView.as_view(), name='survey_detail'),
     path('<int:survey_id>/take/', views.TakeSurveyView.as_view(), name='take_survey'),
     path('<int:survey_id>/results/', views.SurveyResultsView.as_view(), name='survey_results'),
+    path('<int:survey_id>/results/query/', views.SurveyResultsQueryView.as_view(), name='survey_results_query'),
+    path('<int:survey_id>/results/<int:question_id>/', views.QuestionResponsesView.as_view(), name='question_responses'),
+    path('<int:survey_id>/notifications/', views.SurveyNotificationView.as_view(), name='survey_notifications'),
+    path('<int:survey_id>/use-template/', views.SurveyFromTemplateView.as_view(), name='survey_from_template'),
+    path('<int:survey_id>/share/', views.SurveyShareCreateView.as_view(), name='survey_share'),
     path('<int:survey_id>/add-question/', views.AddQuestionView.as_view(), name='add_question'),
     path('<int:survey_id>/export/', views.ExportResultsView.as_view(), name='export_results'),
+    path('exports/<int:job_id>/', views.ExportStatusView.as_view(), name='export_status'),
+    path('exports/<int:job_id>/download/', views.ExportDownloadView.as_view(), name='export_download'),
+    path('<int:survey_id>/export.csv', views.StreamExportView.as_view(), {'fmt': 'csv'}, name='export_csv'),
+    path('<int:survey_id>/export.ndjson', views.StreamExportView.as_view(), {'fmt': 'ndjson'}, name='export_ndjson'),
+    path('<int:survey_id>/definition.json', views.SurveyDefinitionView.as_view(), {'fmt': 'json'}, name='definition_json'),
+    path('<int:survey_id>/definition.yaml', views.SurveyDefinitionView.as_view(), {'fmt': 'yaml'}, name='definition_yaml'),
+    # Variantes asynchrones (ASGI) des vues les plus sollicitées
+    path('async/<int:survey_id>/take/', async_views.take_survey, name='take_survey_async'),
+    path('async/<int:survey_id>/results/', async_views.survey_results, name='survey_results_async'),
+    path('async/<int:survey_id>/export/', async_views.export_results, name='export_results_async'),
 ]
\ No newline at end of file
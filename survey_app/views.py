@@ -1,36 +1,57 @@
+import time
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.views import View
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse, Http404
 from django.utils import timezone
 from django.db.models import Count
-import csv
-import json
-from datetime import datetime
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from io import BytesIO
-from .models import Survey, Question, Choice, Response, UserProfile, SurveyShare, SurveyNotification
+from django.core.handlers.asgi import ASGIRequest
+from datetime import datetime, timedelta
+from .models import Survey, Question, Choice, UserProfile, SurveyShare, SurveyNotification, ExportJob
 from .forms import (
-    UserRegistrationForm, UserProfileForm, SurveyForm, QuestionForm,
-    ChoiceForm, ResponseForm
+    UserRegistrationForm, UserProfileForm, SurveyForm, SurveyImportForm, TemplateCloneForm, QuestionForm,
+    ChoiceForm,
+)
+from .definitions import CONTENT_TYPES, DefinitionError, clone_template, create_surveys, export_definitions, templates_for
+from .submission import (
+    survey_questions, build_response_forms, submit_survey, started_token, submission_key,
+    SurveyLimitReached, AlreadyAnswered,
 )
+from .respondent_filter import already_answered
+from .throttling import refund_submission, throttle_submission
+from .results import survey_dashboard, build_dashboard, response_page
+from .segments import parse_segment, parse_pivot, segment_results, SegmentError, PIVOT_TYPES
+from .exports import STREAM_FORMATS, aiter_rows
+from .jobs import request_export, job_file
+from .pagination import keyset_page, listing_payload
+from .page_cache import cached_page, listing_version, survey_page_version
+from .share_links import can_access, create_share, remember_share, resolve_share
+from .notifications import subscribe, unsubscribe
+
+LISTING_FIELDS = ('id', 'title', 'description', 'created_at', 'respondent_count')
 
 def home(request):
-    surveys = Survey.objects.filter(is_public=True)
-    if request.user.is_authenticated:
-        user_surveys = Survey.objects.filter(creator=request.user)
+    cursor = request.GET.get('after')
+    as_json = request.GET.get('format') == 'json'
+
+    def render_page():
+        # Le nombre de réponses est une colonne de Survey : aucune requête par sondage
+        public_surveys = Survey.objects.filter(is_public=True).only(*LISTING_FIELDS)
+        surveys, next_cursor = keyset_page(public_surveys, cursor)
+        if as_json:
+            return JsonResponse(listing_payload(surveys, next_cursor))
         return render(request, 'survey_app/home.html', {
             'surveys': surveys,
-            'user_surveys': user_surveys
+            'next_cursor': next_cursor,
+            'is_first_page': not cursor,
         })
-    return render(request, 'survey_app/home.html', {'surveys': surveys})
+
+    return cached_page(request, 'home', listing_version, render_page, vary=(cursor or '', as_json))
 
 class RegisterView(View):
     def get(self, request):
@@ -49,12 +70,18 @@ class RegisterView(View):
 @method_decorator(login_required, name='dispatch')
 class ProfileView(View):
     def get(self, request):
+        user_surveys = Survey.objects.filter(creator=request.user).only(*LISTING_FIELDS)
+        surveys, next_cursor = keyset_page(user_surveys, request.GET.get('after'))
+        if request.GET.get('format') == 'json':
+            return JsonResponse(listing_payload(surveys, next_cursor))
+
         profile = request.user.userprofile
         form = UserProfileForm(instance=profile)
-        surveys = Survey.objects.filter(creator=request.user)
         return render(request, 'survey_app/profile.html', {
             'form': form,
-            'surveys': surveys
+            'surveys': surveys,
+            'next_cursor': next_cursor,
+            'is_first_page': not request.GET.get('after'),
         })
 
     def post(self, request):
@@ -75,7 +102,10 @@ class SurveyCreateView(View):
             return redirect('survey_app:home')
 
         form = SurveyForm()
-        return render(request, 'survey_app/survey_create.html', {'form': form})
+        return render(request, 'survey_app/survey_create.html', {
+            'form': form,
+            'templates': templates_for(request.user),
+        })
 
     def post(self, request):
         # Check if the user is 'abdo'
@@ -90,20 +120,165 @@ class SurveyCreateView(View):
             survey.save()
             messages.success(request, 'Sondage créé avec succès!')
             return redirect('survey_app:survey_detail', survey_id=survey.id)
-        return render(request, 'survey_app/survey_create.html', {'form': form})
+        return render(request, 'survey_app/survey_create.html', {
+            'form': form,
+            'templates': templates_for(request.user),
+        })
+
+@method_decorator(login_required, name='dispatch')
+class SurveyFromTemplateView(View):
+    """Crée un ou plusieurs sondages à partir d'un sondage modèle (``Survey.template``)"""
+    def template_or_error(self, request, survey_id):
+        if request.user.username != 'abdo':
+            messages.error(request, 'Seul l\'utilisateur abdo est autorisé à créer des sondages.')
+            return None
+        survey = get_object_or_404(Survey, pk=survey_id)
+        if not survey.template:
+            messages.error(request, 'Ce sondage n\'est pas un modèle.')
+            return None
+        if not survey.is_public and request.user != survey.creator:
+            messages.error(request, 'Vous n\'avez pas accès à ce sondage.')
+            return None
+        return survey
+
+    def get(self, request, survey_id):
+        survey = self.template_or_error(request, survey_id)
+        if survey is None:
+            return redirect('survey_app:home')
+
+        form = TemplateCloneForm(initial={'titles': survey.title})
+        return render(request, 'survey_app/survey_from_template.html', {
+            'form': form,
+            'survey': survey,
+            'questions': survey_questions(survey),
+        })
+
+    def post(self, request, survey_id):
+        survey = self.template_or_error(request, survey_id)
+        if survey is None:
+            return redirect('survey_app:home')
+
+        form = TemplateCloneForm(request.POST)
+        if form.is_valid():
+            surveys = clone_template(survey, request.user, form.cleaned_data['titles'])
+            messages.success(request, f'{len(surveys)} sondage(s) créé(s) à partir du modèle!')
+            if len(surveys) == 1:
+                return redirect('survey_app:survey_detail', survey_id=surveys[0].id)
+            return redirect('survey_app:home')
+        return render(request, 'survey_app/survey_from_template.html', {
+            'form': form,
+            'survey': survey,
+            'questions': survey_questions(survey),
+        })
+
+@method_decorator(login_required, name='dispatch')
+class SurveyImportView(View):
+    """Crée des sondages depuis un fichier de définition JSON ou YAML (voir ``definitions``)"""
+    def get(self, request):
+        if request.user.username != 'abdo':
+            messages.error(request, 'Seul l\'utilisateur abdo est autorisé à créer des sondages.')
+            return redirect('survey_app:home')
+
+        return render(request, 'survey_app/survey_import.html', {'form': SurveyImportForm()})
+
+    def post(self, request):
+        if request.user.username != 'abdo':
+            messages.error(request, 'Seul l\'utilisateur abdo est autorisé à créer des sondages.')
+            return redirect('survey_app:home')
+
+        form = SurveyImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            surveys = create_surveys(form.definitions, request.user)
+            messages.success(request, f'{len(surveys)} sondage(s) importé(s) avec succès!')
+            if len(surveys) == 1:
+                return redirect('survey_app:survey_detail', survey_id=surveys[0].id)
+            return redirect('survey_app:home')
+        return render(request, 'survey_app/survey_import.html', {'form': form})
+
+class SurveyDefinitionView(View):
+    """Définition du sondage (questions, choix, conditions) à réimporter, en JSON ou YAML"""
+    def get(self, request, survey_id, fmt):
+        survey = get_object_or_404(Survey, pk=survey_id)
+        if request.user != survey.creator:
+            messages.error(request, 'Vous n\'avez pas accès à ce sondage.')
+            return redirect('home')
+
+        try:
+            document = export_definitions([survey], fmt)
+        except DefinitionError as exc:
+            # Format indisponible (PyYAML absent)
+            messages.error(request, str(exc))
+            return redirect('survey_app:survey_detail', survey_id=survey.id)
+        response = HttpResponse(document, content_type=CONTENT_TYPES[fmt] + '; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{survey.title}.{fmt}"'
+        return response
 
 class SurveyDetailView(View):
     def get(self, request, survey_id):
         survey = get_object_or_404(Survey, pk=survey_id)
-        if not survey.is_public and request.user != survey.creator:
+        if not can_access(request, survey):
             messages.error(request, 'Vous n\'avez pas accès à ce sondage.')
             return redirect('home')
         
-        questions = Question.objects.filter(survey=survey)
-        return render(request, 'survey_app/survey_detail.html', {
-            'survey': survey,
-            'questions': questions
-        })
+        def render_page():
+            context = {'survey': survey, 'questions': survey_questions(survey)}
+            if request.user.is_authenticated and request.user.pk == survey.creator_id:
+                context['notifications_active'] = SurveyNotification.objects.filter(
+                    survey=survey, user=request.user, is_active=True,
+                ).exists()
+            return render(request, 'survey_app/survey_detail.html', context)
+
+        return cached_page(
+            request, f'survey:{survey.id}', survey_page_version(survey), render_page,
+            last_modified=survey.updated_at,
+        )
+
+def share_link(request, token):
+    """Point d'entrée des liens de partage : ouvre l'accès au sondage (même privé) et y redirige"""
+    survey_id = resolve_share(token)
+    if survey_id is None:
+        raise Http404('Lien de partage invalide ou expiré')
+    remember_share(request.session, survey_id, token)
+    return redirect('survey_app:survey_detail', survey_id=survey_id)
+
+@method_decorator(login_required, name='dispatch')
+class SurveyShareCreateView(View):
+    """Crée un lien de partage, éventuellement limité à ``days`` jours"""
+    def post(self, request, survey_id):
+        survey = get_object_or_404(Survey, pk=survey_id)
+        if request.user != survey.creator:
+            messages.error(request, 'Vous n\'avez pas accès à ce sondage.')
+            return redirect('home')
+
+        try:
+            days = int(request.POST.get('days') or 0)
+        except ValueError:
+            days = 0
+        expires_at = timezone.now() + timedelta(days=days) if days > 0 else None
+        share = create_share(survey, expires_at)
+        url = request.build_absolute_uri(reverse('share_link', args=[share.share_token]))
+        messages.success(request, f'Lien de partage créé : {url}')
+        return redirect('survey_app:survey_detail', survey_id=survey.id)
+
+@method_decorator(login_required, name='dispatch')
+class SurveyNotificationView(View):
+    """Active ou désactive les résumés par e-mail des nouvelles réponses"""
+    def post(self, request, survey_id):
+        survey = get_object_or_404(Survey, pk=survey_id)
+        if request.user != survey.creator:
+            messages.error(request, 'Vous n\'avez pas accès à ce sondage.')
+            return redirect('home')
+
+        if request.POST.get('active') == '1':
+            subscribe(survey, request.user)
+            if request.user.email:
+                messages.success(request, f'Les nouvelles réponses vous seront résumées à {request.user.email}.')
+            else:
+                messages.warning(request, 'Ajoutez une adresse e-mail à votre profil pour recevoir les résumés.')
+        else:
+            unsubscribe(survey, request.user)
+            messages.success(request, 'Résumés par e-mail désactivés.')
+        return redirect('survey_app:survey_detail', survey_id=survey.id)
 
 @method_decorator(login_required, name='dispatch')
 class AddQuestionView(View):
@@ -119,8 +294,8 @@ class AddQuestionView(View):
              messages.error(request, 'Vous n\'avez pas la permission d\'ajouter des questions à ce sondage.')
              return redirect('survey_app:home')
 
-        form = QuestionForm()
-        questions = Question.objects.filter(survey=survey)
+        form = QuestionForm(survey=survey)
+        questions = Question.objects.filter(survey=survey).prefetch_related('choices')
         return render(request, 'survey_app/add_question.html', {
             'form': form,
             'survey': survey,
@@ -139,7 +314,7 @@ class AddQuestionView(View):
              messages.error(request, 'Vous n\'avez pas la permission d\'ajouter des questions à ce sondage.')
              return redirect('survey_app:home')
 
-        form = QuestionForm(request.POST)
+        form = QuestionForm(request.POST, survey=survey)
         if form.is_valid():
             question = form.save(commit=False)
             question.survey = survey
@@ -158,7 +333,7 @@ class AddQuestionView(View):
             messages.success(request, 'Question ajoutée avec succès!')
             return redirect('survey_app:survey_detail', survey_id=survey.id)
 
-        questions = Question.objects.filter(survey=survey)
+        questions = Question.objects.filter(survey=survey).prefetch_related('choices')
         return render(request, 'survey_app/add_question.html', {
             'form': form,
             'survey': survey,
@@ -169,7 +344,7 @@ class AddQuestionView(View):
 class TakeSurveyView(View):
     def get(self, request, survey_id):
         survey = get_object_or_404(Survey, pk=survey_id)
-        if not survey.is_public and request.user != survey.creator:
+        if not can_access(request, survey):
             messages.error(request, 'Vous n\'avez pas accès à ce sondage.')
             return redirect('home')
         
@@ -177,116 +352,69 @@ class TakeSurveyView(View):
             messages.error(request, 'Ce sondage est terminé.')
             return redirect('home')
         
-        if survey.max_responses > 0:
-            response_count = Response.objects.filter(survey=survey).count()
-            if response_count >= survey.max_responses:
-                messages.error(request, 'Ce sondage a atteint sa limite de réponses.')
-                return redirect('home')
+        if survey.is_full():
+            messages.error(request, 'Ce sondage a atteint sa limite de réponses.')
+            return redirect('home')
+
+        respondent = request.user if not survey.is_anonymous else None
+        if already_answered(survey, respondent.pk if respondent else None, request.META.get('REMOTE_ADDR')):
+            messages.error(request, 'Vous avez déjà répondu à ce sondage.')
+            return redirect('home')
         
-        questions = Question.objects.filter(survey=survey)
-        question_forms = [(question, ResponseForm(question=question)) for question in questions]
+        questions = survey_questions(survey)
+        question_forms = build_response_forms(questions)
         return render(request, 'survey_app/take_survey.html', {
             'survey': survey,
-            'question_forms': question_forms
+            'question_forms': question_forms,
+            'started_token': started_token(),
+            'submission_key': submission_key(),
         })
 
     def post(self, request, survey_id):
-        print("Debug: request.POST data:", request.POST) # Debug print for POST data
         survey = get_object_or_404(Survey, pk=survey_id)
-        if not survey.is_public and request.user != survey.creator:
+        if not can_access(request, survey):
             messages.error(request, 'Vous n\'avez pas accès à ce sondage.')
             return redirect('home')
-        
-        questions = Question.objects.filter(survey=survey)
-        forms = []
-        all_valid = True
-
-        for question in questions:
-            form = ResponseForm(request.POST, question=question, prefix=str(question.id))
 
-            # Debug: Print raw POST data for choice_response for this specific question before workaround
-            if question.question_type in ['single_choice', 'multiple_choice']:
-                field_name_prefixed = f"{question.id}-choice_response"
-                print(f"Debug: Raw POST data for {field_name_prefixed} BEFORE workaround: {request.POST.getlist(field_name_prefixed)}")
+        if survey.is_full():
+            messages.error(request, 'Ce sondage a atteint sa limite de réponses.')
+            return redirect('home')
 
-            # --- Start of Debugging/Workaround Block ---
-            # Check if choice_response data is missing from the prefixed name but present without prefix
-            field_name_unprefixed = "choice_response"
+        throttled_at = time.time()
+        retry_after = throttle_submission(survey, request.user, request.META.get('REMOTE_ADDR'), now=throttled_at)
+        if retry_after:
+            messages.error(request, f'Trop de réponses envoyées. Réessayez dans {retry_after} secondes.')
+            return redirect('home')
 
-            if question.question_type in ['single_choice', 'multiple_choice']:
-                if not request.POST.getlist(field_name_prefixed) and request.POST.getlist(field_name_unprefixed):
-                    # If data is found without prefix, manually add it to the form's data dictionary
-                    # before is_valid() is called. We need a mutable copy of request.POST.
-                    if not hasattr(request.POST, '_mutable') or not request.POST._mutable:
-                         request.POST._mutable = True
-
-                    request.POST.setlist(field_name_prefixed, request.POST.getlist(field_name_unprefixed))
-                    print(f"Debug: Assigned unprefixed {field_name_unprefixed} data to prefixed {field_name_prefixed}")
-                    # Optionally remove the unprefixed data to avoid confusion, though not strictly necessary for form validation
-                    # del request.POST[field_name_unprefixed]
-
-            # --- End of Debugging/Workaround Block ---
-
-            # Debug: Print form data and bound status before is_valid()
-            print(f"Debug: Form for question {question.id} is bound: {form.is_bound}")
-            print(f"Debug: Form data for question {question.id}: {form.data}")
-            if question.question_type in ['single_choice', 'multiple_choice']:
-                 field_name_in_form_data = f"{question.id}-choice_response"
-                 print(f"Debug: Data in form.data for {field_name_in_form_data}: {form.data.getlist(field_name_in_form_data)}")
-
-            if form.is_valid():
-                response = form.save(commit=False)
-                response.survey = survey
-                response.question = question
-                if not survey.is_anonymous and request.user.is_authenticated:
-                    response.user = request.user
-                response.ip_address = request.META.get('REMOTE_ADDR')
-                response.save() # Save the response object to get an ID
-
-                # Sauvegarder les choix pour les questions à choix multiples/unique
-                if question.question_type in ['single_choice', 'multiple_choice']:
-                    choices = form.cleaned_data.get('choice_response')
-                    # Debug prints
-                    field_name_prefixed = f"{question.id}-choice_response"
-                    print(f"Debug: Raw POST data for {field_name_prefixed} BEFORE workaround: {request.POST.getlist(field_name_prefixed)}")
-                    field_name_unprefixed = "choice_response"
-                    if not request.POST.getlist(field_name_prefixed) and request.POST.getlist(field_name_unprefixed):
-                         if not hasattr(request.POST, '_mutable') or not request.POST._mutable:
-                              request.POST._mutable = True
-                         request.POST.setlist(field_name_prefixed, request.POST.getlist(field_name_unprefixed))
-                         print(f"Debug: Assigned unprefixed {field_name_unprefixed} data to prefixed {field_name_prefixed}")
-                    # Debug prints
-                    print(f"Debug: Form for question {question.id} is bound: {form.is_bound}")
-                    print(f"Debug: Form data for question {question.id}: {form.data}")
-                    if question.question_type in ['single_choice', 'multiple_choice']:
-                         field_name_in_form_data = f"{question.id}-choice_response"
-                         print(f"Debug: Data in form.data for {field_name_in_form_data}: {form.data.getlist(field_name_in_form_data)}")
-
-                    if choices:
-                        if isinstance(choices, list):
-                            response.choice_response.set(choices)
-                        else:
-                            # Even for single choice from ModelChoiceField, set expects iterable
-                            response.choice_response.set([choices])
-
-                # Debug print after setting ManyToManyField
-                if question.question_type in ['single_choice', 'multiple_choice']:
-                     print(f"Debug: response.choice_response.all() after setting ManyToMany: {list(response.choice_response.all())}")
+        questions = survey_questions(survey)
+        user = request.user if not survey.is_anonymous and request.user.is_authenticated else None
+        submission = None
+        try:
+            question_forms, submission = submit_survey(
+                survey, questions, request.POST,
+                user=user,
+                ip_address=request.META.get('REMOTE_ADDR'),
+            )
+        except SurveyLimitReached:
+            messages.error(request, 'Ce sondage a atteint sa limite de réponses.')
+            return redirect('home')
+        except AlreadyAnswered:
+            messages.error(request, 'Vous avez déjà répondu à ce sondage.')
+            return redirect('home')
+        finally:
+            # Seules les soumissions enregistrées comptent dans les limites de débit
+            if submission is None:
+                refund_submission(survey, request.user, request.META.get('REMOTE_ADDR'), now=throttled_at)
 
-            else:
-                all_valid = False
-                forms.append(form)
-                # Debug: Print form errors
-                print(f"Debug: Form errors for question {question.id}: {form.errors}")
-        
-        if all_valid:
+        if submission is not None:
             messages.success(request, 'Merci pour votre réponse!')
             return redirect('survey_app:survey_results', survey_id=survey.id)
-        
-        question_forms = [(question, form) for question, form in zip(questions, forms)]
+
         return render(request, 'survey_app/take_survey.html', {
             'survey': survey,
-            'question_forms': question_forms
+            'question_forms': question_forms,
+            'started_token': request.POST.get('started', ''),
+            'submission_key': request.POST.get('submission_key', ''),
         })
 
 class SurveyResultsView(View):
@@ -296,104 +424,201 @@ class SurveyResultsView(View):
             messages.error(request, 'Vous n\'avez pas accès aux résultats de ce sondage.')
             return redirect('home')
 
-        questions = Question.objects.filter(survey=survey)
-        responses_by_question = {}
+        questions = survey_questions(survey)
+        context = {
+            'survey': survey,
+            'filter_questions': [question for question in questions if question.question_type in PIVOT_TYPES],
+            'filters': request.GET,
+            'choice_filters': choice_filter_options(questions, request.GET.getlist('choice')),
+        }
+        try:
+            segment = parse_segment(request.GET, questions)
+            pivot = parse_pivot(request.GET, questions)
+        except SegmentError as exc:
+            messages.error(request, str(exc))
+            segment, pivot = None, None
+
+        if segment or pivot:
+            results = segment_results(survey, questions, segment, pivot)
+            context.update({
+                'dashboard': build_dashboard(
+                    questions, results['tallies'], results['text_counts'], results['cooccurrence'],
+                ),
+                'segment_respondents': results['respondents'],
+                'crosstab': results['crosstab'],
+            })
+            if results['crosstab']:
+                crosstab = results['crosstab']
+                context['crosstab_rows'] = zip(crosstab['rows']['labels'], crosstab['counts'], crosstab['row_totals'])
+        else:
+            context['dashboard'] = survey_dashboard(survey, questions)
+        return render(request, 'survey_app/survey_results.html', context)
+
+def choice_filter_options(questions, selected):
+    """Options du filtre par choix : ``[(question, [(valeur, libellé, sélectionné)])]``"""
+    return [
+        (question, [
+            (f'{question.id}:{choice.pk}', choice.text, f'{question.id}:{choice.pk}' in selected)
+            for choice in question.choices.all()
+        ])
+        for question in questions
+        if question.question_type in ('single_choice', 'multiple_choice')
+    ]
 
+@method_decorator(login_required, name='dispatch')
+class SurveyResultsQueryView(View):
+    """
+    Résultats d'un segment en JSON : comptages par question et tableau croisé
+    (paramètres décrits dans ``segments``).
+    """
+    def get(self, request, survey_id):
+        survey = get_object_or_404(Survey, pk=survey_id)
+        if request.user != survey.creator:
+            return JsonResponse({'error': 'Vous n\'avez pas accès aux résultats de ce sondage.'}, status=403)
+
+        questions = survey_questions(survey)
+        try:
+            segment = parse_segment(request.GET, questions)
+            pivot = parse_pivot(request.GET, questions)
+        except SegmentError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+
+        results = segment_results(survey, questions, segment, pivot)
+        empty = {'responses': 0, 'choices': {}, 'scale': {}}
+        payload_questions = []
         for question in questions:
-            # Fetch all responses for the current question
-            responses_by_question[question] = Response.objects.filter(question=question).select_related('user').prefetch_related('choice_response')
+            tally = results['tallies'].get(question.id, empty)
+            entry = {
+                'id': question.id,
+                'text': question.text,
+                'type': question.question_type,
+                'responses': tally['responses'],
+            }
+            if question.question_type in ('single_choice', 'multiple_choice'):
+                entry['choices'] = [
+                    {'id': choice.pk, 'text': choice.text, 'count': tally['choices'].get(choice.pk, 0)}
+                    for choice in question.choices.all()
+                ]
+            elif question.question_type == 'scale':
+                entry['scale'] = {str(value): count for value, count in sorted(tally['scale'].items())}
+            else:
+                entry['text_count'] = results['text_counts'].get(question.id, 0)
+            if question.id in results['cooccurrence']:
+                entry['cooccurrence'] = results['cooccurrence'][question.id]
+            payload_questions.append(entry)
+        return JsonResponse({
+            'survey': survey.id,
+            'segment': segment.canonical(),
+            'respondents': results['respondents'],
+            'questions': payload_questions,
+            'crosstab': results['crosstab'],
+        })
 
-        return render(request, 'survey_app/survey_results.html', {
+class QuestionResponsesView(View):
+    """Réponses brutes d'une question, paginées par clé (``?before=<id>``)"""
+    def get(self, request, survey_id, question_id):
+        survey = get_object_or_404(Survey, pk=survey_id)
+        if request.user != survey.creator:
+            messages.error(request, 'Vous n\'avez pas accès aux résultats de ce sondage.')
+            return redirect('home')
+
+        question = get_object_or_404(Question, pk=question_id, survey=survey)
+        try:
+            before = int(request.GET['before']) if 'before' in request.GET else None
+        except ValueError:
+            before = None
+        responses, next_cursor = response_page(question, before=before)
+        return render(request, 'survey_app/question_responses.html', {
             'survey': survey,
-            'questions': questions,
-            'responses_by_question': responses_by_question,
+            'question': question,
+            'responses': responses,
+            'next_cursor': next_cursor,
+            'is_first_page': before is None,
         })
 
+@method_decorator(login_required, name='dispatch')
+class StreamExportView(View):
+    """Export CSV/NDJSON en flux, une ligne par réponse (défaut) ou par soumission (``?per=submission``)"""
+    def get(self, request, survey_id, fmt):
+        survey = get_object_or_404(Survey, pk=survey_id)
+        if request.user != survey.creator:
+            messages.error(request, 'Vous n\'avez pas accès aux résultats de ce sondage.')
+            return redirect('home')
+
+        content_type, generators = STREAM_FORMATS[fmt]
+        per = request.GET.get('per', 'answer')
+        if per not in generators:
+            raise Http404('Granularité d\'export inconnue')
+
+        questions = survey_questions(survey)
+        rows = generators[per](survey, questions)
+        if isinstance(request, ASGIRequest):
+            # Un générateur synchrone serait lu en entier avant l'envoi (voir exports)
+            rows = aiter_rows(rows)
+        response = StreamingHttpResponse(rows, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{survey.title}_results.{fmt}"'
+        return response
+
 @method_decorator(login_required, name='dispatch')
 class ExportResultsView(View):
+    """Demande un export PDF : servi depuis le cache disque s'il existe, sinon mis en file d'attente"""
     def get(self, request, survey_id):
         survey = get_object_or_404(Survey, pk=survey_id)
         if request.user != survey.creator:
             messages.error(request, 'Vous n\'avez pas accès aux résultats de ce sondage.')
             return redirect('home')
 
-        # Créer un buffer pour le PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        # Titre du sondage
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30
-        )
-        elements.append(Paragraph(survey.title, title_style))
-        elements.append(Spacer(1, 20))
+        job = request_export(survey, request.user)
+        if request.accepts('application/json') and not request.accepts('text/html'):
+            return JsonResponse(export_job_payload(job), status=200 if job.status == ExportJob.STATUS_DONE else 202)
+        if job_file(job):
+            return redirect('survey_app:export_download', job_id=job.id)
+        return redirect('survey_app:export_status', job_id=job.id)
+
+def export_job_payload(job):
+    return {
+        'id': job.id,
+        'survey': job.survey_id,
+        'status': job.status,
+        'error': job.error or None,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'download_url': reverse('survey_app:export_download', args=[job.id]) if job.status == ExportJob.STATUS_DONE else None,
+    }
 
-        # Pour chaque question
-        questions = Question.objects.filter(survey=survey)
-        for question in questions:
-            # Titre de la question
-            elements.append(Paragraph(question.text, styles['Heading2']))
-            elements.append(Spacer(1, 10))
-
-            # Tableau des réponses
-            responses = Response.objects.filter(question=question)
-            data = [['Réponse', 'Date', 'Utilisateur']]  # En-tête du tableau
-
-            for resp in responses:
-                if question.question_type in ['single_choice', 'multiple_choice']:
-                    if resp.choice_response is not None:
-                        choices = resp.choice_response.all()
-                        answer = ', '.join(choice.text for choice in choices)
-                    else:
-                        answer = 'Aucune réponse'
-                elif question.question_type == 'scale':
-                    answer = str(resp.scale_response) if resp.scale_response is not None else 'Aucune réponse'
-                else:
-                    answer = resp.text_response if resp.text_response else 'Aucune réponse'
-
-                data.append([
-                    answer,
-                    resp.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                    resp.user.username if resp.user else 'Anonyme'
-                ])
-
-            # Créer et styliser le tableau
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 14),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 12),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            elements.append(table)
-            elements.append(Spacer(1, 30))
-
-        # Générer le PDF
-        doc.build(elements)
-        pdf = buffer.getvalue()
-        buffer.close()
-
-        # Créer la réponse HTTP
-        response = HttpResponse(
+@method_decorator(login_required, name='dispatch')
+class ExportStatusView(View):
+    """État d'un export ; JSON avec ``?format=json``, sinon page rafraîchie jusqu'à la fin"""
+    def get(self, request, job_id):
+        job = get_object_or_404(ExportJob.objects.select_related('survey'), pk=job_id)
+        if request.user != job.survey.creator:
+            messages.error(request, 'Vous n\'avez pas accès à cet export.')
+            return redirect('home')
+
+        if request.GET.get('format') == 'json':
+            return JsonResponse(export_job_payload(job))
+        return render(request, 'survey_app/export_status.html', {
+            'job': job,
+            'survey': job.survey,
+            'is_active': job.status in (ExportJob.STATUS_PENDING, ExportJob.STATUS_RUNNING),
+        })
+
+@method_decorator(login_required, name='dispatch')
+class ExportDownloadView(View):
+    def get(self, request, job_id):
+        job = get_object_or_404(ExportJob.objects.select_related('survey'), pk=job_id)
+        if request.user != job.survey.creator:
+            messages.error(request, 'Vous n\'avez pas accès à cet export.')
+            return redirect('home')
+
+        path = job_file(job)
+        if path is None:
+            raise Http404('Export non disponible')
+        response = FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=f'{job.survey.title}_results.pdf',
             content_type='application/pdf',
-            headers={
-                'Content-Disposition': f'attachment; filename="{survey.title}_results.pdf"',
-                'X-Frame-Options': 'DENY'
-            }
         )
-        response.write(pdf)
-        return response
\ No newline at end of file
+        response['X-Frame-Options'] = 'DENY'
+        return response
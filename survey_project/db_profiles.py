@@ -0,0 +1,80 @@
+"""
+Profils de base de données choisis par variables d'environnement.
+
+``SURVEY_DB_PROFILE`` :
+
+- ``sqlite`` (défaut) : SQLite réglé pour la concurrence : WAL,
+  ``synchronous=NORMAL``, attente sur verrou, mmap, cache agrandi (PRAGMA
+  appliqués à chaque connexion par ``survey_app.database``), transactions
+  ``IMMEDIATE`` et connexions persistantes ;
+- ``sqlite-basic`` : SQLite sans réglage (comportement historique, référence
+  des benchmarks) ;
+- ``postgres`` : PostgreSQL (``SURVEY_DB_NAME``, ``SURVEY_DB_USER``,
+  ``SURVEY_DB_PASSWORD``, ``SURVEY_DB_HOST``, ``SURVEY_DB_PORT``), connexions
+  persistantes, ou pool psycopg avec ``SURVEY_DB_POOL_SIZE``.
+"""
+import os
+
+PROFILES = ('sqlite', 'sqlite-basic', 'postgres')
+
+# Attente maximale sur le verrou d'écriture avant « database is locked » (secondes)
+SQLITE_BUSY_TIMEOUT = 10
+
+# Clé propre au projet dans DATABASES : PRAGMA exécutés à l'ouverture de chaque connexion
+SQLITE_TUNED_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', str(SQLITE_BUSY_TIMEOUT * 1000)),
+    ('mmap_size', str(256 * 1024 * 1024)),
+    # Négatif : en Kio, soit 64 Mio de cache de pages
+    ('cache_size', '-65536'),
+    ('temp_store', 'MEMORY'),
+)
+
+
+def sqlite_profile(path, tuned=True, env=os.environ):
+    database = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env.get('SURVEY_DB_NAME') or path,
+    }
+    if tuned:
+        database.update({
+            'CONN_MAX_AGE': int(env.get('SURVEY_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            # Verrou d'écriture pris dès BEGIN : pas d'échec immédiat lors de la montée en écriture
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': SQLITE_BUSY_TIMEOUT},
+            'PRAGMAS': SQLITE_TUNED_PRAGMAS,
+        })
+    return database
+
+
+def postgres_profile(env=os.environ):
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env.get('SURVEY_DB_NAME', 'surveys'),
+        'USER': env.get('SURVEY_DB_USER', ''),
+        'PASSWORD': env.get('SURVEY_DB_PASSWORD', ''),
+        'HOST': env.get('SURVEY_DB_HOST', ''),
+        'PORT': env.get('SURVEY_DB_PORT', ''),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    pool_size = int(env.get('SURVEY_DB_POOL_SIZE', 0))
+    if pool_size:
+        # Pool psycopg 3 (psycopg[pool]) ; incompatible avec CONN_MAX_AGE
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {'min_size': max(1, pool_size // 4), 'max_size': pool_size}
+    else:
+        database['CONN_MAX_AGE'] = int(env.get('SURVEY_DB_CONN_MAX_AGE', 60))
+    return database
+
+
+def database_profile(name, base_dir, env=os.environ):
+    """Entrée ``DATABASES['default']`` du profil ``name``"""
+    if name == 'sqlite':
+        return sqlite_profile(base_dir / 'db.sqlite3', env=env)
+    if name == 'sqlite-basic':
+        return sqlite_profile(base_dir / 'db.sqlite3', tuned=False, env=env)
+    if name == 'postgres':
+        return postgres_profile(env)
+    raise ValueError(f'Profil de base inconnu : {name} (choix : {", ".join(PROFILES)})')
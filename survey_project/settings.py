@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .db_profiles import database_profile
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'survey_app.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +58,8 @@ ROOT_URLCONF = 'survey_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates mesurant le temps de rendu (survey_app.instrumentation)
+        'BACKEND': 'survey_app.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,11 +78,11 @@ WSGI_APPLICATION = 'survey_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Profil choisi par SURVEY_DB_PROFILE (sqlite, sqlite-basic, postgres), voir db_profiles
+DATABASE_PROFILE = os.environ.get('SURVEY_DB_PROFILE', 'sqlite')
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_profile(DATABASE_PROFILE, BASE_DIR),
 }
 
 
@@ -119,6 +124,104 @@ STATICFILES_DIRS = [
     BASE_DIR / 'survey_app' / 'static',
 ]
 
+# Fichiers produits par les exports en arrière-plan (manage.py run_export_worker)
+EXPORT_ROOT = BASE_DIR / 'exports'
+
+# Processus de rendu PDF des vues d'export asynchrones (survey_app.async_views)
+ASYNC_EXPORT_WORKERS = 2
+
+# Tampon d'ingestion des soumissions (survey_app.ingest_buffer) : fichier SQLite
+# de la file, vidé par manage.py flush_submissions. Désactivé si vide.
+SUBMISSION_BUFFER_PATH = os.environ.get('SURVEY_SUBMISSION_BUFFER') or None
+
+# Limites de débit des soumissions (survey_app.throttling) : portée -> (soumissions, fenêtre
+# en secondes). La limite par adresse IP est large : une classe entière peut répondre derrière
+# la même adresse (NAT). Pas de limite par sondage par défaut, elle refuserait les pics de
+# trafic légitimes ; SURVEY_RATE_LIMIT_PER_SURVEY=1200 l'active (soumissions par minute).
+# SURVEY_RATE_LIMITS=off les désactive toutes (tests de charge depuis une seule adresse)
+SUBMISSION_RATE_LIMITS = {} if os.environ.get('SURVEY_RATE_LIMITS') == 'off' else {
+    'ip': (120, 60),
+    'user': (20, 60),
+}
+if SUBMISSION_RATE_LIMITS and os.environ.get('SURVEY_RATE_LIMIT_PER_SURVEY'):
+    SUBMISSION_RATE_LIMITS['survey'] = (int(os.environ['SURVEY_RATE_LIMIT_PER_SURVEY']), 60)
+
+# Résumés des nouvelles réponses par e-mail (survey_app.notifications), envoyés par
+# manage.py send_notifications. Console par défaut ; SURVEY_EMAIL_BACKEND pour SMTP ou fichier
+EMAIL_BACKEND = os.environ.get('SURVEY_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('SURVEY_EMAIL_DIR', str(BASE_DIR / 'sent_emails'))
+DEFAULT_FROM_EMAIL = os.environ.get('SURVEY_FROM_EMAIL', 'sondages@localhost')
+# Délai minimal entre deux résumés d'un même abonnement (secondes)
+NOTIFICATION_DIGEST_WINDOW = int(os.environ.get('SURVEY_NOTIFICATION_WINDOW', 300))
+NOTIFICATION_BASE_URL = os.environ.get('SURVEY_BASE_URL', 'http://localhost:8000')
+
+# Instrumentation des requêtes (survey_app.instrumentation)
+# Budget de requêtes SQL par vue : exception pendant les tests, avertissement sinon
+VIEW_QUERY_BUDGETS = {
+    'survey_app:home': 4,
+    'home': 4,
+    'survey_app:survey_detail': 6,
+    'survey_app:take_survey': 20,
+    'survey_app:take_survey_async': 20,
+    'survey_app:survey_results': 14,
+    'survey_app:survey_results_query': 14,
+    'survey_app:survey_results_async': 14,
+    'survey_app:question_responses': 10,
+}
+QUERY_BUDGET_STRICT = False
+TEST_RUNNER = 'survey_app.instrumentation.BudgetTestRunner'
+SLOW_QUERY_MS = int(os.environ.get('SURVEY_SLOW_QUERY_MS', 100))
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get('SURVEY_SLOW_QUERY_SAMPLE_RATE', 1.0))
+# Pic d'allocation par requête, si tracemalloc est actif (python -X tracemalloc)
+REQUEST_METRICS_TRACEMALLOC = True
+# Adresses autorisées à lire /metrics
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'survey_app.metrics': {
+            'handlers': ['console'],
+            'level': os.environ.get('SURVEY_METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+        'survey_app.slow_queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'survey_app.notifications': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Cache (schémas compilés, pages publiques, segments, liens de partage). Mémoire
+# locale par défaut ; SURVEY_CACHE=file pour un cache sur disque partagé entre processus
+CACHE_MAX_ENTRIES = int(os.environ.get('SURVEY_CACHE_MAX_ENTRIES', 10000))
+if os.environ.get('SURVEY_CACHE') == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('SURVEY_CACHE_DIR', str(BASE_DIR / 'cache')),
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'survey-app',
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        }
+    }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
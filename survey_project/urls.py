@@ -22,13 +22,16 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 from survey_app import views
+from survey_app.instrumentation import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('surveys/', include('survey_app.urls')),
     path('', views.home, name='home'),
+    path('s/<slug:token>/', views.share_link, name='share_link'),
     path('login/', auth_views.LoginView.as_view(template_name='survey_app/login.html'), name='login'),
     path('logout/', csrf_exempt(auth_views.LogoutView.as_view()), name='logout'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG: